@@ -30,8 +30,19 @@ Assembler: Assembly language --> Machine Language
 
 """
 
-import re
+import os
 import sys
+import glob
+import mmap
+import time
+import timeit
+import shutil
+import argparse
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from BuildCache import BuildCache
 
 
 class Assembler:
@@ -40,26 +51,70 @@ class Assembler:
     - The first pass, builds the symbol table
     - The second pass, generate code
 
+    The single-pass mode reads code only once:
+    - Emit every instruction into a buffer, leaving a hole for unknown symbols
+    - Backpatch the holes at the end, labels first, then variables
+
     """
 
-    def __init__(self, filename):
-        " Require a absolute path. "
+    # bump whenever the generated code changes, it invalidates BuildCache
+    VERSION = '1.1'
+
+    def __init__(self, filename, single_pass=False, binary=False,
+                 cache=False, record=True):
+        """
+        Require a absolute path. With record=False a cached build is not
+        written to the BuildCache, the caller records self.entry itself.
+        """
         self.filename = filename
         self.symbols = Symbol()
+        self.words = []
 
         # output
-        self.target = filename.replace('.asm', '.jack')
-        self.output = open(self.target, 'w')
-
-        # two pass assemble
-        self.set_label()
-        self.assemble()
-
-        # IO handle
-        self.output.close()
-
-    def write(self, s):
-        self.output.write(s)
+        self.binary = binary
+        if binary:
+            self.target = filename.replace('.asm', '.bin')
+        else:
+            self.target = filename.replace('.asm', '.hack')
+
+        # skip the whole build if nothing changed since the last one
+        self.skipped = False
+        self.entry = None
+        if cache:
+            build_cache = BuildCache(os.path.dirname(filename))
+            key = build_cache.key([filename], self.VERSION)
+            if build_cache.fresh(self.target, key):
+                self.skipped = True
+                return
+
+        if single_pass:
+            self.assemble_single_pass()
+        else:
+            # two pass assemble
+            self.set_label()
+            self.assemble()
+
+        self.write()
+
+        if cache:
+            self.entry = (self.target, key)
+            if record:
+                build_cache.update(self.target, key)
+                build_cache.save()
+
+    def write(self):
+        " Write the whole program with one bulk write. "
+        if self.binary:
+            # packed little-endian uint16, loadable with load_rom()
+            rom = array('H', self.words)
+            if sys.byteorder == 'big':
+                rom.byteswap()
+            with open(self.target, 'wb') as output:
+                output.write(rom.tobytes())
+        else:
+            with open(self.target, 'w') as output:
+                output.write(''.join(
+                    ['{:016b}\n'.format(word) for word in self.words]))
 
     def set_label(self):
         # TODO: Is there a possibility that label and variable use the same address?
@@ -83,53 +138,71 @@ class Assembler:
                 symbol = parser.symbol()
                 # number or symbol
                 if symbol.isdigit():
-                    address = self.int_to_hex(symbol)
+                    address = int(symbol)
                 elif self.symbols.contains(symbol):
-                    address = self.int_to_hex(
-                        self.symbols.GetAddress(parser.symbol()))
+                    address = int(self.symbols.GetAddress(symbol))
                 else:
-                    address = self.int_to_hex(self.symbols.next)
+                    address = self.symbols.next
                     self.symbols.addEntry(symbol, self.symbols.next)
                     self.symbols.next += 1
-                self.write('{}{}\n'.format(Code.A_COMMAND_PREFIX, address))
+                self.words.append(address)
             elif parser.commandType() == 'C_COMMAND':
-                dest = Code.dest(parser.dest())
-                comp = Code.comp(parser.comp())
-                jump = Code.jump(parser.jump())
-                self.write('{}{}{}{}\n'.format(Code.C_COMMAND_PREFIX, comp,
-                                               dest, jump))
+                self.words.append(Code.encode(parser.command))
 
-    def int_to_hex(self, value):
-        return bin(int(value))[2:].zfill(15)
+    def assemble_single_pass(self):
+        words = self.words
+        # (buffer index, symbol) of every A command whose symbol is unknown yet
+        forward_references = []
+        parser = Parser(self.filename)
+
+        while parser.hasMoreCommands():
+            parser.advance()
+            command_type = parser.commandType()
+            if command_type == 'A_COMMAND':
+                symbol = parser.symbol()
+                if symbol.isdigit():
+                    words.append(int(symbol))
+                elif self.symbols.contains(symbol):
+                    words.append(int(self.symbols.GetAddress(symbol)))
+                else:
+                    forward_references.append((len(words), symbol))
+                    words.append(None)
+            elif command_type == 'C_COMMAND':
+                words.append(Code.encode(parser.command))
+            elif command_type == 'L_COMMAND':
+                self.symbols.addEntry(parser.symbol(), len(words))
+
+        # backpatch: whatever is still unknown is a variable, allocated
+        # in order of first use like the second pass does
+        for index, symbol in forward_references:
+            if not self.symbols.contains(symbol):
+                self.symbols.addEntry(symbol, self.symbols.next)
+                self.symbols.next += 1
+            words[index] = int(self.symbols.GetAddress(symbol))
 
 
 class Parser:
     def __init__(self, filename):
-        self.file = open(filename, 'r')
-        self.input = self.format_lines(self.file.read())
-        self.index = -1
-        self.length = len(self.input)
-        self.file.close()
+        # one command of lookahead, the file is never read as a whole
+        self.commands = self.stream(filename)
+        self.next_command = next(self.commands, None)
 
     def hasMoreCommands(self):
-        return self.index < self.length - 1
+        return self.next_command is not None
 
     def advance(self):
-        self.index += 1
-        self.command = self.input[self.index].strip()
+        # classified once while streaming, the assembler asks for it
+        # several times per line
+        self.command_type, self.command = self.next_command
+        self.next_command = next(self.commands, None)
 
     def commandType(self):
-        if '@' in self.command:
-            return 'A_COMMAND'
-        elif '=' in self.command or ';' in self.command:
-            return 'C_COMMAND'
-        elif '(' in self.command and ')' in self.command:
-            return 'L_COMMAND'
+        return self.command_type
 
     def symbol(self):
-        if self.commandType() == 'A_COMMAND':
+        if self.command_type == 'A_COMMAND':
             return self.command.split('@')[1]
-        elif self.commandType() == 'L_COMMAND':
+        elif self.command_type == 'L_COMMAND':
             return self.command[1:-1]
 
     def dest(self):
@@ -152,14 +225,23 @@ class Parser:
             return ''
 
     # Non API
-    def format_lines(self, lines):
-        # remove blank line and comment
-        INLINE_COMMENT_REGEX = re.compile(r'//.*\n')
-        without_inline = re.sub(INLINE_COMMENT_REGEX, '\n', lines)
-        format_lines = [
-            x.strip() for x in without_inline.splitlines() if x != ''
-        ]
-        return format_lines
+    @staticmethod
+    def classify(command):
+        if '@' in command:
+            return 'A_COMMAND'
+        elif '=' in command or ';' in command:
+            return 'C_COMMAND'
+        elif '(' in command and ')' in command:
+            return 'L_COMMAND'
+
+    @classmethod
+    def stream(cls, filename):
+        " yield (command type, command) for every line holding a command "
+        with open(filename, 'r') as file:
+            for line in file:
+                command = line.split('//', 1)[0].strip()
+                if command:
+                    yield cls.classify(command), command
 
 
 class Code:
@@ -229,6 +311,46 @@ class Code:
     def jump(mnemonic):
         return Code.JUMP_DICT[mnemonic]
 
+    # dest=comp;jump text -> 16-bit word, shared by every Assembler
+    C_COMMAND_TABLE = {}
+
+    @staticmethod
+    def encode(command):
+        " Encode a C command through the precompiled table. "
+        try:
+            return Code.C_COMMAND_TABLE[command]
+        except KeyError:
+            word = Code.encode_fields(command)
+            Code.C_COMMAND_TABLE[command] = word
+            return word
+
+    @staticmethod
+    def encode_fields(command):
+        # dest=comp;jump
+        # the dest or jump fields may be empty
+        dest = command.split('=')[0] if '=' in command else ''
+        comp = command.split(';')[0].split('=')[-1]
+        jump = command.split(';')[-1] if ';' in command else ''
+        return int(
+            '{}{}{}{}'.format(Code.C_COMMAND_PREFIX, Code.comp(comp),
+                              Code.dest(dest), Code.jump(jump)), 2)
+
+    @staticmethod
+    def precompile():
+        " Encode every well-formed dest=comp;jump combination up front. "
+        for dest in Code.DEST_DICT:
+            for comp in Code.COMP_DICT:
+                for jump in Code.JUMP_DICT:
+                    command = comp
+                    if dest:
+                        command = '{}={}'.format(dest, command)
+                    if jump:
+                        command = '{};{}'.format(command, jump)
+                    Code.C_COMMAND_TABLE[command] = Code.encode_fields(command)
+
+
+Code.precompile()
+
 
 class Symbol:
 
@@ -272,7 +394,162 @@ class Symbol:
         return self.symbols[symbol]
 
 
+def load_rom(filename):
+    """
+    Load a binary ROM written by Assembler(filename, binary=True).
+    On little-endian hosts the words are a view over an mmap of the file,
+    nothing is copied or parsed.
+    """
+    with open(filename, 'rb') as f:
+        if sys.byteorder == 'little' and f.seek(0, 2) > 0:
+            rom = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(rom).cast('H')
+        f.seek(0)
+        words = array('H', f.read())
+
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words
+
+
+def benchmark(filename, number=10):
+    """
+    Time the two-pass and single-pass modes on the same file. Both
+    assemble a copy in a temporary directory, nothing is written next to
+    filename.
+    """
+    outputs = []
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        source = shutil.copy(filename, directory)
+        for single_pass in [False, True]:
+            # the best of a few rounds, the others only measure noise
+            timings.append(min(timeit.repeat(
+                lambda: Assembler(source, single_pass),
+                repeat=5, number=number)) / number)
+            with open(source.replace('.asm', '.hack')) as f:
+                outputs.append(f.read())
+
+    if outputs[0] != outputs[1]:
+        raise Exception("Single-pass output differs from two-pass output")
+
+    print('two-pass:    {:.2f} ms'.format(timings[0] * 1000))
+    print('single-pass: {:.2f} ms'.format(timings[1] * 1000))
+    print('speedup:     {:.2f}x'.format(timings[0] / timings[1]))
+
+
+def collect(paths):
+    " Expand files, directories (recursively) and glob patterns to .asm files. "
+    filenames = []
+    for path in paths:
+        for match in sorted(glob.glob(path)) or [path]:
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs.sort()
+                    filenames.extend(
+                        os.path.join(root, f) for f in sorted(files)
+                        if f.endswith('.asm'))
+            else:
+                filenames.append(match)
+
+    # keep the first occurrence of every file
+    return list(dict.fromkeys(filenames))
+
+
+def assemble_file(filename, single_pass=False, binary=False, cache=False):
+    """
+    Assemble one file, returns (filename, seconds, skipped, error, entry).
+    entry is the (target, key) to record in the BuildCache, None when
+    nothing was built. Workers never write the cache themselves: several
+    of them share the .buildcache of a directory.
+    """
+    start = time.perf_counter()
+    skipped = False
+    error = None
+    entry = None
+    try:
+        assembler = Assembler(filename, single_pass, binary, cache,
+                              record=False)
+        skipped = assembler.skipped
+        entry = assembler.entry
+    except Exception as e:
+        error = '{}: {}'.format(type(e).__name__, e)
+    return filename, time.perf_counter() - start, skipped, error, entry
+
+
+def assemble_batch(paths, jobs=None, **options):
+    """
+    Assemble every file found in paths, in parallel across jobs processes
+    (all cores by default, jobs=1 assembles serially in this process).
+    Every file is written by exactly one worker, so the output is the same
+    as assembling the files one by one.
+    """
+    filenames = collect(paths)
+    start = time.perf_counter()
+
+    if jobs == 1 or len(filenames) < 2:
+        results = [assemble_file(f, **options) for f in filenames]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(assemble_file, f, **options)
+                for f in filenames
+            ]
+            results = [future.result() for future in futures]
+
+    # one read-modify-write of every .buildcache, after all workers
+    caches = {}
+    for _, _, _, _, entry in results:
+        if entry:
+            target, key = entry
+            directory = os.path.dirname(target)
+            if directory not in caches:
+                caches[directory] = BuildCache(directory)
+            caches[directory].update(target, key)
+    for build_cache in caches.values():
+        build_cache.save()
+
+    elapsed = time.perf_counter() - start
+    errors = [(f, error) for f, _, _, error, _ in results if error]
+
+    for filename, seconds, skipped, error, _ in results:
+        status = 'FAILED' if error else 'cached' if skipped else 'ok'
+        print('{:>9.2f} ms  {:<6}  {}'.format(seconds * 1000, status,
+                                              filename))
+    print('{} files, {} failed, {:.2f} s'.format(len(results), len(errors),
+                                                 elapsed))
+    for filename, error in errors:
+        print('  {}: {}'.format(filename, error))
+
+    return results
+
+
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Assemble Hack .asm files, directories or glob patterns.')
+    arg_parser.add_argument('paths', nargs='+')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='worker processes (default: all cores)')
+    arg_parser.add_argument('--single-pass', action='store_true',
+                            help='read every file once and backpatch labels')
+    arg_parser.add_argument('--binary', action='store_true',
+                            help='write packed little-endian .bin ROMs')
+    arg_parser.add_argument('--cache', action='store_true',
+                            help='skip files that did not change')
+    arg_parser.add_argument('--benchmark', action='store_true',
+                            help='time two-pass against single-pass instead')
+    args = arg_parser.parse_args()
+
+    if args.benchmark:
+        for filename in collect(args.paths):
+            print(filename)
+            benchmark(filename)
+        sys.exit(0)
+
     print('...assembling...')
-    filename = sys.argv[0]
-    Assembler(filename)
+    results = assemble_batch(args.paths,
+                             jobs=args.jobs,
+                             single_pass=args.single_pass,
+                             binary=args.binary,
+                             cache=args.cache)
+    sys.exit(1 if any(error for _, _, _, error, _ in results) else 0)
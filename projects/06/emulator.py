@@ -0,0 +1,809 @@
+"""
+CPU Emulator: run the machine code produced by the Assembler
+
+The Hack computer:
+    - ROM: 32K words of instructions, the PC points into it
+    - RAM: 32K words of data, the screen and the keyboard are memory maps
+        - SCREEN: 8K words at 16384, 256 rows of 512 pixels
+        - KBD: 1 word at 24576, the code of the key currently pressed
+    - CPU: the A, D and PC registers, executes one instruction per cycle
+
+Emulation:
+    - Predecode: every ROM word is decoded once into an opcode
+        - A instruction: the value to load
+        - C instruction: the ALU function, the dest bits and the jump table
+    - Dispatch: a tight loop fetches opcodes and keeps the registers local
+    - Headless: run without rendering the screen, for scripts and CI
+    - JIT: hot basic blocks are compiled into Python functions, see
+      JITEmulator
+
+Screen:
+    - RAM is one array of 16-bit words, numpy can view it without a copy
+    - Frames are unpacked from the screen memory map in one call, and
+      screenshots are written as PBM images straight from its bytes
+
+Test scripts (.tst) drive the emulator like the CPUEmulator of the course:
+    load, output-file, compare-to, output-list, set, repeat, while,
+    ticktock, output, echo
+
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from assembler import Assembler, Code, load_rom
+
+
+class CPUEmulator:
+
+    ROM_SIZE = 32768
+    RAM_SIZE = 65536
+    SCREEN = 16384
+    KBD = 24576
+
+    # mnemonic -> ALU function, results are kept as unsigned 16-bit words
+    ALU_DICT = {
+        "0": lambda a, d, m: 0,
+        "1": lambda a, d, m: 1,
+        "-1": lambda a, d, m: 0xFFFF,
+        "D": lambda a, d, m: d,
+        "A": lambda a, d, m: a,
+        "!D": lambda a, d, m: d ^ 0xFFFF,
+        "!A": lambda a, d, m: a ^ 0xFFFF,
+        "-D": lambda a, d, m: -d & 0xFFFF,
+        "-A": lambda a, d, m: -a & 0xFFFF,
+        "D+1": lambda a, d, m: (d + 1) & 0xFFFF,
+        "A+1": lambda a, d, m: (a + 1) & 0xFFFF,
+        "D-1": lambda a, d, m: (d - 1) & 0xFFFF,
+        "A-1": lambda a, d, m: (a - 1) & 0xFFFF,
+        "D+A": lambda a, d, m: (d + a) & 0xFFFF,
+        "D-A": lambda a, d, m: (d - a) & 0xFFFF,
+        "A-D": lambda a, d, m: (a - d) & 0xFFFF,
+        "D&A": lambda a, d, m: d & a,
+        "D|A": lambda a, d, m: d | a,
+        "M": lambda a, d, m: m,
+        "!M": lambda a, d, m: m ^ 0xFFFF,
+        "-M": lambda a, d, m: -m & 0xFFFF,
+        "M+1": lambda a, d, m: (m + 1) & 0xFFFF,
+        "M-1": lambda a, d, m: (m - 1) & 0xFFFF,
+        "D+M": lambda a, d, m: (d + m) & 0xFFFF,
+        "D-M": lambda a, d, m: (d - m) & 0xFFFF,
+        "M-D": lambda a, d, m: (m - d) & 0xFFFF,
+        "D&M": lambda a, d, m: d & m,
+        "D|M": lambda a, d, m: d | m,
+    }
+    # j1j2j3 -> jump taken when the result is (zero, positive, negative)
+    JUMP_TABLE = {
+        0b000: None,
+        0b001: (False, True, False),
+        0b010: (True, False, False),
+        0b011: (True, True, False),
+        0b100: (False, False, True),
+        0b101: (False, True, True),
+        0b110: (True, False, True),
+        0b111: (True, True, True),
+    }
+    # the `(END) @END 0;JMP` idiom, and what runs past the end of the program,
+    # a list so it is never the same object as the JMP entry above
+    HALT = [True, True, True]
+
+    # a+c1..c6 -> ALU function, shared by every CPUEmulator
+    ALU_TABLE = {}
+
+    # a subclass that defines jumped(target, executed) sees every taken
+    # jump before it lands, executed counts the instructions of the current
+    # run() up to and including the jump (JITEmulator never calls it)
+    jumped = None
+
+    # byte -> its 8 pixels, the least significant bit is the leftmost pixel
+    PIXELS_TABLE = [
+        bytes((byte >> bit) & 1 for bit in range(8)) for byte in range(256)
+    ]
+    # byte -> its bits reversed, PBM rows start at the most significant bit
+    BIT_REVERSE = bytes(
+        int('{:08b}'.format(byte)[::-1], 2) for byte in range(256))
+
+    def __init__(self, filename=None):
+        " Load a .hack, binary .bin or .asm program. "
+        self.ram = array('H', bytes(2 * self.RAM_SIZE))
+        self.rom = []
+        self.program = []
+        self.reset()
+        if filename:
+            self.load(filename)
+
+    def load(self, filename):
+        if filename.endswith('.asm'):
+            words = Assembler(filename).words
+        elif filename.endswith('.bin'):
+            words = load_rom(filename)
+        else:
+            with open(filename) as f:
+                words = [int(line, 2) for line in f if line.strip()]
+
+        if len(words) > self.ROM_SIZE:
+            raise Exception("Program does not fit in ROM: {} words".format(
+                len(words)))
+        self.rom = list(words)
+        self.program = self.predecode(self.rom)
+        self.reset()
+
+    def reset(self):
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.time = 0
+        self.halted = False
+        # set whenever a word of the screen memory map is written
+        self.screen_dirty = False
+
+    def run(self, cycles=1000000):
+        """
+        Execute at most cycles instructions, stop earlier when the program
+        halts. Returns the number of instructions executed.
+        """
+        program = self.program
+        ram = self.ram
+        halt = self.HALT
+        jumped = self.jumped
+        screen, kbd = self.SCREEN, self.KBD
+        screen_dirty = self.screen_dirty
+        a, d, pc = self.a, self.d, self.pc
+
+        executed = 0
+        try:
+            for executed in range(1, cycles + 1):
+                comp, dest, jump = program[pc]
+                if comp is None:
+                    a = dest
+                    pc += 1
+                    continue
+
+                out = comp(a, d, ram[a])
+                if jump and jump[0 if out == 0 else 2 if out & 0x8000 else 1]:
+                    if jump is halt:
+                        self.halted = True
+                        break
+                    target = a
+                    if jumped:
+                        jumped(target, executed)
+                else:
+                    target = pc + 1
+                if dest:
+                    if dest & 1:
+                        ram[a] = out
+                        if screen <= a < kbd:
+                            screen_dirty = True
+                    if dest & 2:
+                        d = out
+                    if dest & 4:
+                        a = out
+                pc = target
+        except IndexError:
+            # the fetch failed, nothing was executed
+            executed -= 1
+            raise Exception("Jump outside of ROM: {}".format(pc))
+        finally:
+            self.a, self.d, self.pc = a, d, pc
+            self.time += executed
+            self.screen_dirty = screen_dirty
+
+        return executed
+
+    def step(self):
+        " Execute exactly one instruction. "
+        return self.run(1)
+
+    def memory(self):
+        " RAM as a numpy uint16 array sharing the buffer of the emulator. "
+        if numpy is None:
+            raise Exception("numpy is not installed")
+        return numpy.frombuffer(self.ram, dtype=numpy.uint16)
+
+    def frame(self):
+        """
+        The screen as a 256 x 512 bitmap, 1 for a black pixel.
+        With numpy it is an array unpacked from the RAM view in one call,
+        without it a list of rows of bytes.
+        """
+        if numpy is not None:
+            screen = self.memory()[self.SCREEN:self.KBD]
+            if sys.byteorder == 'big':
+                screen = screen.byteswap()
+            return numpy.unpackbits(
+                screen.view(numpy.uint8), bitorder='little').reshape(256, 512)
+
+        pixels = b''.join([self.PIXELS_TABLE[byte]
+                           for byte in self.screen_bytes()])
+        return [pixels[y * 512:(y + 1) * 512] for y in range(256)]
+
+    def screenshot(self, filename):
+        " Write the screen as a binary PBM image. "
+        with open(filename, 'wb') as f:
+            f.write(b'P4\n512 256\n')
+            f.write(self.screen_bytes().translate(self.BIT_REVERSE))
+        self.screen_dirty = False
+
+    def screen_text(self, scale=4):
+        " The screen as text, one character per scale x scale block. "
+        frame = self.frame()
+        if numpy is not None:
+            blocks = frame.reshape(256 // scale, scale, 512 // scale,
+                                   scale).any(axis=(1, 3))
+            return '\n'.join(
+                ''.join('#' if black else '.' for black in row)
+                for row in blocks)
+
+        rows = []
+        for y in range(0, 256, scale):
+            lines = frame[y:y + scale]
+            rows.append(''.join(
+                '#' if any(1 in line[x:x + scale] for line in lines) else '.'
+                for x in range(0, 512, scale)))
+        return '\n'.join(rows)
+
+    def pixel(self, x, y):
+        word = self.ram[self.SCREEN + y * 32 + x // 16]
+        return (word >> (x % 16)) & 1
+
+    # Non API
+    def screen_bytes(self):
+        " The screen memory map as little-endian bytes. "
+        screen = self.ram[self.SCREEN:self.KBD]
+        if sys.byteorder == 'big':
+            screen.byteswap()
+        return screen.tobytes()
+
+    def predecode(self, rom):
+        " Decode every ROM word once, pad the rest of ROM with halts. "
+        program = []
+        for address, word in enumerate(rom):
+            if word & 0x8000 == 0:
+                program.append((None, word, None))
+                continue
+
+            jump = self.JUMP_TABLE[word & 0b111]
+            # @address-1 0;JMP jumps to itself forever
+            if (word & 0b111 == 0b111 and address > 0
+                    and rom[address - 1] == address - 1):
+                jump = self.HALT
+            program.append(
+                (self.alu((word >> 6) & 0x7F), (word >> 3) & 0b111, jump))
+
+        end = (self.ALU_DICT["0"], 0, self.HALT)
+        program.extend([end] * (self.ROM_SIZE - len(program)))
+        return program
+
+    @classmethod
+    def alu(cls, code):
+        " The ALU function of a+c1..c6, built from the bits if unknown. "
+        try:
+            return cls.ALU_TABLE[code]
+        except KeyError:
+            function = cls.alu_bits(code)
+            cls.ALU_TABLE[code] = function
+            return function
+
+    @staticmethod
+    def alu_bits(code):
+        use_m = code & 0b1000000
+        zx, nx, zy, ny, f, no = [(code >> bit) & 1 for bit in range(5, -1, -1)]
+
+        def function(a, d, m):
+            x = 0 if zx else d
+            y = 0 if zy else (m if use_m else a)
+            if nx:
+                x ^= 0xFFFF
+            if ny:
+                y ^= 0xFFFF
+            out = (x + y) & 0xFFFF if f else x & y
+            return out ^ 0xFFFF if no else out
+        return function
+
+    @staticmethod
+    def precompile():
+        for mnemonic, bits in Code.COMP_DICT.items():
+            function = CPUEmulator.ALU_DICT[mnemonic]
+            CPUEmulator.ALU_TABLE[int(bits, 2)] = function
+
+
+CPUEmulator.precompile()
+
+
+class JITEmulator(CPUEmulator):
+    """
+    Execution tier on top of the interpreter:
+    - A block starts at any address the program enters and runs up to and
+      including the first jump, so it is straight-line code
+    - Blocks entered HOT times are compiled into one Python function each,
+      cached by their ROM address
+    - Cold blocks, halts and the tail of a run that would not fit a whole
+      block are left to the interpreter
+    - A known after an @value is folded into the generated code, writes to
+      the screen memory map still set screen_dirty
+    """
+
+    HOT = 8
+    MAX_BLOCK = 256
+
+    # mnemonic -> Python expression over a, d and m
+    COMP_SOURCE = {
+        "0": "0",
+        "1": "1",
+        "-1": "65535",
+        "D": "d",
+        "A": "{a}",
+        "!D": "d ^ 65535",
+        "!A": "{a} ^ 65535",
+        "-D": "-d & 65535",
+        "-A": "-{a} & 65535",
+        "D+1": "(d + 1) & 65535",
+        "A+1": "({a} + 1) & 65535",
+        "D-1": "(d - 1) & 65535",
+        "A-1": "({a} - 1) & 65535",
+        "D+A": "(d + {a}) & 65535",
+        "D-A": "(d - {a}) & 65535",
+        "A-D": "({a} - d) & 65535",
+        "D&A": "d & {a}",
+        "D|A": "d | {a}",
+        "M": "{m}",
+        "!M": "{m} ^ 65535",
+        "-M": "-{m} & 65535",
+        "M+1": "({m} + 1) & 65535",
+        "M-1": "({m} - 1) & 65535",
+        "D+M": "(d + {m}) & 65535",
+        "D-M": "(d - {m}) & 65535",
+        "M-D": "({m} - d) & 65535",
+        "D&M": "d & {m}",
+        "D|M": "d | {m}",
+    }
+    # j1j2j3 -> Python condition over out
+    JUMP_SOURCE = {
+        0b001: "0 < out < 32768",
+        0b010: "out == 0",
+        0b011: "out < 32768",
+        0b100: "out >= 32768",
+        0b101: "out != 0",
+        0b110: "out == 0 or out >= 32768",
+    }
+    # a+c1..c6 -> mnemonic
+    MNEMONIC_TABLE = dict(
+        (int(bits, 2), mnemonic) for mnemonic, bits in Code.COMP_DICT.items())
+
+    def __init__(self, filename=None):
+        self.blocks = {}
+        self.cold = {}
+        super().__init__(filename)
+
+    def load(self, filename):
+        super().load(filename)
+        self.blocks = {}
+        self.cold = {}
+
+    def run(self, cycles=1000000):
+        blocks = self.blocks
+        a, d, pc = self.a, self.d, self.pc
+
+        executed = 0
+        # instructions run by compiled blocks, the interpreter adds its own
+        # share to time
+        compiled = 0
+        try:
+            while executed < cycles:
+                block = blocks.get(pc)
+                if block is None:
+                    block = self.enter(pc)
+                function, length = block
+                if function is None or executed + length > cycles:
+                    self.a, self.d, self.pc = a, d, pc
+                    try:
+                        executed += CPUEmulator.run(
+                            self, min(max(length, 1), cycles - executed))
+                    finally:
+                        a, d, pc = self.a, self.d, self.pc
+                    if self.halted:
+                        break
+                    continue
+                a, d, pc = function(a, d)
+                executed += length
+                compiled += length
+        finally:
+            self.a, self.d, self.pc = a, d, pc
+            self.time += compiled
+        return executed
+
+    # Non API
+    def enter(self, pc):
+        " (function or None, length) of the block at pc, compile it once hot "
+        entry = self.cold.get(pc)
+        if entry is None:
+            entry = self.cold[pc] = [0, self.block_length(pc)]
+        entry[0] += 1
+        if entry[0] < self.HOT or entry[1] == 0:
+            return None, entry[1]
+
+        block = self.blocks[pc] = (self.compile_block(pc, entry[1]), entry[1])
+        del self.cold[pc]
+        return block
+
+    def block_length(self, start):
+        " Instructions up to and including the first jump, halts excluded. "
+        program = self.program
+        address = start
+        try:
+            while address - start < self.MAX_BLOCK:
+                comp, dest, jump = program[address]
+                if jump is self.HALT:
+                    break
+                address += 1
+                if jump:
+                    break
+        except IndexError:
+            raise Exception("Jump outside of ROM: {}".format(address))
+        return address - start
+
+    def compile_block(self, start, length):
+        " Generate, compile and return the Python function of one block. "
+        namespace = {'ram': self.ram, 'emulator': self}
+        lines = ['def block(a, d, ram=ram):']
+        # value of A when it is known at compile time
+        a_value = None
+        target = None
+
+        for address in range(start, start + length):
+            word = self.rom[address]
+            if word & 0x8000 == 0:
+                a_value = word
+                continue
+
+            a = 'a' if a_value is None else str(a_value)
+            m = 'ram[{}]'.format(a)
+            code = (word >> 6) & 0x7F
+            dest = (word >> 3) & 0b111
+            jump = word & 0b111
+            if code in self.MNEMONIC_TABLE:
+                expression = self.COMP_SOURCE[
+                    self.MNEMONIC_TABLE[code]].format(a=a, m=m)
+            else:
+                namespace['alu_{}'.format(code)] = self.alu(code)
+                expression = 'alu_{}({}, d, {})'.format(code, a, m)
+
+            if jump:
+                # the jump goes to A as it was before this instruction
+                if a_value is None and dest & 4:
+                    lines.append('    target = a')
+                    target = 'target'
+                else:
+                    target = a
+            if dest in [1, 2, 4] and not jump:
+                value = expression
+            else:
+                lines.append('    out = {}'.format(expression))
+                value = 'out'
+
+            if dest & 1:
+                lines.append('    {} = {}'.format(m, value))
+                if a_value is None:
+                    lines.append('    if {} <= a < {}:'.format(
+                        self.SCREEN, self.KBD))
+                    lines.append('        emulator.screen_dirty = True')
+                elif self.SCREEN <= a_value < self.KBD:
+                    lines.append('    emulator.screen_dirty = True')
+            if dest & 2:
+                lines.append('    d = {}'.format(value))
+            if dest & 4:
+                lines.append('    a = {}'.format(value))
+                a_value = None
+
+        a = 'a' if a_value is None else str(a_value)
+        following = start + length
+        if target is None:
+            lines.append('    return {}, d, {}'.format(a, following))
+        elif jump == 0b111:
+            lines.append('    return {}, d, {}'.format(a, target))
+        else:
+            lines.append('    if {}:'.format(self.JUMP_SOURCE[jump]))
+            lines.append('        return {}, d, {}'.format(a, target))
+            lines.append('    return {}, d, {}'.format(a, following))
+
+        source = '\n'.join(lines) + '\n'
+        exec(compile(source, '<block {}>'.format(start), 'exec'), namespace)
+        return namespace['block']
+
+
+def benchmark(filename, cycles=1000000):
+    " Time the interpreter and the JIT on the same program. "
+    emulators = [CPUEmulator(filename), JITEmulator(filename)]
+    timings = []
+    for emulator in emulators:
+        start = time.perf_counter()
+        emulator.run(cycles)
+        timings.append(time.perf_counter() - start)
+
+    interpreter, jit = emulators
+    if (interpreter.ram != jit.ram or interpreter.time != jit.time
+            or (interpreter.a, interpreter.d, interpreter.pc)
+            != (jit.a, jit.d, jit.pc)):
+        raise Exception("JIT state differs from the interpreter state")
+
+    for name, seconds in zip(['interpreter:', 'jit:'], timings):
+        print('{:<13}{:>8.2f} s  {:>6.2f} M instructions/s'.format(
+            name, seconds, interpreter.time / seconds / 1e6))
+    print('speedup:     {:.2f}x'.format(timings[0] / timings[1]))
+
+
+class TestScript:
+    """
+    Run a .tst script against the CPUEmulator and compare its output with
+    the .cmp file, like the CPUEmulator of the course does.
+    """
+
+    TOKEN_REGEX = re.compile(r'"[^"]*"|[{},;!]|[^\s{},;!]+')
+    COMMENT_REGEX = re.compile(r'//[^\n]*|/\*.*?\*/', re.S)
+    CONDITIONS = {
+        '=': lambda x, y: x == y,
+        '<>': lambda x, y: x != y,
+        '<': lambda x, y: x < y,
+        '>': lambda x, y: x > y,
+        '<=': lambda x, y: x <= y,
+        '>=': lambda x, y: x >= y,
+    }
+
+    def __init__(self, filename, jit=False):
+        self.filename = filename
+        self.directory = os.path.dirname(os.path.abspath(filename))
+        self.emulator = JITEmulator() if jit else CPUEmulator()
+        self.columns = []
+        self.output = None
+        self.compare = None
+        self.lines = 0
+        self.failure = None
+
+        with open(filename) as f:
+            tokens = self.TOKEN_REGEX.findall(
+                self.COMMENT_REGEX.sub(' ', f.read()))
+        self.script = self.parse(tokens)
+
+    def run(self):
+        " Execute the whole script, returns True if the comparison succeeded. "
+        try:
+            self.execute(self.script)
+        finally:
+            if self.output:
+                self.output.close()
+        if self.failure:
+            print(self.failure)
+            return False
+        print('End of script - Comparison ended successfully')
+        return True
+
+    # Non API
+    def parse(self, tokens):
+        " tokens -> list of commands, a command is a list of words "
+        commands = []
+        command = []
+        while tokens:
+            token = tokens.pop(0)
+            if token == '{':
+                # repeat n { ... } and while condition { ... }
+                command.append(self.parse(tokens))
+                commands.append(command)
+                command = []
+            elif token == '}':
+                break
+            elif token in [',', ';', '!']:
+                if command:
+                    commands.append(command)
+                command = []
+            else:
+                command.append(token)
+        if command:
+            commands.append(command)
+        return commands
+
+    def execute(self, commands):
+        emulator = self.emulator
+        for command in commands:
+            if self.failure:
+                return
+            name, args = command[0], command[1:]
+
+            if name == 'load':
+                emulator.load(self.path(args[0]))
+            elif name == 'output-file':
+                self.output = open(self.path(args[0]), 'w')
+            elif name == 'compare-to':
+                with open(self.path(args[0])) as f:
+                    self.compare = [line.rstrip('\n') for line in f]
+            elif name == 'output-list':
+                self.columns = [self.column(arg) for arg in args]
+                self.write(self.header())
+            elif name == 'set':
+                self.set(args[0], self.value(args[1]))
+            elif name == 'repeat':
+                count, body = int(args[0]), args[1]
+                if body == [['ticktock']]:
+                    # the common case, run it in one go
+                    emulator.run(count)
+                else:
+                    for _ in range(count):
+                        self.execute(body)
+            elif name == 'while':
+                left, operator, right, body = args
+                condition = self.CONDITIONS[operator]
+                while not self.failure and condition(
+                        self.get(left), self.value(right)):
+                    self.execute(body)
+            elif name in ['ticktock', 'tock']:
+                emulator.step()
+            elif name == 'tick':
+                pass
+            elif name == 'output':
+                self.write(self.line())
+            elif name == 'echo':
+                print(' '.join(args).strip('"'))
+            elif name == 'clear-echo':
+                pass
+            else:
+                raise Exception("Unknown script command: {}".format(name))
+
+    def path(self, name):
+        if name.endswith('.vm') or '.' not in name:
+            raise Exception("VM emulator scripts are not supported: {}".format(
+                name))
+        return os.path.join(self.directory, name)
+
+    def get(self, variable):
+        emulator = self.emulator
+        if variable.startswith('RAM['):
+            return self.signed(emulator.ram[int(variable[4:-1])])
+        elif variable.startswith('ROM['):
+            return self.signed(emulator.rom[int(variable[4:-1])])
+        elif variable == 'A':
+            return self.signed(emulator.a)
+        elif variable == 'D':
+            return self.signed(emulator.d)
+        elif variable == 'PC':
+            return emulator.pc
+        elif variable == 'time':
+            return emulator.time
+        raise Exception("Unknown variable: {}".format(variable))
+
+    def set(self, variable, value):
+        emulator = self.emulator
+        value &= 0xFFFF
+        if variable.startswith('RAM['):
+            emulator.ram[int(variable[4:-1])] = value
+        elif variable == 'A':
+            emulator.a = value
+        elif variable == 'D':
+            emulator.d = value
+        elif variable == 'PC':
+            emulator.pc = value
+        else:
+            raise Exception("Cannot set variable: {}".format(variable))
+
+    @staticmethod
+    def value(text):
+        " %X1F, %B101, %D-1 or a plain decimal "
+        if text.startswith('%X'):
+            return int(text[2:], 16)
+        elif text.startswith('%B'):
+            return int(text[2:], 2)
+        elif text.startswith('%D'):
+            return int(text[2:])
+        return int(text)
+
+    @staticmethod
+    def signed(word):
+        return word - 0x10000 if word & 0x8000 else word
+
+    @staticmethod
+    def column(spec):
+        " RAM[0]%D2.6.2 -> (variable, format, left pad, length, right pad) "
+        variable, _, fmt = spec.partition('%')
+        if not fmt:
+            return variable, 'D', 1, 6, 1
+        left, length, right = [int(n) for n in fmt[1:].split('.')]
+        return variable, fmt[0], left, length, right
+
+    def header(self):
+        cells = []
+        for variable, _, left, length, right in self.columns:
+            width = left + length + right
+            name = variable[:width]
+            space = width - len(name)
+            left = space // 2
+            cells.append(' ' * left + name + ' ' * (space - left))
+        return '|{}|'.format('|'.join(cells))
+
+    def line(self):
+        cells = []
+        for variable, fmt, left, length, right in self.columns:
+            value = self.get(variable)
+            if fmt == 'B':
+                text = '{:016b}'.format(value & 0xFFFF)[-length:]
+            elif fmt == 'X':
+                text = '{:04X}'.format(value & 0xFFFF)[-length:]
+            else:
+                text = str(value)
+            cells.append(' ' * left + text.rjust(length) + ' ' * right)
+        return '|{}|'.format('|'.join(cells))
+
+    def write(self, line):
+        if self.output:
+            self.output.write(line + '\n')
+        if self.compare is None:
+            return
+        self.lines += 1
+        if self.lines > len(self.compare) or not self.match(
+                line, self.compare[self.lines - 1]):
+            self.failure = 'Comparison failure at line {}'.format(self.lines)
+
+    @staticmethod
+    def match(line, expected):
+        """
+        Spaces are ignored, the compare files of the course do not all pad
+        numbers the same way. '*' in the compare file matches any character.
+        """
+        line, expected = line.replace(' ', ''), expected.replace(' ', '')
+        return len(line) == len(expected) and all(
+            e == '*' or c == e for c, e in zip(line, expected))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Run a .hack, .bin or .asm program, or a .tst script.')
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('-n', '--cycles', type=int, default=1000000,
+                            help='instructions to execute at most')
+    arg_parser.add_argument('--set', action='append', default=[],
+                            metavar='ADDRESS=VALUE',
+                            help='initialize a RAM word before running')
+    arg_parser.add_argument('--ram', action='append', default=[],
+                            metavar='ADDRESS',
+                            help='print a RAM word after running')
+    arg_parser.add_argument('--headless', action='store_true',
+                            help='do not print the screen after running')
+    arg_parser.add_argument('--screenshot', metavar='FILE',
+                            help='write the screen as a PBM image')
+    arg_parser.add_argument('--jit', action='store_true',
+                            help='compile hot basic blocks to Python')
+    arg_parser.add_argument('--benchmark', action='store_true',
+                            help='time the interpreter against the JIT')
+    args = arg_parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.path, args.cycles)
+        sys.exit(0)
+
+    if args.path.endswith('.tst'):
+        sys.exit(0 if TestScript(args.path, jit=args.jit).run() else 1)
+
+    if args.jit:
+        emulator = JITEmulator(args.path)
+    else:
+        emulator = CPUEmulator(args.path)
+    for assignment in args.set:
+        address, value = assignment.split('=')
+        emulator.ram[int(address)] = int(value) & 0xFFFF
+    executed = emulator.run(args.cycles)
+
+    print('{} instructions, {}'.format(
+        executed, 'halted' if emulator.halted else 'running'))
+    for address in args.ram:
+        print('RAM[{}] = {}'.format(
+            address, TestScript.signed(emulator.ram[int(address)])))
+    if args.screenshot:
+        emulator.screenshot(args.screenshot)
+    if not args.headless:
+        print(emulator.screen_text())
@@ -0,0 +1,179 @@
+"""
+Profiler: attribute the cycles of a translated VM program to its functions
+
+Symbol map:
+    - `vm.py --symbols` writes Prog.map next to Prog.asm
+        - function <name> <address>: the entry point of a VM function
+        - source <address> <function> <file> <line>: the instructions from
+          address on come from that line of that .vm file
+    - Rows survive the peephole optimizer, a rewritten window keeps the
+      source of its first instruction
+
+Profiling:
+    - CPUEmulator.run reports every taken jump to Profiler.jumped:
+        - a jump to a function entry with a new frame (LCL) is a call
+        - a jump to the return address of the innermost call is its return
+    - The cycles between two of them go to the current call stack
+
+Output:
+    - Collapsed stacks, one `Sys.init;Main.main;Math.multiply 1234` line
+      per call stack, the input of flamegraph.pl and speedscope
+    - A table of calls, self cycles and total cycles per function
+
+"""
+
+import os
+import bisect
+import argparse
+
+from emulator import CPUEmulator
+
+
+class SymbolMap:
+    def __init__(self, filename):
+        # address -> function
+        self.entries = {}
+        # parallel lists, in address order
+        self.addresses = []
+        self.sources = []
+
+        with open(filename) as f:
+            for line in f:
+                row = line.split()
+                if not row:
+                    continue
+                if row[0] == 'function':
+                    self.entries[int(row[2])] = row[1]
+                elif row[0] == 'source':
+                    self.addresses.append(int(row[1]))
+                    self.sources.append((row[2], row[3], int(row[4])))
+                else:
+                    raise Exception("Unknown symbol map row: {}".format(
+                        line.strip()))
+
+    def source(self, address):
+        " (function, file, line) of the VM command at a ROM address. "
+        i = bisect.bisect_right(self.addresses, address) - 1
+        if i < 0:
+            return None
+        return self.sources[i]
+
+    def function(self, address):
+        source = self.source(address)
+        return source[0] if source else None
+
+
+class Profiler(CPUEmulator):
+    def __init__(self, filename, map_filename=None):
+        " Load a translated program and the symbol map written with it. "
+        if map_filename is None:
+            map_filename = os.path.splitext(filename)[0] + '.map'
+        self.symbols = SymbolMap(map_filename)
+        CPUEmulator.__init__(self, filename)
+
+    def reset(self):
+        CPUEmulator.reset(self)
+        # function -> number of calls
+        self.calls = {}
+        # collapsed stack -> cycles
+        self.stacks = {}
+        # (collapsed stack, function, return address, LCL of the frame)
+        bottom = self.symbols.function(0) or 'main'
+        self.stack = [(bottom, bottom, None, None)]
+        # the cycles up to this time are charged already
+        self.charged = 0
+
+    def run(self, cycles=1000000):
+        """
+        Execute at most cycles instructions like CPUEmulator.run and charge
+        them to the call stacks they ran in.
+        """
+        try:
+            return CPUEmulator.run(self, cycles)
+        finally:
+            self.charge(self.time)
+
+    def jumped(self, target, executed):
+        " Enter or leave a call on the jumps that make one. "
+        path, function, return_address, frame = self.stack[-1]
+        entries = self.symbols.entries
+        if target == return_address:
+            self.charge(self.time + executed)
+            self.stack.pop()
+        elif target in entries and (
+                entries[target] != function or self.ram[1] != frame):
+            # a goto to the first command of the function itself leaves
+            # LCL alone, a call never does
+            self.charge(self.time + executed)
+            function = entries[target]
+            self.calls[function] = self.calls.get(function, 0) + 1
+            frame = self.ram[1]
+            self.stack.append((path + ';' + function, function,
+                               self.ram[(frame - 5) & 0xFFFF], frame))
+
+    def collapsed(self):
+        " The call stacks in the collapsed format of flamegraph.pl. "
+        return ''.join('{} {}\n'.format(path, cycles)
+                       for path, cycles in sorted(self.stacks.items()))
+
+    def functions(self):
+        """
+        function -> (calls, self cycles, total cycles), a recursive
+        function counts its cycles once in its total.
+        """
+        own = {}
+        total = {}
+        for path, cycles in self.stacks.items():
+            functions = path.split(';')
+            own[functions[-1]] = own.get(functions[-1], 0) + cycles
+            for function in set(functions):
+                total[function] = total.get(function, 0) + cycles
+        return dict((function, (self.calls.get(function, 0),
+                                own.get(function, 0), total[function]))
+                    for function in total)
+
+    def report(self, limit=20):
+        lines = ['{:<32} {:>9} {:>12} {:>6} {:>12}'.format(
+            'function', 'calls', 'self', '%', 'total')]
+        time = max(self.time, 1)
+        functions = sorted(self.functions().items(),
+                           key=lambda item: -item[1][1])
+        for function, (calls, own, total) in functions[:limit]:
+            lines.append('{:<32} {:>9} {:>12} {:>6.1f} {:>12}'.format(
+                function, calls, own, 100.0 * own / time, total))
+        return '\n'.join(lines)
+
+    # Non API
+    def charge(self, time):
+        " The cycles from the last charge up to time go to the call stack. "
+        if time > self.charged:
+            path = self.stack[-1][0]
+            self.stacks[path] = self.stacks.get(path, 0) + time - self.charged
+        self.charged = time
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Profile a translated VM program per function.')
+    arg_parser.add_argument('path', help='.asm or .hack program')
+    arg_parser.add_argument('--map', help='symbol map, Prog.map by default')
+    arg_parser.add_argument('-n', '--cycles', type=int, default=10000000,
+                            help='instructions to execute at most')
+    arg_parser.add_argument('--collapsed', metavar='FILE',
+                            help='write the collapsed stacks for a '
+                                 'flame graph')
+    arg_parser.add_argument('--top', type=int, default=20,
+                            help='functions to list')
+    args = arg_parser.parse_args()
+
+    profiler = Profiler(args.path, args.map)
+    executed = profiler.run(args.cycles)
+
+    source = profiler.symbols.source(profiler.pc)
+    print('{} instructions, {} in {} ({}.vm:{})'.format(
+        executed, 'halted' if profiler.halted else 'running',
+        *(source or ('?', '?', '?'))))
+    print(profiler.report(args.top))
+    if args.collapsed:
+        with open(args.collapsed, 'w') as f:
+            f.write(profiler.collapsed())
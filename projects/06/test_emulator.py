@@ -0,0 +1,54 @@
+import unittest
+
+import emulator
+from emulator import CPUEmulator
+
+
+@unittest.skipIf(emulator.numpy is None, "numpy is not installed")
+class NumpyScreenTest(unittest.TestCase):
+    " The numpy paths must agree with the emulator and the fallbacks. "
+
+    def setUp(self):
+        self.emulator = CPUEmulator()
+        ram = self.emulator.ram
+        ram[CPUEmulator.SCREEN] = 0x8001
+        ram[CPUEmulator.SCREEN + 5 * 32 + 3] = 0x00F0
+        ram[CPUEmulator.KBD - 1] = 0xFFFF
+
+    def without_numpy(self, function):
+        numpy = emulator.numpy
+        emulator.numpy = None
+        try:
+            return function()
+        finally:
+            emulator.numpy = numpy
+
+    def test_memory_shares_the_ram(self):
+        memory = self.emulator.memory()
+        self.assertEqual(memory[CPUEmulator.SCREEN], 0x8001)
+        memory[100] = 0xBEEF
+        self.assertEqual(self.emulator.ram[100], 0xBEEF)
+        self.emulator.ram[101] = 7
+        self.assertEqual(memory[101], 7)
+
+    def test_frame_matches_pixel(self):
+        frame = self.emulator.frame()
+        self.assertEqual(frame.shape, (256, 512))
+        for y, x in [(0, 0), (0, 1), (0, 15), (5, 51), (5, 52), (5, 55),
+                     (5, 56), (255, 496), (255, 511)]:
+            self.assertEqual(frame[y][x], self.emulator.pixel(x, y))
+        self.assertEqual(frame.sum(), 2 + 4 + 16)
+
+    def test_frame_matches_fallback(self):
+        frame = self.emulator.frame()
+        rows = self.without_numpy(self.emulator.frame)
+        for y in range(256):
+            self.assertEqual(bytes(frame[y].tolist()), rows[y])
+
+    def test_screen_text_matches_fallback(self):
+        self.assertEqual(self.emulator.screen_text(),
+                         self.without_numpy(self.emulator.screen_text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = os.path.join(HERE, os.pardir)
+sys.path.insert(0, os.path.join(PROJECTS, '08'))
+
+from profiler import Profiler
+from vm import Translator
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), 'FibonacciElement')
+        sources = os.path.join(PROJECTS, '08', 'FunctionCalls',
+                               'FibonacciElement')
+        os.mkdir(self.directory)
+        for name in ['Main.vm', 'Sys.vm']:
+            shutil.copy(os.path.join(sources, name), self.directory)
+        Translator(self.directory, symbols=True)
+        self.asm = os.path.join(self.directory, 'FibonacciElement.asm')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    def test_every_cycle_is_charged(self):
+        profiler = Profiler(self.asm)
+        profiler.run(100000)
+        self.assertTrue(profiler.halted)
+        self.assertEqual(sum(profiler.stacks.values()), profiler.time)
+        self.assertEqual(profiler.calls['Main.fibonacci'], 9)
+        self.assertEqual(profiler.calls['Sys.init'], 1)
+
+    def test_runs_in_slices(self):
+        whole = Profiler(self.asm)
+        whole.run(100000)
+        sliced = Profiler(self.asm)
+        while not sliced.halted:
+            sliced.run(7)
+        self.assertEqual(sliced.stacks, whole.stacks)
+        self.assertEqual(sliced.calls, whole.calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,7 +32,6 @@ And what's the content of subroutine call?
 
 """
 
-import re
 import sys
 
 
@@ -63,18 +62,21 @@ class Translator:
 
 class Parser:
     def __init__(self, filename):
-        self.file = open(filename, 'r')
-        self.input = self.format_lines(self.file.read())
-        self.index = -1
-        self.length = len(self.input)
-        self.file.close()
+        # one command of lookahead, the file is never read as a whole
+        self.commands = self.stream(filename)
+        self.next_command = next(self.commands, None)
+
+    def __iter__(self):
+        while self.hasMoreCommand():
+            self.advance()
+            yield self.command
 
     def hasMoreCommand(self):
-        return self.index < self.length - 1
+        return self.next_command is not None
 
     def advance(self):
-        self.index += 1
-        self.command = self.input[self.index].strip().split(' ')
+        self.command = self.next_command
+        self.next_command = next(self.commands, None)
 
     def commandType(self):
         return self.command[0]
@@ -89,14 +91,14 @@ class Parser:
             return ''
 
     # Non API
-    def format_lines(self, lines):
-        # remove blank line and comment
-        INLINE_COMMENT_REGEX = re.compile(r'//.*\n')
-        without_inline = re.sub(INLINE_COMMENT_REGEX, '\n', lines)
-        format_lines = [
-            x.strip() for x in without_inline.splitlines() if x != ''
-        ]
-        return format_lines
+    @staticmethod
+    def stream(filename):
+        " yield every command of the file as a tuple of its tokens "
+        with open(filename, 'r') as file:
+            for line in file:
+                command = line.split('//', 1)[0].split()
+                if command:
+                    yield tuple(command)
 
 
 class CodeWriter:
@@ -0,0 +1,451 @@
+"""
+VM Interpreter: run .vm programs directly, without translating them to Hack
+
+The same machine as the translated code:
+    - RAM: the Hack memory map, SP, LCL, ARG, THIS and THAT in RAM[0..4]
+    - stack at 256, statics from 16, heap and screen where the OS puts them
+    - call frames laid out exactly like CodeWriter.writeCall does
+
+Loading:
+    - Every command of every .vm file is decoded once into (opcode, x, y)
+    - Labels, functions and statics are resolved to indexes and addresses
+    - A program with Sys.init is bootstrapped like the translator does
+
+Running:
+    - One VM command per cycle in a tight loop, SP kept in a local
+    - Native mode calls the Python versions of OS functions in a
+      NativeRegistry instead of their VM code, with the same results on
+      the same RAM, functions without VM code are always native
+
+Conformance:
+    - Run every projects/12 *Test directory once with the VM code of the
+      OS and once with the natives, and compare the machines they leave
+
+"""
+
+import os
+import sys
+import argparse
+from array import array
+
+from vm import Parser, FileSet
+from native import OS, Diverges, less, greater, signed
+
+
+# opcodes, roughly in order of how often they run
+PUSH_CONSTANT = 0
+PUSH_SEGMENT = 1
+PUSH_ADDRESS = 2
+POP_SEGMENT = 3
+POP_ADDRESS = 4
+ADD = 5
+SUB = 6
+IF_GOTO = 7
+GOTO = 8
+EQ = 9
+GT = 10
+LT = 11
+NOT = 12
+NEG = 13
+AND = 14
+OR = 15
+CALL = 16
+FUNCTION = 17
+RETURN = 18
+NATIVE = 19
+MISSING = 20
+HALT = 21
+
+
+class VMInterpreter:
+
+    RAM_SIZE = 65536
+    # segment -> register holding its base address
+    SEGMENT_REGISTERS = {
+        'local': 1,
+        'argument': 2,
+        'this': 3,
+        'that': 4,
+    }
+    # segment -> fixed base address
+    SEGMENT_ADDRESSES = {
+        'pointer': 3,
+        'temp': 5,
+    }
+    ARITHMETIC_OPCODES = {
+        'add': ADD,
+        'sub': SUB,
+        'neg': NEG,
+        'eq': EQ,
+        'gt': GT,
+        'lt': LT,
+        'and': AND,
+        'or': OR,
+        'not': NOT,
+    }
+    STATIC_BASE = 16
+    STACK_BASE = 256
+
+    def __init__(self, paths, native=False, registry=OS):
+        " Load every .vm file of paths, a file of an earlier path wins. "
+        if isinstance(paths, str):
+            paths = [paths]
+        self.ram = array('H', bytes(2 * self.RAM_SIZE))
+        self.native = native
+        self.registry = registry
+        # (file, index) -> address
+        self.statics = {}
+        self.functions = {}
+        self.program = []
+
+        filenames = {}
+        for path in paths:
+            for filename in sorted(FileSet(path, 'vm').fileList):
+                filenames.setdefault(os.path.basename(filename), filename)
+        self.load(list(filenames.values()))
+        self.reset()
+
+    def reset(self):
+        self.pc = 0
+        self.time = 0
+        self.halted = False
+        if 'Sys.init' in self.functions:
+            self.ram[0] = self.STACK_BASE
+            # call Sys.init 0, returning to the HALT at the end
+            self.call(self.functions['Sys.init'], 0, len(self.program) - 1)
+
+    def run(self, cycles=1000000):
+        """
+        Execute at most cycles VM commands, stop earlier when the program
+        halts. Returns the number of commands executed.
+        """
+        program = self.program
+        ram = self.ram
+        pc = self.pc
+        sp = ram[0]
+        end = len(program) - 1
+
+        executed = 0
+        try:
+            for executed in range(1, cycles + 1):
+                op, x, y = program[pc]
+                pc += 1
+                if op == PUSH_CONSTANT:
+                    ram[sp] = x
+                    sp += 1
+                elif op == PUSH_SEGMENT:
+                    address = (ram[x] + y) & 0xFFFF
+                    # RAM[0] is only up to date outside of this loop
+                    ram[sp] = ram[address] if address else sp
+                    sp += 1
+                elif op == PUSH_ADDRESS:
+                    ram[sp] = ram[x]
+                    sp += 1
+                elif op == POP_SEGMENT:
+                    sp -= 1
+                    address = (ram[x] + y) & 0xFFFF
+                    if address:
+                        ram[address] = ram[sp]
+                    else:
+                        sp = ram[sp]
+                elif op == POP_ADDRESS:
+                    sp -= 1
+                    ram[x] = ram[sp]
+                elif op == ADD:
+                    sp -= 1
+                    ram[sp - 1] = (ram[sp - 1] + ram[sp]) & 0xFFFF
+                elif op == SUB:
+                    sp -= 1
+                    ram[sp - 1] = (ram[sp - 1] - ram[sp]) & 0xFFFF
+                elif op == IF_GOTO:
+                    sp -= 1
+                    if ram[sp]:
+                        pc = x
+                elif op == GOTO:
+                    if x == pc - 1:
+                        # label L, goto L: the program halts here
+                        pc = x
+                        self.halted = True
+                        break
+                    pc = x
+                elif op == EQ:
+                    sp -= 1
+                    ram[sp - 1] = 0xFFFF if ram[sp - 1] == ram[sp] else 0
+                elif op == GT:
+                    sp -= 1
+                    ram[sp - 1] = 0xFFFF if greater(ram[sp - 1], ram[sp]) else 0
+                elif op == LT:
+                    sp -= 1
+                    ram[sp - 1] = 0xFFFF if less(ram[sp - 1], ram[sp]) else 0
+                elif op == NOT:
+                    ram[sp - 1] ^= 0xFFFF
+                elif op == NEG:
+                    ram[sp - 1] = -ram[sp - 1] & 0xFFFF
+                elif op == AND:
+                    sp -= 1
+                    ram[sp - 1] &= ram[sp]
+                elif op == OR:
+                    sp -= 1
+                    ram[sp - 1] |= ram[sp]
+                elif op == CALL:
+                    # return address, LCL, ARG, THIS, THAT
+                    ram[sp] = pc
+                    ram[sp + 1:sp + 5] = ram[1:5]
+                    sp += 5
+                    ram[2] = sp - 5 - y
+                    ram[1] = sp
+                    pc = x
+                elif op == FUNCTION:
+                    # y is an array of x zeros
+                    ram[sp:sp + x] = y
+                    sp += x
+                elif op == RETURN:
+                    frame = ram[1]
+                    if frame < 5:
+                        raise Exception(
+                            "Return with LCL {}, below its frame".format(
+                                frame))
+                    pc = ram[frame - 5]
+                    if pc > end:
+                        # a return address of translated code, not ours
+                        pc = end
+                    argument = ram[2]
+                    ram[argument] = ram[sp - 1]
+                    sp = argument + 1
+                    ram[1] = ram[frame - 4]
+                    ram[2] = ram[frame - 3]
+                    ram[3] = ram[frame - 2]
+                    ram[4] = ram[frame - 1]
+                elif op == NATIVE:
+                    sp -= y
+                    ram[0] = sp
+                    # what return restores in VM code: SP from ARG, and
+                    # LCL, ARG, THIS and THAT from the frame
+                    registers = ram[1:5]
+                    value = x(self, *ram[sp:sp + y]) & 0xFFFF
+                    ram[1:5] = registers
+                    ram[sp] = value
+                    sp += 1
+                elif op == HALT:
+                    pc -= 1
+                    self.halted = True
+                    break
+                else:
+                    raise Exception("Unknown function: {}".format(x))
+        finally:
+            ram[0] = sp
+            self.pc = pc
+            self.time += executed
+
+        return executed
+
+    def static(self, filename, index):
+        " RAM address of static index of a file, allocated on first use. "
+        key = (filename, index)
+        if key not in self.statics:
+            self.statics[key] = self.STATIC_BASE + len(self.statics)
+        return self.statics[key]
+
+    # Non API
+    def load(self, filenames):
+        """
+        Decode every file, labels are resolved per function once the file
+        is read and calls once every file is read.
+        """
+        program = self.program
+        calls = []
+        for filename in filenames:
+            name = os.path.splitext(os.path.basename(filename))[0]
+            function = None
+            # (function, label) -> index, and the gotos waiting for them
+            labels = {}
+            jumps = []
+
+            for command in Parser(filename):
+                kind = command[0]
+                if kind == 'label':
+                    labels[(function, command[1])] = len(program)
+                    continue
+
+                if kind in self.ARITHMETIC_OPCODES:
+                    program.append((self.ARITHMETIC_OPCODES[kind], None, None))
+                elif kind in ['push', 'pop']:
+                    program.append(self.decode_push_pop(
+                        kind, command[1], int(command[2]), name))
+                elif kind in ['goto', 'if-goto']:
+                    op = GOTO if kind == 'goto' else IF_GOTO
+                    jumps.append((len(program), op, function, command[1]))
+                    program.append(None)
+                elif kind == 'function':
+                    function = command[1]
+                    if function in self.functions:
+                        raise Exception(
+                            "Function defined twice: {}".format(function))
+                    self.functions[function] = len(program)
+                    locals_count = int(command[2])
+                    program.append((FUNCTION, locals_count,
+                                    array('H', bytes(2 * locals_count))))
+                elif kind == 'call':
+                    calls.append((len(program), command[1], int(command[2])))
+                    program.append(None)
+                elif kind == 'return':
+                    program.append((RETURN, None, None))
+                else:
+                    raise Exception("Unknown command: {}".format(kind))
+
+            for index, op, function, label in jumps:
+                if (function, label) not in labels:
+                    raise Exception("Unknown label: {}".format(label))
+                program[index] = (op, labels[(function, label)], None)
+
+        for index, function, args in calls:
+            native = self.registry.lookup(function, args) \
+                if self.registry else None
+            if native and (self.native or function not in self.functions):
+                program[index] = (NATIVE, native, args)
+            elif function in self.functions:
+                program[index] = (CALL, self.functions[function], args)
+            else:
+                program[index] = (MISSING, function, args)
+
+        program.append((HALT, None, None))
+        if len(program) > 0xFFFF:
+            raise Exception("Program too long: {} commands".format(
+                len(program)))
+
+    def decode_push_pop(self, kind, segment, index, name):
+        if segment == 'constant':
+            if kind == 'pop':
+                raise Exception("Cannot pop to constant")
+            return PUSH_CONSTANT, index & 0xFFFF, None
+
+        if segment in self.SEGMENT_REGISTERS:
+            op = PUSH_SEGMENT if kind == 'push' else POP_SEGMENT
+            return op, self.SEGMENT_REGISTERS[segment], index
+        elif segment in self.SEGMENT_ADDRESSES:
+            address = self.SEGMENT_ADDRESSES[segment] + index
+        elif segment == 'static':
+            address = self.static(name, index)
+        else:
+            raise Exception("Unknown segment: {}".format(segment))
+        op = PUSH_ADDRESS if kind == 'push' else POP_ADDRESS
+        return op, address, None
+
+    def call(self, target, args, return_address):
+        ram = self.ram
+        sp = ram[0]
+        ram[sp] = return_address
+        ram[sp + 1:sp + 5] = ram[1:5]
+        sp += 5
+        ram[0] = sp
+        ram[2] = sp - 5 - args
+        ram[1] = sp
+        self.pc = target
+
+
+def conformance(os_directory, cycles=10000000):
+    """
+    Run every *Test directory of os_directory with the VM code of the OS,
+    then with the natives, and compare RAM: registers, statics, the live
+    stack, the heap and the screen. temp is scratch and is left out.
+    A file of the test directory replaces the OS file of the same name,
+    e.g. a Sys.vm that only initializes what the test uses.
+    Functions without VM code are native in both runs, a Diverges raised
+    by one of them counts as not terminating.
+    Only a test both runs finish is compared, one that either run never
+    finishes is inconclusive. Returns the names of the tests that differ
+    and of the tests that were compared.
+    """
+    failures = []
+    compared = []
+    tests = sorted(
+        name for name in os.listdir(os_directory)
+        if name.endswith('Test')
+        and os.path.isdir(os.path.join(os_directory, name)))
+    for name in tests:
+        paths = [os.path.join(os_directory, name), os_directory]
+        results = []
+        for native in [False, True]:
+            interpreter = VMInterpreter(paths, native=native)
+            try:
+                interpreter.run(cycles)
+                error = None
+            except Exception as e:
+                error = e
+            results.append((interpreter, error))
+
+        (vm, vm_error), (native, native_error) = results
+        differences = [
+            address for address in conformance_addresses(vm)
+            if vm.ram[address] != native.ram[address]
+        ]
+        if (isinstance(native_error, Diverges) and not vm.halted
+                and (not vm_error or isinstance(vm_error, Diverges))):
+            status = 'INCONCLUSIVE, both never terminate: {}'.format(
+                native_error)
+        elif vm_error or native_error:
+            status = 'ERROR vm: {} native: {}'.format(vm_error, native_error)
+        elif vm.halted != native.halted:
+            status = 'DIFF halted vm: {} native: {}'.format(
+                vm.halted, native.halted)
+        elif not vm.halted:
+            # stopped at different points of the same loop, e.g. waiting
+            # for a key, there is nothing to compare yet
+            status = 'INCONCLUSIVE, both still running'
+        elif differences:
+            status = 'DIFF {} words, first at RAM[{}]'.format(
+                len(differences), differences[0])
+        else:
+            status = 'OK'
+        print('{:<14} {:>9} VM commands {:>9} native  {}'.format(
+            name, vm.time, native.time, status))
+        if status == 'OK' or status.startswith('DIFF'):
+            compared.append(name)
+        if status.startswith('DIFF') or status.startswith('ERROR'):
+            failures.append(name)
+    return failures, compared
+
+
+def conformance_addresses(vm):
+    return (list(range(0, 5)) + list(range(13, vm.ram[0]))
+            + list(range(2048, 24577)))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Run .vm files or directories without translating them.')
+    arg_parser.add_argument('paths', nargs='*')
+    arg_parser.add_argument('-n', '--cycles', type=int, default=10000000,
+                            help='VM commands to execute at most')
+    arg_parser.add_argument('--native', action='store_true',
+                            help='run OS functions natively in Python')
+    arg_parser.add_argument('--set', action='append', default=[],
+                            metavar='ADDRESS=VALUE',
+                            help='initialize a RAM word before running')
+    arg_parser.add_argument('--ram', action='append', default=[],
+                            metavar='ADDRESS',
+                            help='print a RAM word after running')
+    arg_parser.add_argument('--conformance', metavar='DIRECTORY',
+                            help='compare the natives with the VM code of '
+                                 'the OS in DIRECTORY on its tests')
+    args = arg_parser.parse_args()
+
+    if args.conformance:
+        failures, compared = conformance(args.conformance, args.cycles)
+        print('{} compared, {} failed'.format(len(compared), len(failures)))
+        # nothing compared proves nothing
+        sys.exit(1 if failures or not compared else 0)
+    if not args.paths:
+        arg_parser.error('no .vm files or directories given')
+
+    interpreter = VMInterpreter(args.paths, native=args.native)
+    for assignment in args.set:
+        address, value = assignment.split('=')
+        interpreter.ram[int(address)] = int(value) & 0xFFFF
+    executed = interpreter.run(args.cycles)
+
+    print('{} commands, {}'.format(
+        executed, 'halted' if interpreter.halted else 'running'))
+    for address in args.ram:
+        print('RAM[{}] = {}'.format(
+            address, signed(interpreter.ram[int(address)])))
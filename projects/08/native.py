@@ -0,0 +1,740 @@
+"""
+Native OS: Python versions of the projects/12 OS functions for VMInterpreter
+
+Registry:
+    - NativeRegistry maps a VM function name and its number of arguments
+      to a Python function called as native(interpreter, *args)
+    - OS is the registry of the projects/12 OS, extend a copy of it or
+      build a new one to plug in other functions
+
+Semantics:
+    - Every native is a port of the Jack code, word for word: 16-bit
+      arithmetic, comparisons from the sign of x - y like the translated
+      lt and gt, the same statics and the same heap layout
+    - Where the Jack code never terminates, the port raises instead
+    - Screen and Output have no VM code in projects/12, their natives
+      follow the Jack code as it was meant to run
+    - interpreter.conformance compares the natives with the VM code
+
+"""
+
+
+def signed(word):
+    return word - 0x10000 if word & 0x8000 else word
+
+
+def less(x, y):
+    " x < y the way the translated lt computes it, from the sign of x - y "
+    return (x - y) & 0x8000 != 0
+
+
+def greater(x, y):
+    " x > y the way the translated gt computes it, from the sign of x - y "
+    difference = (x - y) & 0xFFFF
+    return difference != 0 and not difference & 0x8000
+
+
+class Diverges(Exception):
+    " Raised by a native where its Jack code would never terminate. "
+
+
+class NativeRegistry:
+    def __init__(self):
+        # function -> (native, number of arguments)
+        self.natives = {}
+
+    def register(self, function, args):
+        " Decorator, registers the decorated Python function as function. "
+        def decorator(native):
+            self.natives[function] = (native, args)
+            return native
+        return decorator
+
+    def lookup(self, function, args):
+        " The native of function called with args arguments, or None. "
+        native, arity = self.natives.get(function, (None, None))
+        return native if arity == args else None
+
+    def copy(self):
+        registry = NativeRegistry()
+        registry.natives.update(self.natives)
+        return registry
+
+    def __contains__(self, function):
+        return function in self.natives
+
+
+OS = NativeRegistry()
+
+TRUE = 0xFFFF
+FALSE = 0
+
+
+def peek(vm, array, index):
+    " array[index] of the Jack code "
+    return vm.ram[(array + index) & 0xFFFF]
+
+
+def poke(vm, array, index, value):
+    " let array[index] = value of the Jack code "
+    vm.ram[(array + index) & 0xFFFF] = value & 0xFFFF
+
+
+def static(vm, name, index):
+    return vm.ram[vm.static(name, index)]
+
+
+def set_static(vm, name, index, value):
+    vm.ram[vm.static(name, index)] = value & 0xFFFF
+
+
+# Math: static Array bit_masks
+@OS.register('Math.init', 0)
+def math_init(vm):
+    bit_masks = array_new(vm, 16)
+    set_static(vm, 'Math', 0, bit_masks)
+    for bit in range(16):
+        poke(vm, bit_masks, bit, 1 << bit)
+    return 0
+
+
+@OS.register('Math.abs', 1)
+def math_abs(vm, x):
+    return -x & 0xFFFF if less(x, 0) else x
+
+
+@OS.register('Math.multiply', 2)
+def math_multiply(vm, x, y):
+    # shifting and adding 16 times is x * y modulo 2^16
+    return (x * y) & 0xFFFF
+
+
+@OS.register('Math.divide', 2)
+def math_divide(vm, x, y):
+    negative = less(x, 0) != less(y, 0)
+    x = math_abs(vm, x)
+    y = math_abs(vm, y)
+    if greater(y, x):
+        return 0
+    if y == 0:
+        raise Diverges("Math.divide by zero")
+
+    q = math_divide(vm, x, (y + y) & 0xFFFF)
+    if less((x - 2 * q * y) & 0xFFFF, y):
+        result = (q + q) & 0xFFFF
+    else:
+        result = (q + q + 1) & 0xFFFF
+    return -result & 0xFFFF if negative else result
+
+
+@OS.register('Math.sqrt', 1)
+def math_sqrt(vm, x):
+    bit_masks = static(vm, 'Math', 0)
+    y = 0
+    for j in range(7, 0, -1):
+        test = (y + peek(vm, bit_masks, j)) & 0xFFFF
+        test_square = (test + test) & 0xFFFF
+        if greater(test, x) and greater(test_square, 0):
+            y = test
+    return y
+
+
+@OS.register('Math.max', 2)
+def math_max(vm, a, b):
+    return a if greater(a, b) else b
+
+
+@OS.register('Math.min', 2)
+def math_min(vm, a, b):
+    return a if less(a, b) else b
+
+
+@OS.register('Math.bit', 2)
+def math_bit(vm, x, n):
+    return TRUE if x & peek(vm, static(vm, 'Math', 0), n) else FALSE
+
+
+@OS.register('Math.two_to_the', 1)
+def math_two_to_the(vm, bit):
+    return peek(vm, static(vm, 'Math', 0), bit)
+
+
+# Memory: static Array ram, freeList, NO_BLOCK; static int heapBase,
+# FL_LENGTH, FL_NEXT, ALLOC_SIZE
+@OS.register('Memory.init', 0)
+def memory_init(vm):
+    set_static(vm, 'Memory', 0, 0)
+    set_static(vm, 'Memory', 3, 2048)
+    set_static(vm, 'Memory', 1, 2048)
+    set_static(vm, 'Memory', 4, 0)
+    set_static(vm, 'Memory', 5, 1)
+    free_list = static(vm, 'Memory', 1)
+    poke(vm, free_list, static(vm, 'Memory', 4), 16384 - 2048)
+    poke(vm, free_list, static(vm, 'Memory', 5), 0)
+    return 0
+
+
+@OS.register('Memory.peek', 1)
+def memory_peek(vm, address):
+    return peek(vm, static(vm, 'Memory', 0), address)
+
+
+@OS.register('Memory.poke', 2)
+def memory_poke(vm, address, value):
+    poke(vm, static(vm, 'Memory', 0), address, value)
+    return 0
+
+
+@OS.register('Memory.alloc', 1)
+def memory_alloc(vm, size):
+    length = static(vm, 'Memory', 4)
+    next = static(vm, 'Memory', 5)
+
+    found = memory_first_fit(vm, size)
+    if found:
+        result = (found + peek(vm, found, length) - size - 1) & 0xFFFF
+        poke(vm, result, next, 0)
+        poke(vm, result, length, size)
+        poke(vm, found, length, peek(vm, found, length) - size - 2)
+    else:
+        result = static(vm, 'Memory', 1)
+        free_list = (result + size + 2) & 0xFFFF
+        set_static(vm, 'Memory', 1, free_list)
+        poke(vm, result, next, free_list)
+        poke(vm, result, length, size)
+        poke(vm, free_list, length, peek(vm, free_list, length) - size - 2)
+    return result
+
+
+@OS.register('Memory.deAlloc', 1)
+def memory_dealloc(vm, o):
+    next = static(vm, 'Memory', 5)
+    free = static(vm, 'Memory', 1)
+    for _ in range(0x10000):
+        if not peek(vm, free, next):
+            poke(vm, free, next, o)
+            return 0
+        free = peek(vm, free, next)
+    raise Diverges("Memory.deAlloc on a cyclic free list")
+
+
+@OS.register('Memory.first_fit', 1)
+def memory_first_fit(vm, size):
+    length = static(vm, 'Memory', 4)
+    next = static(vm, 'Memory', 5)
+    free = static(vm, 'Memory', 1)
+    for _ in range(0x10000):
+        if not peek(vm, free, next):
+            return 0
+        if greater(peek(vm, free, length), (size + 2) & 0xFFFF):
+            # the Jack code never leaves this block again
+            raise Diverges("Memory.first_fit found a block")
+        free = peek(vm, free, next)
+    raise Diverges("Memory.first_fit on a cyclic free list")
+
+
+# Array
+@OS.register('Array.new', 1)
+def array_new(vm, size):
+    return memory_alloc(vm, size)
+
+
+@OS.register('Array.dispose', 1)
+def array_dispose(vm, this):
+    return memory_dealloc(vm, this)
+
+
+# String: field Array buffer; field int buffer_len; field Array str_len
+@OS.register('String.new', 1)
+def string_new(vm, max_length):
+    this = memory_alloc(vm, 3)
+    if max_length == 0:
+        max_length = 1
+    poke(vm, this, 0, array_new(vm, max_length))
+    poke(vm, this, 1, max_length)
+    poke(vm, this, 2, 0)
+    return this
+
+
+@OS.register('String.dispose', 1)
+def string_dispose(vm, this):
+    array_dispose(vm, peek(vm, this, 0))
+    return 0
+
+
+@OS.register('String.length', 1)
+def string_length(vm, this):
+    return peek(vm, this, 2)
+
+
+@OS.register('String.charAt', 2)
+def string_char_at(vm, this, j):
+    return peek(vm, peek(vm, this, 0), j)
+
+
+@OS.register('String.setCharAt', 3)
+def string_set_char_at(vm, this, j, c):
+    poke(vm, peek(vm, this, 0), j, c)
+    return 0
+
+
+@OS.register('String.appendChar', 2)
+def string_append_char(vm, this, c):
+    length = peek(vm, this, 2)
+    if less(length, peek(vm, this, 1)):
+        poke(vm, peek(vm, this, 0), length, c)
+        poke(vm, this, 2, length + 1)
+    return this
+
+
+@OS.register('String.eraseLastChar', 1)
+def string_erase_last_char(vm, this):
+    length = peek(vm, this, 2)
+    if greater(length, 0):
+        poke(vm, this, 2, length - 1)
+    return 0
+
+
+@OS.register('String.intValue', 1)
+def string_int_value(vm, this):
+    buffer = peek(vm, this, 0)
+    length = peek(vm, this, 2)
+    value = 0
+    if greater(length, 0) and peek(vm, buffer, 0) == 45:
+        negative, i = True, 1
+    else:
+        negative, i = False, 0
+
+    while less(i, length) and string_is_digit(vm, peek(vm, buffer, i)):
+        value = (math_multiply(vm, value, 10)
+                 + string_digit_val(vm, peek(vm, buffer, i))) & 0xFFFF
+        i += 1
+    return -value & 0xFFFF if negative else value
+
+
+@OS.register('String.is_digit', 1)
+def string_is_digit(vm, c):
+    return TRUE if not less(c, 48) and not greater(c, 57) else FALSE
+
+
+@OS.register('String.digit_val', 1)
+def string_digit_val(vm, c):
+    return (c - 48) & 0xFFFF
+
+
+@OS.register('String.digit_char', 1)
+def string_digit_char(vm, i):
+    return (i + 48) & 0xFFFF
+
+
+@OS.register('String.setInt', 2)
+def string_set_int(vm, this, value):
+    poke(vm, this, 2, 0)
+    if less(value, 0):
+        value = -value & 0xFFFF
+        string_append_char(vm, this, 45)
+    string_do_set_int(vm, this, value)
+    return 0
+
+
+@OS.register('String.do_set_int', 2)
+def string_do_set_int(vm, this, value):
+    q = math_divide(vm, value, 10)
+    mod = (value - math_multiply(vm, q, 10)) & 0xFFFF
+    c = string_digit_char(vm, mod)
+    if not less(value, 10):
+        string_do_set_int(vm, this, q)
+    string_append_char(vm, this, c)
+    return 0
+
+
+@OS.register('String.newLine', 0)
+def string_new_line(vm):
+    return 128
+
+
+@OS.register('String.backSpace', 0)
+def string_back_space(vm):
+    return 129
+
+
+@OS.register('String.doubleQuote', 0)
+def string_double_quote(vm):
+    return 34
+
+
+# Keyboard: static Array keyboard
+@OS.register('Keyboard.init', 0)
+def keyboard_init(vm):
+    set_static(vm, 'Keyboard', 0, 24576)
+    return 0
+
+
+@OS.register('Keyboard.keyPressed', 0)
+def keyboard_key_pressed(vm):
+    return peek(vm, static(vm, 'Keyboard', 0), 0)
+
+
+# Sys
+@OS.register('Sys.wait', 1)
+def sys_wait(vm, duration):
+    # only burns cycles
+    return 0
+
+
+# Screen: static Array screen; static boolean cur_color, black, white
+@OS.register('Screen.init', 0)
+def screen_init(vm):
+    set_static(vm, 'Screen', 0, 16384)
+    set_static(vm, 'Screen', 2, TRUE)
+    set_static(vm, 'Screen', 3, FALSE)
+    set_static(vm, 'Screen', 1, static(vm, 'Screen', 3))
+    return 0
+
+
+@OS.register('Screen.clearScreen', 0)
+def screen_clear_screen(vm):
+    # the Jack loop never increments its counter
+    raise Diverges("Screen.clearScreen")
+
+
+@OS.register('Screen.setColor', 1)
+def screen_set_color(vm, b):
+    set_static(vm, 'Screen', 1, b)
+    return 0
+
+
+@OS.register('Screen.drawPixel', 2)
+def screen_draw_pixel(vm, x, y):
+    screen = static(vm, 'Screen', 0)
+    address = (math_multiply(vm, y, 32) + math_divide(vm, x, 16)) & 0xFFFF
+    mask = math_two_to_the(vm, x & 15)
+    if static(vm, 'Screen', 1):
+        poke(vm, screen, address, peek(vm, screen, address) | mask)
+    else:
+        poke(vm, screen, address, peek(vm, screen, address) & ~mask)
+    return 0
+
+
+@OS.register('Screen.drawLine', 4)
+def screen_draw_line(vm, x1, y1, x2, y2):
+    if greater(x1, x2):
+        x1, x2 = x2, x1
+        y1, y2 = y2, y1
+    dx = (x2 - x1) & 0xFFFF
+    dy = (y2 - y1) & 0xFFFF
+    if dx == 0:
+        screen_draw_vertical_line(vm, x1, y1, y2)
+    elif dy == 0:
+        screen_draw_horizontal_line(vm, x1, x2, y1)
+    else:
+        screen_draw_diagonal_line(vm, x1, y1, x2, y2, dx, dy)
+    return 0
+
+
+@OS.register('Screen.drawRectangle', 4)
+def screen_draw_rectangle(vm, x1, y1, x2, y2):
+    y = y1
+    while not greater(y, y2):
+        screen_draw_horizontal_line(vm, x1, x2, y)
+        y = (y + 1) & 0xFFFF
+    return 0
+
+
+@OS.register('Screen.drawCircle', 3)
+def screen_draw_circle(vm, x, y, r):
+    dy = -r & 0xFFFF
+    r_squared = math_multiply(vm, r, r)
+    while not greater(dy, r):
+        dx = math_sqrt(vm, (r_squared - math_multiply(vm, dy, dy)) & 0xFFFF)
+        screen_draw_horizontal_line(vm, (x - dx) & 0xFFFF, (x + dx) & 0xFFFF,
+                                    (y + dy) & 0xFFFF)
+        dy = (dy + 1) & 0xFFFF
+    return 0
+
+
+@OS.register('Screen.drawVerticalLine', 3)
+def screen_draw_vertical_line(vm, x, y1, y2):
+    if greater(y1, y2):
+        y1, y2 = y2, y1
+    while less(y1, y2):
+        screen_draw_pixel(vm, x, y1)
+        y1 = (y1 + 1) & 0xFFFF
+    return 0
+
+
+@OS.register('Screen.drawHorizontalLine', 3)
+def screen_draw_horizontal_line(vm, x1, x2, y):
+    screen = static(vm, 'Screen', 0)
+    x1mod16 = x1 & 15
+    x2mod16 = x2 & 15
+    row = math_multiply(vm, y, 32)
+    start = (row + math_divide(vm, x1, 16)) & 0xFFFF
+    end = (row + math_divide(vm, x2, 16)
+           + (TRUE if x2mod16 == 0 else FALSE)) & 0xFFFF
+
+    if start == end:
+        screen_draw_short_horizontal_line(vm, x1, x2, y)
+        return 0
+    if x1mod16 != 0:
+        start = (start + 1) & 0xFFFF
+        screen_draw_short_horizontal_line(
+            vm, x1, (x1 + 16 - x1mod16) & 0xFFFF, y)
+    if x2mod16 != 0:
+        end = (end - 1) & 0xFFFF
+        screen_draw_short_horizontal_line(
+            vm, (x2 - x2mod16) & 0xFFFF, x2, y)
+    while not greater(start, end):
+        poke(vm, screen, start, static(vm, 'Screen', 1))
+        start = (start + 1) & 0xFFFF
+    return 0
+
+
+@OS.register('Screen.draw_short_horizontal_line', 3)
+def screen_draw_short_horizontal_line(vm, x1, x2, y):
+    while not greater(x1, x2):
+        screen_draw_pixel(vm, x1, y)
+        x1 = (x1 + 1) & 0xFFFF
+    return 0
+
+
+@OS.register('Screen.drawDiagonalLine', 6)
+def screen_draw_diagonal_line(vm, x1, y1, x2, y2, dx, dy):
+    a = b = difference = 0
+    y_incr = 0xFFFF if less(dy, 0) else 1
+    while not greater(a, dx) and (
+            (y_incr == 1 and not greater(b, dy))
+            or (y_incr == 0xFFFF and not less(b, dy))):
+        screen_draw_pixel(vm, (x1 + a) & 0xFFFF, (y1 + b) & 0xFFFF)
+        if less(difference, 0):
+            a = (a + 1) & 0xFFFF
+            difference = (difference + math_multiply(vm, dy, y_incr)) & 0xFFFF
+        else:
+            b = (b + y_incr) & 0xFFFF
+            difference = (difference - dx) & 0xFFFF
+    return 0
+
+
+# Output: static Array charMaps, screen, charMasks; static int cursor_x,
+# cursor_y
+# (character, 11 rows of its bitmap), in the order Output.initMap creates them
+FONT = [
+    (0, 63, 63, 63, 63, 63, 63, 63, 63, 63, 0, 0),
+    (32, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+    (33, 12, 30, 30, 30, 12, 12, 0, 12, 12, 0, 0),
+    (34, 54, 54, 20, 0, 0, 0, 0, 0, 0, 0, 0),
+    (35, 0, 18, 18, 63, 18, 18, 63, 18, 18, 0, 0),
+    (36, 12, 30, 51, 3, 30, 48, 51, 30, 12, 12, 0),
+    (37, 0, 0, 35, 51, 24, 12, 6, 51, 49, 0, 0),
+    (38, 12, 30, 30, 12, 54, 27, 27, 27, 54, 0, 0),
+    (39, 12, 12, 6, 0, 0, 0, 0, 0, 0, 0, 0),
+    (40, 24, 12, 6, 6, 6, 6, 6, 12, 24, 0, 0),
+    (41, 6, 12, 24, 24, 24, 24, 24, 12, 6, 0, 0),
+    (42, 0, 0, 0, 51, 30, 63, 30, 51, 0, 0, 0),
+    (43, 0, 0, 0, 12, 12, 63, 12, 12, 0, 0, 0),
+    (44, 0, 0, 0, 0, 0, 0, 0, 12, 12, 6, 0),
+    (45, 0, 0, 0, 0, 0, 63, 0, 0, 0, 0, 0),
+    (46, 0, 0, 0, 0, 0, 0, 0, 12, 12, 0, 0),
+    (47, 0, 0, 32, 48, 24, 12, 6, 3, 1, 0, 0),
+    (48, 12, 30, 51, 51, 51, 51, 51, 30, 12, 0, 0),
+    (49, 12, 14, 15, 12, 12, 12, 12, 12, 63, 0, 0),
+    (50, 30, 51, 48, 24, 12, 6, 3, 51, 63, 0, 0),
+    (51, 30, 51, 48, 48, 28, 48, 48, 51, 30, 0, 0),
+    (52, 16, 24, 28, 26, 25, 63, 24, 24, 60, 0, 0),
+    (53, 63, 3, 3, 31, 48, 48, 48, 51, 30, 0, 0),
+    (54, 28, 6, 3, 3, 31, 51, 51, 51, 30, 0, 0),
+    (55, 63, 49, 48, 48, 24, 12, 12, 12, 12, 0, 0),
+    (56, 30, 51, 51, 51, 30, 51, 51, 51, 30, 0, 0),
+    (57, 30, 51, 51, 51, 62, 48, 48, 24, 14, 0, 0),
+    (58, 0, 0, 12, 12, 0, 0, 12, 12, 0, 0, 0),
+    (59, 0, 0, 12, 12, 0, 0, 12, 12, 6, 0, 0),
+    (60, 0, 0, 24, 12, 6, 3, 6, 12, 24, 0, 0),
+    (61, 0, 0, 0, 63, 0, 0, 63, 0, 0, 0, 0),
+    (62, 0, 0, 3, 6, 12, 24, 12, 6, 3, 0, 0),
+    (64, 30, 51, 51, 59, 59, 59, 27, 3, 30, 0, 0),
+    (63, 30, 51, 51, 24, 12, 12, 0, 12, 12, 0, 0),
+    (65, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+    (66, 31, 51, 51, 51, 31, 51, 51, 51, 31, 0, 0),
+    (67, 28, 54, 35, 3, 3, 3, 35, 54, 28, 0, 0),
+    (68, 15, 27, 51, 51, 51, 51, 51, 27, 15, 0, 0),
+    (69, 63, 51, 35, 11, 15, 11, 35, 51, 63, 0, 0),
+    (70, 63, 51, 35, 11, 15, 11, 3, 3, 3, 0, 0),
+    (71, 28, 54, 35, 3, 59, 51, 51, 54, 44, 0, 0),
+    (72, 51, 51, 51, 51, 63, 51, 51, 51, 51, 0, 0),
+    (73, 30, 12, 12, 12, 12, 12, 12, 12, 30, 0, 0),
+    (74, 60, 24, 24, 24, 24, 24, 27, 27, 14, 0, 0),
+    (75, 51, 51, 51, 27, 15, 27, 51, 51, 51, 0, 0),
+    (76, 3, 3, 3, 3, 3, 3, 35, 51, 63, 0, 0),
+    (77, 33, 51, 63, 63, 51, 51, 51, 51, 51, 0, 0),
+    (78, 51, 51, 55, 55, 63, 59, 59, 51, 51, 0, 0),
+    (79, 30, 51, 51, 51, 51, 51, 51, 51, 30, 0, 0),
+    (80, 31, 51, 51, 51, 31, 3, 3, 3, 3, 0, 0),
+    (81, 30, 51, 51, 51, 51, 51, 63, 59, 30, 48, 0),
+    (82, 31, 51, 51, 51, 31, 27, 51, 51, 51, 0, 0),
+    (83, 30, 51, 51, 6, 28, 48, 51, 51, 30, 0, 0),
+    (84, 63, 63, 45, 12, 12, 12, 12, 12, 30, 0, 0),
+    (85, 51, 51, 51, 51, 51, 51, 51, 51, 30, 0, 0),
+    (86, 51, 51, 51, 51, 51, 30, 30, 12, 12, 0, 0),
+    (87, 51, 51, 51, 51, 51, 63, 63, 63, 18, 0, 0),
+    (88, 51, 51, 30, 30, 12, 30, 30, 51, 51, 0, 0),
+    (89, 51, 51, 51, 51, 30, 12, 12, 12, 30, 0, 0),
+    (90, 63, 51, 49, 24, 12, 6, 35, 51, 63, 0, 0),
+    (91, 30, 6, 6, 6, 6, 6, 6, 6, 30, 0, 0),
+    (92, 0, 0, 1, 3, 6, 12, 24, 48, 32, 0, 0),
+    (93, 30, 24, 24, 24, 24, 24, 24, 24, 30, 0, 0),
+    (94, 8, 28, 54, 0, 0, 0, 0, 0, 0, 0, 0),
+    (95, 0, 0, 0, 0, 0, 0, 0, 0, 0, 63, 0),
+    (96, 6, 12, 24, 0, 0, 0, 0, 0, 0, 0, 0),
+    (97, 0, 0, 0, 14, 24, 30, 27, 27, 54, 0, 0),
+    (98, 3, 3, 3, 15, 27, 51, 51, 51, 30, 0, 0),
+    (99, 0, 0, 0, 30, 51, 3, 3, 51, 30, 0, 0),
+    (100, 48, 48, 48, 60, 54, 51, 51, 51, 30, 0, 0),
+    (101, 0, 0, 0, 30, 51, 63, 3, 51, 30, 0, 0),
+    (102, 28, 54, 38, 6, 15, 6, 6, 6, 15, 0, 0),
+    (103, 0, 0, 30, 51, 51, 51, 62, 48, 51, 30, 0),
+    (104, 3, 3, 3, 27, 55, 51, 51, 51, 51, 0, 0),
+    (105, 12, 12, 0, 14, 12, 12, 12, 12, 30, 0, 0),
+    (106, 48, 48, 0, 56, 48, 48, 48, 48, 51, 30, 0),
+    (107, 3, 3, 3, 51, 27, 15, 15, 27, 51, 0, 0),
+    (108, 14, 12, 12, 12, 12, 12, 12, 12, 30, 0, 0),
+    (109, 0, 0, 0, 29, 63, 43, 43, 43, 43, 0, 0),
+    (110, 0, 0, 0, 29, 51, 51, 51, 51, 51, 0, 0),
+    (111, 0, 0, 0, 30, 51, 51, 51, 51, 30, 0, 0),
+    (112, 0, 0, 0, 30, 51, 51, 51, 31, 3, 3, 0),
+    (113, 0, 0, 0, 30, 51, 51, 51, 62, 48, 48, 0),
+    (114, 0, 0, 0, 29, 55, 51, 3, 3, 7, 0, 0),
+    (115, 0, 0, 0, 30, 51, 6, 24, 51, 30, 0, 0),
+    (116, 4, 6, 6, 15, 6, 6, 6, 54, 28, 0, 0),
+    (117, 0, 0, 0, 27, 27, 27, 27, 27, 54, 0, 0),
+    (118, 0, 0, 0, 51, 51, 51, 51, 30, 12, 0, 0),
+    (119, 0, 0, 0, 51, 51, 51, 63, 63, 18, 0, 0),
+    (120, 0, 0, 0, 51, 30, 12, 12, 30, 51, 0, 0),
+    (121, 0, 0, 0, 51, 51, 51, 62, 48, 24, 15, 0),
+    (122, 0, 0, 0, 63, 27, 12, 6, 51, 63, 0, 0),
+    (123, 56, 12, 12, 12, 7, 12, 12, 12, 56, 0, 0),
+    (124, 12, 12, 12, 12, 12, 12, 12, 12, 12, 0, 0),
+    (125, 7, 12, 12, 12, 56, 12, 12, 12, 7, 0, 0),
+    (126, 38, 45, 25, 0, 0, 0, 0, 0, 0, 0, 0),
+]
+
+
+@OS.register('Output.init', 0)
+def output_init(vm):
+    set_static(vm, 'Output', 1, 16384)
+    set_static(vm, 'Output', 3, 0)
+    set_static(vm, 'Output', 4, 0)
+    char_masks = array_new(vm, 2)
+    set_static(vm, 'Output', 2, char_masks)
+    poke(vm, char_masks, 0, 255)
+    poke(vm, char_masks, 1, 0xFFFF & 255)
+    set_static(vm, 'Output', 0, array_new(vm, 127))
+    output_init_map(vm)
+    return 0
+
+
+@OS.register('Output.initMap', 0)
+def output_init_map(vm):
+    set_static(vm, 'Output', 0, array_new(vm, 127))
+    for row in FONT:
+        output_create(vm, *row)
+    return 0
+
+
+@OS.register('Output.create', 12)
+def output_create(vm, index, *bitmap):
+    bitmap_array = array_new(vm, 11)
+    poke(vm, static(vm, 'Output', 0), index, bitmap_array)
+    for i, row in enumerate(bitmap):
+        poke(vm, bitmap_array, i, row)
+    return 0
+
+
+@OS.register('Output.getMap', 1)
+def output_get_map(vm, c):
+    if less(c, 32) or greater(c, 126):
+        c = 0
+    return peek(vm, static(vm, 'Output', 0), c)
+
+
+@OS.register('Output.moveCursor', 2)
+def output_move_cursor(vm, i, j):
+    set_static(vm, 'Output', 3, i)
+    set_static(vm, 'Output', 4, j)
+    return 0
+
+
+@OS.register('Output.printChar', 1)
+def output_print_char(vm, c):
+    screen = static(vm, 'Output', 1)
+    char_masks = static(vm, 'Output', 2)
+    cursor_x = static(vm, 'Output', 3)
+    cursor_y = static(vm, 'Output', 4)
+
+    bitmap_array = output_get_map(vm, c)
+    address = (math_multiply(vm, math_multiply(vm, cursor_y, 32), 11)
+               + math_divide(vm, cursor_x, 2)) & 0xFFFF
+    mask = cursor_x & 1
+    for i in range(11):
+        bitmap = peek(vm, bitmap_array, i)
+        if mask == 1:
+            bitmap = math_multiply(vm, bitmap, 256)
+        # Jack has no precedence: (screen & mask) | bitmap
+        poke(vm, screen, address, peek(vm, screen, address)
+             & peek(vm, char_masks, mask) | bitmap)
+        address = (address + 32) & 0xFFFF
+
+    if cursor_x == 63:
+        output_println(vm)
+    else:
+        set_static(vm, 'Output', 3, cursor_x + 1)
+    return 0
+
+
+@OS.register('Output.printString', 1)
+def output_print_string(vm, s):
+    # the Jack code calls s.CharAt, which does not exist, charAt is meant
+    i = 0
+    while less(i, string_length(vm, s)):
+        output_print_char(vm, string_char_at(vm, s, i))
+        i += 1
+    return 0
+
+
+@OS.register('Output.printInt', 1)
+def output_print_int(vm, i):
+    s = string_new(vm, 10)
+    string_set_int(vm, s, i)
+    output_print_string(vm, s)
+    string_dispose(vm, s)
+    return 0
+
+
+@OS.register('Output.println', 0)
+def output_println(vm):
+    set_static(vm, 'Output', 3, 0)
+    cursor_y = static(vm, 'Output', 4)
+    if less(cursor_y, 22):
+        set_static(vm, 'Output', 4, cursor_y + 1)
+    else:
+        output_scroll(vm)
+    return 0
+
+
+@OS.register('Output.backSpace', 0)
+def output_back_space(vm):
+    cursor_x = static(vm, 'Output', 3)
+    cursor_y = static(vm, 'Output', 4)
+    if cursor_x == 0:
+        if cursor_y != 0:
+            set_static(vm, 'Output', 3, 63)
+            set_static(vm, 'Output', 4, cursor_y - 1)
+    else:
+        set_static(vm, 'Output', 3, cursor_x - 1)
+    return 0
+
+
+@OS.register('Output.scroll', 0)
+def output_scroll(vm):
+    set_static(vm, 'Output', 3, 0)
+    set_static(vm, 'Output', 4, 0)
+    return 0
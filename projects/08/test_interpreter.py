@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from interpreter import VMInterpreter, conformance
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OS_DIRECTORY = os.path.join(HERE, os.pardir, '12')
+
+
+class ReturnTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'Main.vm'), 'w') as f:
+            f.write('function Main.f 0\npush constant 7\nreturn\n')
+        self.interpreter = VMInterpreter(self.directory)
+        self.interpreter.pc = self.interpreter.functions['Main.f']
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def frame(self, lcl):
+        " Set up a frame whose LCL is lcl, the caller's words below it. "
+        ram = self.interpreter.ram
+        ram[0], ram[1], ram[2] = lcl, lcl, 100
+        for address in range(max(lcl - 5, 0), lcl):
+            ram[address] = address + 1000
+
+    def test_return_restores_the_frame(self):
+        self.frame(300)
+        self.interpreter.run(10)
+        ram = self.interpreter.ram
+        self.assertEqual(list(ram[0:5]), [101, 1296, 1297, 1298, 1299])
+        self.assertEqual(ram[100], 7)
+        self.assertEqual(len(ram), VMInterpreter.RAM_SIZE)
+
+    def test_return_below_the_frame(self):
+        self.frame(3)
+        with self.assertRaises(Exception):
+            self.interpreter.run(10)
+        self.assertEqual(len(self.interpreter.ram), VMInterpreter.RAM_SIZE)
+
+
+class ConformanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_math_and_string(self):
+        " The VM code of the OS and the natives agree on MathStringTest. "
+        for name in os.listdir(OS_DIRECTORY):
+            if name.endswith('.vm'):
+                shutil.copy(os.path.join(OS_DIRECTORY, name), self.directory)
+        shutil.copytree(os.path.join(OS_DIRECTORY, 'MathStringTest'),
+                        os.path.join(self.directory, 'MathStringTest'))
+        failures, compared = conformance(self.directory, 100000)
+        self.assertEqual(failures, [])
+        self.assertEqual(compared, ['MathStringTest'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = os.path.join(HERE, os.pardir)
+sys.path.insert(0, os.path.join(PROJECTS, '06'))
+
+from emulator import CPUEmulator
+from interpreter import VMInterpreter
+from vm import Translator
+
+# every code generation mode, the defaults first
+MODES = [
+    {},
+    {'optimize': True},
+    {'stack_cache': True},
+    {'optimize': True, 'stack_cache': True},
+    {'shared_calls': True},
+    {'optimize': True, 'shared_calls': True},
+    {'prune': True},
+    {'optimize': True, 'stack_cache': True, 'shared_calls': True,
+     'prune': True},
+]
+
+# (directory, initial RAM, cycles, expected RAM), the values of the .cmp
+# files of the course
+PROGRAMS = [
+    ('07/StackArithmetic/StackTest', {0: 256}, 1000,
+     {0: 266, 256: -1, 257: 0, 258: 0, 259: 0, 260: -1, 261: 0, 262: -1,
+      263: 0, 264: 0, 265: -91}),
+    ('07/MemoryAccess/BasicTest',
+     {0: 256, 1: 300, 2: 400, 3: 3000, 4: 3010}, 600,
+     {256: 472, 300: 10, 401: 21, 402: 22, 3006: 36, 3012: 42, 3015: 45,
+      11: 510}),
+    ('08/ProgramFlow/FibonacciSeries',
+     {0: 256, 1: 300, 2: 400, 400: 6, 401: 3000}, 1100,
+     {3000: 0, 3001: 1, 3002: 1, 3003: 2, 3004: 3, 3005: 5}),
+    ('08/FunctionCalls/FibonacciElement', {}, 6000, {0: 262, 261: 3}),
+    ('08/FunctionCalls/StaticsTest', {}, 2500,
+     {0: 263, 261: -2, 262: 8}),
+    ('08/FunctionCalls/NestedCall', {}, 4000,
+     {0: 261, 1: 261, 2: 256, 3: 4000, 4: 5000, 5: 135, 6: 246}),
+]
+
+
+def signed(word):
+    return word - 0x10000 if word & 0x8000 else word
+
+
+class TranslatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def translate(self, sources, mode):
+        " Copy the .vm files of sources and translate them, returns the .asm "
+        name = os.path.basename(sources)
+        directory = os.path.join(self.directory, name)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.mkdir(directory)
+        for filename in os.listdir(sources):
+            if filename.endswith('.vm'):
+                shutil.copy(os.path.join(sources, filename), directory)
+        self.translator = Translator(directory, **mode)
+        return os.path.join(directory, name + '.asm')
+
+    def execute(self, asm, ram, cycles):
+        emulator = CPUEmulator(asm)
+        for address, value in ram.items():
+            emulator.ram[address] = value & 0xFFFF
+        emulator.run(cycles)
+        return emulator.ram
+
+
+class ProgramTest(TranslatorTest):
+    " The test programs of the course compute the same in every mode. "
+
+    def test_programs(self):
+        for directory, ram, cycles, expected in PROGRAMS:
+            sources = os.path.join(PROJECTS, directory)
+            for mode in MODES:
+                result = self.execute(self.translate(sources, mode), ram,
+                                      20 * cycles)
+                for address, value in expected.items():
+                    self.assertEqual(
+                        signed(result[address]), value,
+                        "{} {}: RAM[{}]".format(directory, mode, address))
+
+    def test_comparisons_are_fused(self):
+        sources = os.path.join(PROJECTS, '08/FunctionCalls/FibonacciElement')
+        self.translate(sources, {})
+        self.assertEqual(self.translator.fused, 0)
+        self.translate(sources, {'optimize': True})
+        self.assertEqual(self.translator.fused, 1)
+
+
+class RandomProgramTest(TranslatorTest):
+    """
+    Random programs of stack arithmetic and branches, most of them on a
+    comparison: every mode leaves the memory the VM interpreter leaves.
+    """
+
+    SEGMENTS = {'local': 300, 'argument': 400, 'this': 3000, 'that': 3100}
+    PROGRAMS = 40
+
+    def test_random_programs(self):
+        generator = random.Random(2024)
+        for _ in range(self.PROGRAMS):
+            # SP, LCL, ARG, THIS, THAT
+            ram = {0: 256, 1: 300, 2: 400, 3: 3000, 4: 3100}
+            for base in self.SEGMENTS.values():
+                for address in range(base, base + 16):
+                    ram[address] = generator.randrange(0x10000)
+            program = RandomProgram(generator).commands()
+            sources = os.path.join(self.directory, 'sources', 'Random')
+            os.makedirs(sources, exist_ok=True)
+            with open(os.path.join(sources, 'Random.vm'), 'w') as f:
+                f.write('\n'.join(program) + '\n')
+
+            interpreter = VMInterpreter(sources)
+            for address, value in ram.items():
+                interpreter.ram[address] = value
+            interpreter.run(10000)
+            expected = self.snapshot(interpreter.ram)
+            for mode in MODES:
+                result = self.execute(self.translate(sources, mode), ram,
+                                      20000)
+                self.assertEqual(self.snapshot(result), expected,
+                                 "{}\n{}".format(mode, '\n'.join(program)))
+
+    def snapshot(self, ram):
+        " The words a VM program can see: pointers, temp, static, stack. "
+        words = list(ram[0:13]) + list(ram[16:32]) + list(ram[256:ram[0]])
+        for base in self.SEGMENTS.values():
+            words += ram[base:base + 16]
+        return words
+
+
+class RandomProgram:
+    " Forward branches around balanced blocks of random stack arithmetic. "
+
+    BINARY = ['add', 'sub', 'and', 'or', 'eq', 'gt', 'lt']
+    SEGMENTS = ['local', 'argument', 'this', 'that', 'temp', 'static']
+
+    def __init__(self, generator):
+        self.random = generator
+        self.labels = 0
+
+    def commands(self):
+        commands = self.block()
+        for _ in range(self.random.randint(1, 4)):
+            self.labels += 1
+            label = 'L{}'.format(self.labels)
+            kind = self.random.choice(['if', 'goto', 'else'])
+            if kind == 'goto':
+                commands += ['goto ' + label] + self.block()
+            elif kind == 'if':
+                commands += self.condition() + ['if-goto ' + label]
+                commands += self.block()
+            else:
+                other = 'E{}'.format(self.labels)
+                commands += self.condition() + ['if-goto ' + other]
+                commands += self.block() + ['goto ' + label]
+                commands += ['label ' + other] + self.block()
+            commands += ['label ' + label] + self.block()
+        return commands
+
+    def condition(self):
+        if self.random.random() < 0.25:
+            return [self.push()]
+        condition = [self.push(), self.push(),
+                     self.random.choice(['eq', 'gt', 'lt'])]
+        if self.random.random() < 0.5:
+            condition.append('not')
+        return condition
+
+    def block(self):
+        " A run of commands that leaves the stack as it found it. "
+        commands = []
+        depth = 0
+        for _ in range(self.random.randint(1, 20)):
+            operations = ['push']
+            if depth >= 1:
+                operations += ['pop', 'not', 'neg']
+            if depth >= 2:
+                operations += self.BINARY
+            operation = self.random.choice(operations)
+            if operation == 'push':
+                commands.append(self.push())
+                depth += 1
+            elif operation == 'pop':
+                commands.append('pop {} {}'.format(*self.operand(
+                    self.SEGMENTS)))
+                depth -= 1
+            else:
+                commands.append(operation)
+                if operation in self.BINARY:
+                    depth -= 1
+        return commands + ['pop temp 7'] * depth
+
+    def push(self):
+        if self.random.random() < 0.3:
+            return 'push constant {}'.format(
+                self.random.choice([0, 1, 2, 7, 32767]))
+        return 'push {} {}'.format(*self.operand(self.SEGMENTS + ['pointer']))
+
+    def operand(self, segments):
+        segment = self.random.choice(segments)
+        if segment == 'pointer':
+            return segment, self.random.randint(0, 1)
+        if segment == 'temp':
+            return segment, self.random.randint(0, 7)
+        return segment, self.random.choice([0, 1, 2, 3, 15])
+
+
+if __name__ == '__main__':
+    unittest.main()
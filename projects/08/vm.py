@@ -36,72 +36,219 @@ And what's the content of subroutine call?
 
 """
 
-import re
 import os
 import sys
+import argparse
+
+from BuildCache import BuildCache
 
 
 class Translator:
-    def __init__(self, path):
+
+    # bump whenever the generated code changes, it invalidates BuildCache
+    VERSION = '1.3'
+
+    def __init__(self, path, cache=False, optimize=False, shared_calls=False,
+                 stack_cache=False, prune=False, symbols=False):
         if os.path.isdir(path):
             basename = os.path.basename(path) + '.asm'
             fname = os.path.join(path, basename)
-            self.writer = CodeWriter(fname)
-
             files = FileSet(path, 'vm')
+        elif os.path.isfile(path):
+            fname = path
+            files = FileSet(path, 'vm')
+        else:
+            raise Exception("Unknown path {}".format(path))
+
+        # skip the translation if no .vm file changed since the last one
+        self.skipped = False
+        if cache:
+            build_cache = BuildCache(os.path.dirname(fname))
+            version = '{} {}'.format(self.VERSION, [
+                optimize, shared_calls, stack_cache, prune, symbols])
+            key = build_cache.key(files.fileList, version)
+            target = fname.replace('.vm', '.asm')
+            if build_cache.fresh(target, key):
+                self.skipped = True
+                return
+
+        # only a program with Sys.init can be bootstrapped
+        bootstrap = any(
+            os.path.basename(f) == 'Sys.vm' for f in files.fileList)
+        if stack_cache:
+            self.writer = StackCachingCodeWriter(fname, bootstrap, optimize,
+                                                 shared_calls, symbols)
+        else:
+            self.writer = CodeWriter(fname, bootstrap, optimize, shared_calls,
+                                     symbols)
+
+        # under optimize a comparison and the if-goto right after it are
+        # written as one conditional jump
+        self.fuse = optimize
+        self.fused = 0
+        self.removed = None
+        if prune:
+            self.translate_reachable(files.fileList)
+        else:
             while files.hasMoreFiles():
                 filename = files.nextFile()
                 self.translate(filename)
+        self.writer.save()
 
-            self.writer.save()
-        elif os.path.isfile(path):
-            self.writer = CodeWriter(path)
-            self.translate(path)
-            self.writer.save()
+        if cache:
+            build_cache.update(target, key)
+            build_cache.save()
 
     def translate(self, filename):
+        self.writer.setFilename(filename)
         parser = Parser(filename)
-
-        while parser.hasMoreCommand():
-            parser.advance()
-            Type = parser.commandType()
-            commandType = self.writer.getCommandType(Type)
-
-            if commandType == 'C_ARITHEMETIC':
-                self.writer.writeArithmetic(Type)
-            elif commandType in ['C_PUSH', 'C_POP']:
-                self.writer.writePushPop(commandType, parser.arg1(),
-                                         parser.arg2())
-            elif commandType == 'C_LABEL':
-                self.writer.writeLabel(parser.arg1())
-            elif commandType == 'C_GOTO':
-                self.writer.writeGoto(parser.arg1())
-            elif commandType == 'C_IF':
-                self.writer.writeIf(parser.arg1())
-            elif commandType == 'C_FUNCTION':
-                self.writer.writeFunction(parser.arg1(), parser.arg2())
-            elif commandType == 'C_CALL':
-                self.writer.writeCall(parser.arg1(), parser.arg2())
-            elif commandType == 'C_RETURN':
-                self.writer.writeReturn()
-            elif commandType is None:
-                raise Exception(" Unknown commandType...")
+        self.write_commands(
+            (parser.line_number, command) for command in parser)
+
+    def translate_reachable(self, filenames):
+        """
+        Whole-program mode: follow the call graph from Sys.init and only
+        translate the functions it reaches. Code outside of any function
+        is always kept.
+        """
+        # (filename, function name or None, [(line, command)]), in program
+        # order
+        blocks = []
+        for filename in filenames:
+            block = (filename, None, [])
+            blocks.append(block)
+            parser = Parser(filename)
+            for command in parser:
+                if command[0] == 'function':
+                    block = (filename, command[1], [])
+                    blocks.append(block)
+                block[2].append((parser.line_number, command))
+
+        calls = {}
+        for filename, function, commands in blocks:
+            calls[function] = set(
+                c[1] for _, c in commands if c[0] == 'call')
+
+        # without Sys.init every function is a possible entry point
+        if 'Sys.init' in calls:
+            pending = [None, 'Sys.init']
+        else:
+            pending = list(calls)
+        reachable = set()
+        while pending:
+            function = pending.pop()
+            if function not in reachable:
+                reachable.add(function)
+                pending.extend(calls.get(function, []))
+
+        self.removed = []
+        self.missing = sorted(reachable - set(calls))
+        self.commands = [0, 0]
+        for filename, function, commands in blocks:
+            self.commands[1] += len(commands)
+            if function not in reachable:
+                self.removed.append((function, len(commands)))
+                continue
+            self.commands[0] += len(commands)
+            self.writer.setFilename(filename)
+            self.write_commands(commands)
+
+    def reachability_report(self):
+        functions = len(set(name for name, _ in self.removed))
+        lines = ['{} unreachable functions removed, {} of {} commands kept'
+                 .format(functions, self.commands[0], self.commands[1])]
+        for function, count in self.removed:
+            lines.append('  - {:<40} {:>6} commands'.format(function, count))
+        for function in self.missing:
+            lines.append('  ? {:<40} called but not defined'.format(function))
+        return '\n'.join(lines)
+
+    def write_commands(self, commands):
+        " commands: (line, command) pairs in program order "
+        if self.fuse:
+            commands = self.fuse_branches(commands)
+        for line_number, command in commands:
+            self.writer.setLine(line_number)
+            self.write_command(command)
+
+    def fuse_branches(self, commands):
+        """
+        Fuse gt/lt/eq, a not after them or a lone not into the if-goto
+        that follows: ('if-goto', label, compare, negate) jumps on the
+        operands itself instead of popping the boolean they would push.
+        The fused command keeps the line of its first command.
+        """
+        # a window that may still end in an if-goto: [compare], [compare,
+        # not] or [not]
+        pending = []
+        for line_number, command in commands:
+            kinds = [c[0] for _, c in pending]
+            if command[0] == 'if-goto' and pending:
+                compare = kinds[0] if kinds[0] != 'not' else None
+                yield pending[0][0], ('if-goto', command[1], compare,
+                                      kinds[-1] == 'not')
+                self.fused += 1
+                pending = []
+                continue
+            if (command[0] == 'not' and kinds
+                    and kinds[-1] in CodeWriter.JUMP_COMMAND):
+                pending.append((line_number, command))
+                continue
+
+            for item in pending:
+                yield item
+            pending = []
+            if command[0] == 'not' or command[0] in CodeWriter.JUMP_COMMAND:
+                pending.append((line_number, command))
+            else:
+                yield line_number, command
+        for item in pending:
+            yield item
+
+    def fusion_report(self):
+        return '{} comparisons fused into their if-goto'.format(self.fused)
+
+    def write_command(self, command):
+        Type = command[0]
+        commandType = self.writer.getCommandType(Type)
+
+        if commandType == 'C_ARITHEMETIC':
+            self.writer.writeArithmetic(Type)
+        elif commandType in ['C_PUSH', 'C_POP']:
+            self.writer.writePushPop(commandType, command[1], command[2])
+        elif commandType == 'C_LABEL':
+            self.writer.writeLabel(command[1])
+        elif commandType == 'C_GOTO':
+            self.writer.writeGoto(command[1])
+        elif commandType == 'C_IF':
+            self.writer.writeIf(*command[1:])
+        elif commandType == 'C_FUNCTION':
+            self.writer.writeFunction(command[1], command[2])
+        elif commandType == 'C_CALL':
+            self.writer.writeCall(command[1], command[2])
+        elif commandType == 'C_RETURN':
+            self.writer.writeReturn()
+        elif commandType is None:
+            raise Exception(" Unknown commandType...")
 
 
 class Parser:
     def __init__(self, filename):
-        self.file = open(filename, 'r')
-        self.input = self.format_lines(self.file.read())
-        self.index = -1
-        self.length = len(self.input)
-        self.file.close()
+        # one command of lookahead, the file is never read as a whole
+        self.commands = self.stream(filename)
+        self.next_command = next(self.commands, None)
+
+    def __iter__(self):
+        while self.hasMoreCommand():
+            self.advance()
+            yield self.command
 
     def hasMoreCommand(self):
-        return self.index < self.length - 1
+        return self.next_command is not None
 
     def advance(self):
-        self.index += 1
-        self.command = self.input[self.index].strip().split(' ')
+        self.line_number, self.command = self.next_command
+        self.next_command = next(self.commands, None)
 
     def commandType(self):
         return self.command[0]
@@ -116,14 +263,14 @@ class Parser:
             return ''
 
     # Non API
-    def format_lines(self, lines):
-        # remove blank line and comment
-        INLINE_COMMENT_REGEX = re.compile(r'//.*\n')
-        without_inline = re.sub(INLINE_COMMENT_REGEX, '\n', lines)
-        format_lines = [
-            x.strip() for x in without_inline.splitlines() if x != ''
-        ]
-        return format_lines
+    @staticmethod
+    def stream(filename):
+        " yield every command of the file and its line, 1-based "
+        with open(filename, 'r') as file:
+            for line_number, line in enumerate(file, 1):
+                command = line.split('//', 1)[0].split()
+                if command:
+                    yield line_number, tuple(command)
 
 
 class CodeWriter:
@@ -148,13 +295,10 @@ class CodeWriter:
         'return': 'C_RETURN',
     }
     BINARY_ARITHMETIC = {
-        'add': 'M+D',
+        'add': 'D+M',
         'sub': 'M-D',
-        'and': 'M&D',
-        'or': 'M|D',
-        'gt': 'M>D',
-        'lt': 'M<D',
-        'eq': 'M=D',
+        'and': 'D&M',
+        'or': 'D|M',
     }
     UNARY_ARITHMETIC = {
         'not': '!M',
@@ -165,6 +309,12 @@ class CodeWriter:
         'lt': 'JLT',
         'eq': 'JEQ',
     }
+    # the jump of not gt, not lt and not eq
+    NEGATED_JUMP = {
+        'JGT': 'JLE',
+        'JLT': 'JGE',
+        'JEQ': 'JNE',
+    }
     ADDRESS_DICT = {
         'local': 'LCL',
         'argument': 'ARG',
@@ -176,15 +326,52 @@ class CodeWriter:
         'static': 16,
     }
 
-    def __init__(self, filename):
+    # entry points of the routines shared by every call and return
+    CALL_ROUTINE = 'VM$CALL'
+    RETURN_ROUTINE = 'VM$RETURN'
+    HALT = 'VM$HALT'
+
+    def __init__(self, filename, bootstrap=True, optimize=False,
+                 shared_calls=False, symbols=False, stream=True):
         self.setFilename(filename)
+        self.function = self.filename
+        self.line_number = 0
         self.jump_count = 0
         self.call_count = 0
-        self.output = self.target_file(filename)
-        self.writeInit()
+        self.return_count = 0
+        self.shared_calls = shared_calls
+        self.target = filename
+        # instructions go straight to the .asm file, unless the peephole
+        # pass or the symbol map has to see them first: then the ones of
+        # the current function are buffered until flush(). stream=False
+        # keeps every instruction in self.lines and writes no file.
+        self.lines = []
+        # for the symbol map, one (index in self.lines, (function, file,
+        # line)) row per VM command of the buffered instructions
+        self.sources = []
+        self.buffered = optimize or symbols or not stream
+        self.output = self.target_file(filename) if stream else None
+        self.symbols = symbols
+        self.map_output = None
+        if symbols and stream:
+            self.map_output = open(self.map_name(filename), 'w')
+        # ROM address of the next flushed instruction, and the source of
+        # the last row written to the symbol map
+        self.address = 0
+        self.previous_source = None
+        # labels of the functions, the entry points in the symbol map
+        self.entries = set()
+        self.peephole = Peephole() if optimize else None
+        if bootstrap:
+            self.writeInit()
 
     def setFilename(self, filename):
-        self.filename = filename.split('.vm')[0]
+        " Statics and labels outside functions are scoped by the .vm file. "
+        self.filename = os.path.splitext(os.path.basename(filename))[0]
+
+    def setLine(self, line_number):
+        " Line of the .vm file the following instructions come from. "
+        self.line_number = line_number
 
     def writeInit(self):
         self.write('@256')
@@ -196,7 +383,7 @@ class CodeWriter:
     def writeArithmetic(self, command):
         # unary: load to A register, save to D, eg., D=!A
         # binary: load to D, load to A, do the arithmetic, eg., D=D+A
-        if command in self.BINARY_ARITHMETIC.keys():
+        if command in self.BINARY_ARITHMETIC or command in self.JUMP_COMMAND:
             self.pop_stack_to_D()
 
         self.set_stack_to_A()
@@ -213,16 +400,19 @@ class CodeWriter:
             self.write('@{}_JUMP{}'.format(self.filename, self.jump_count))
             self.write('D;{}'.format(self.JUMP_COMMAND[command]))
             # default write
-            # 0 is false, 1 is true
+            # 0 is false, -1 is true
             self.write('@SP')
+            self.write('A=M')
             self.write('M=0')
             self.write('@{}_ENDJUMP{}'.format(self.filename, self.jump_count))
             self.write('0;JMP')
             # define jump
             self.write('({}_JUMP{})'.format(self.filename, self.jump_count))
             self.write('@SP')
+            self.write('A=M')
             self.write('M=-1')
             self.write('({}_ENDJUMP{})'.format(self.filename, self.jump_count))
+            self.jump_count += 1
         else:
             raise Exception("Unknown command")
 
@@ -239,39 +429,54 @@ class CodeWriter:
         else:
             raise Exception("Unknown segment")
 
+    # labels are scoped by the function they appear in
     def writeLabel(self, label):
-        self.write('({}${})'.format(self.filename, label))
+        self.write('({}${})'.format(self.function, label))
 
     def writeGoto(self, label):
-        self.write('@{}${}'.format(self.filename, label))
+        self.write('@{}${}'.format(self.function, label))
+        self.write('0;JMP')
 
-    def writeIf(self, label):
+    def writeIf(self, label, compare=None, negate=False):
+        """
+        compare and negate are the gt/lt/eq and the not the Translator
+        fused into this if-goto, it jumps on x - y or on !x in D.
+        """
         self.pop_stack_to_D()
-        self.write('@{}${}'.format(self.filename, label))
-        self.write('D;JNE')
+        if compare:
+            self.set_stack_to_A()
+            self.write('D=M-D')
+        self.write_branch(label, compare, negate)
 
     def writeFunction(self, function, nLocals):
+        # no peephole window spans a label, so the previous function can
+        # be optimized and written on its own
+        if self.buffered:
+            self.flush()
+        self.function = function
         self.write('({})'.format(function))
+        self.entries.add('({})'.format(function))
         nLocals = int(nLocals)
         while nLocals > 0:
-            self.writePush('D=0')
+            self.write('D=0')
             self.push_D_to_stack()
             nLocals -= 1
 
     def writeCall(self, function, nArgs):
         # Return address
-        RET = '@RET.{}.{}'.format(function, self.call_count)
+        RET = 'RET.{}.{}'.format(function, self.call_count)
         self.call_count += 1
 
-        self.write(RET)
+        if self.shared_calls:
+            self.write_call_site(function, nArgs, RET)
+            return
+
+        self.write('@{}'.format(RET))
         self.write('D=A')
         self.push_D_to_stack()
 
         # save caller status
-        for segment in ['LCL', 'ARG', 'THIS', 'THAT']:
-            self.write('@{}'.format(segment))
-            self.write('D=M')
-            self.push_D_to_stack()
+        self.push_caller_status()
 
         # Reposition of LCL
         self.write('@SP')
@@ -286,13 +491,90 @@ class CodeWriter:
         self.write('@ARG')
         self.write('M=D')
 
-        # goto RET
+        # goto function
         self.write('@{}'.format(function))
+        self.write('0;JMP')
 
         # define return address
         self.write('({})'.format(RET))
 
     def writeReturn(self):
+        self.return_count += 1
+        if self.shared_calls:
+            self.write('@{}'.format(self.RETURN_ROUTINE))
+            self.write('0;JMP')
+        else:
+            self.write_return_body()
+
+    # Non API
+    def write_call_site(self, function, nArgs, RET):
+        """
+        The call site only leaves the callee in R13, nArgs in R14 and the
+        return address in D, then jumps to the shared call routine.
+        """
+        self.write('@{}'.format(function))
+        self.write('D=A')
+        self.write('@R13')
+        self.write('M=D')
+        nArgs = int(nArgs)
+        if nArgs in [0, 1]:
+            self.write('@R14')
+            self.write('M={}'.format(nArgs))
+        else:
+            self.write('@{}'.format(nArgs))
+            self.write('D=A')
+            self.write('@R14')
+            self.write('M=D')
+        self.write('@{}'.format(RET))
+        self.write('D=A')
+        self.write('@{}'.format(self.CALL_ROUTINE))
+        self.write('0;JMP')
+        self.write('({})'.format(RET))
+
+    def write_call_routine(self):
+        # push return address and caller status, reposition LCL and ARG
+        # shared by every file, no VM source
+        self.function, self.filename = self.CALL_ROUTINE, '-'
+        self.line_number = 0
+        self.write('({})'.format(self.CALL_ROUTINE))
+        self.push_D_to_stack()
+        self.push_caller_status()
+        self.write('@SP')
+        self.write('D=M')
+        self.write('@LCL')
+        self.write('M=D')
+        self.write('@R14')
+        self.write('D=D-M')
+        self.write('@5')
+        self.write('D=D-A')
+        self.write('@ARG')
+        self.write('M=D')
+        self.write('@R13')
+        self.write('A=M')
+        self.write('0;JMP')
+
+    def write_halt(self):
+        # loops on itself, the emulators stop there
+        self.function, self.filename = self.HALT, '-'
+        self.line_number = 0
+        self.write('({})'.format(self.HALT))
+        self.write('@{}'.format(self.HALT))
+        self.write('0;JMP')
+
+    def write_return_routine(self):
+        # shared by every file, no VM source
+        self.function, self.filename = self.RETURN_ROUTINE, '-'
+        self.line_number = 0
+        self.write('({})'.format(self.RETURN_ROUTINE))
+        self.write_return_body()
+
+    def push_caller_status(self):
+        for segment in ['LCL', 'ARG', 'THIS', 'THAT']:
+            self.write('@{}'.format(segment))
+            self.write('D=M')
+            self.push_D_to_stack()
+
+    def write_return_body(self):
         FRAME = 'R13'
         RET = 'R14'
 
@@ -306,7 +588,8 @@ class CodeWriter:
         self.write('@{}'.format(FRAME))
         self.write('D=M')
         self.write('@5')
-        self.write('D=D-A')
+        self.write('A=D-A')
+        self.write('D=M')
         self.write('@{}'.format(RET))
         self.write('M=D')
 
@@ -340,14 +623,13 @@ class CodeWriter:
         self.write('A=M')
         self.write('0;JMP')
 
-    # Non API
     def resolve_address(self, segment, index):
         base_address = self.ADDRESS_DICT.get(segment)
         if segment in ['local', 'argument', 'this', 'that']:
             self.write('@{}'.format(base_address))
             self.write('D=M')
             self.write('@{}'.format(index))
-            self.write('A=A+D')
+            self.write('A=D+A')
         elif segment in ['pointer', 'temp']:
             address = base_address + int(index)
             self.write('@R{}'.format(address))
@@ -364,14 +646,110 @@ class CodeWriter:
         return target_file
 
     def save(self):
+        # a program without bootstrap, or whose last function does not end
+        # with a return or a goto, would fall through into the routines
+        if self.shared_calls and (self.call_count or self.return_count):
+            self.write_halt()
+        if self.shared_calls and self.call_count:
+            self.write_call_routine()
+        if self.shared_calls and self.return_count:
+            self.write_return_routine()
+        if self.buffered:
+            self.flush()
         self.output.close()
+        if self.map_output:
+            self.map_output.close()
 
     def write(self, s):
-        self.output.write("{}\n".format(s))
+        if not self.buffered:
+            self.output.write(s + '\n')
+            return
+        if self.symbols:
+            source = (self.function, self.filename, self.line_number)
+            if not self.sources or self.sources[-1][1] != source:
+                self.sources.append((len(self.lines), source))
+        self.lines.append(s)
+
+    def flush(self):
+        " Optimize, write and map the buffered instructions, then drop them. "
+        if self.peephole:
+            self.lines, self.sources = self.peephole.optimize(
+                self.lines, self.sources)
+        for line in self.lines:
+            self.output.write(line + '\n')
+        if self.map_output:
+            for row in self.symbol_map():
+                self.map_output.write(' '.join(map(str, row)) + '\n')
+        self.lines = []
+        self.sources = []
+
+    def symbol_map(self):
+        """
+        Rows of the symbol map for the buffered instructions, in ROM order,
+        addresses go on from the previous flush():
+            function <name> <address>: entry point of a VM function
+            source <address> <function> <file> <line>: the instructions
+                from address on come from that line of that .vm file
+        """
+        rows = []
+        row = -1
+        for i, line in enumerate(self.lines):
+            while (row + 1 < len(self.sources)
+                   and self.sources[row + 1][0] <= i):
+                row += 1
+            if line.startswith('('):
+                if line in self.entries:
+                    rows.append(('function', line[1:-1], self.address))
+                continue
+            source = self.sources[row][1]
+            if source != self.previous_source:
+                rows.append(('source', self.address) + source)
+                self.previous_source = source
+            self.address += 1
+        return rows
+
+    @staticmethod
+    def map_name(target):
+        return os.path.splitext(target)[0] + '.map'
+
+    @staticmethod
+    def call_costs(shared_calls):
+        """
+        Instructions executed by one call and by one return, as generated
+        before any peephole optimization. Both are straight-line code, so
+        this is also their cycle count.
+        """
+        writer = CodeWriter('Cost.vm', bootstrap=False,
+                            shared_calls=shared_calls, stream=False)
+        writer.writeCall('Callee', 2)
+        if shared_calls:
+            writer.write_call_routine()
+        call = writer.count(writer.lines)
+
+        writer.lines = []
+        writer.writeReturn()
+        if shared_calls:
+            writer.write_return_routine()
+        return call, writer.count(writer.lines)
+
+    def count(self, lines):
+        return sum(1 for line in lines if not line.startswith('('))
 
     def getCommandType(self, comandType):
         return self.COMMAND_DICT.get(comandType, None)
 
+    def write_branch(self, label, compare, negate):
+        " Jump to label on D, the condition or x - y of compare. "
+        jump = 'JNE'
+        if compare:
+            jump = self.JUMP_COMMAND[compare]
+            if negate:
+                jump = self.NEGATED_JUMP[jump]
+        elif negate:
+            self.write('D=!D')
+        self.write('@{}${}'.format(self.function, label))
+        self.write('D;{}'.format(jump))
+
     def push_D_to_stack(self):
         self.write('@SP')
         self.write('A=M')
@@ -414,6 +792,380 @@ class CodeWriter:
         self.write('M=D')
 
 
+class StackCachingCodeWriter(CodeWriter):
+    """
+    Keep the top of the stack in D across consecutive VM commands.
+
+    When self.cached is True the top value lives in D and *not* on the
+    memory stack (SP points where it would be stored). It is spilled to
+    memory only where control flow joins or leaves: labels, gotos, calls
+    and returns. A push then costs a load into D, a binary operation
+    three instructions and a unary one a single instruction.
+    """
+
+    BINARY_ARITHMETIC = {
+        'add': 'D+M',
+        'sub': 'M-D',
+        'and': 'D&M',
+        'or': 'D|M',
+    }
+    UNARY_ARITHMETIC = {
+        'not': '!D',
+        'neg': '-D',
+    }
+    # pop into local/argument/this/that by walking A up to this index
+    MAX_WALK = 12
+
+    def __init__(self, *args, **kwargs):
+        self.cached = False
+        CodeWriter.__init__(self, *args, **kwargs)
+
+    def writeArithmetic(self, command):
+        self.load_top_to_D()
+
+        if command in self.UNARY_ARITHMETIC:
+            self.write('D={}'.format(self.UNARY_ARITHMETIC[command]))
+            return
+
+        # x is the new top of the memory stack, y is in D
+        self.write('@SP')
+        self.write('AM=M-1')
+        if command in self.BINARY_ARITHMETIC:
+            self.write('D={}'.format(self.BINARY_ARITHMETIC[command]))
+        elif command in self.JUMP_COMMAND:
+            self.write('D=M-D')
+            self.write('@{}_JUMP{}'.format(self.filename, self.jump_count))
+            self.write('D;{}'.format(self.JUMP_COMMAND[command]))
+            self.write('D=0')
+            self.write('@{}_ENDJUMP{}'.format(self.filename, self.jump_count))
+            self.write('0;JMP')
+            self.write('({}_JUMP{})'.format(self.filename, self.jump_count))
+            self.write('D=-1')
+            self.write('({}_ENDJUMP{})'.format(self.filename, self.jump_count))
+            self.jump_count += 1
+        else:
+            raise Exception("Unknown command")
+
+    def writePushPop(self, command, segment, index):
+        if command == 'C_PUSH':
+            self.spill()
+            self.load_to_D(segment, int(index))
+            self.cached = True
+        elif command == 'C_POP':
+            self.load_top_to_D()
+            self.store_D(segment, int(index))
+            self.cached = False
+        else:
+            raise Exception("Unknown segment")
+
+    def writeLabel(self, label):
+        self.spill()
+        CodeWriter.writeLabel(self, label)
+
+    def writeGoto(self, label):
+        self.spill()
+        CodeWriter.writeGoto(self, label)
+
+    def writeIf(self, label, compare=None, negate=False):
+        self.load_top_to_D()
+        if compare:
+            self.write('@SP')
+            self.write('AM=M-1')
+            self.write('D=M-D')
+        self.write_branch(label, compare, negate)
+        self.cached = False
+
+    def writeFunction(self, function, nLocals):
+        # nothing falls through into a function, the stack is in memory
+        self.cached = False
+        if self.buffered:
+            self.flush()
+        self.function = function
+        self.write('({})'.format(function))
+        self.entries.add('({})'.format(function))
+
+        # zero all locals at once, then move SP past them
+        nLocals = int(nLocals)
+        if nLocals > 0:
+            self.write('@SP')
+            self.write('A=M')
+            for i in range(nLocals):
+                if i > 0:
+                    self.write('A=A+1')
+                self.write('M=0')
+            self.write('D=A+1')
+            self.write('@SP')
+            self.write('M=D')
+
+    def writeCall(self, function, nArgs):
+        self.spill()
+        CodeWriter.writeCall(self, function, nArgs)
+
+    def writeReturn(self):
+        self.spill()
+        CodeWriter.writeReturn(self)
+
+    def save(self):
+        # a program may simply run off its end, leave the stack complete
+        self.spill()
+        CodeWriter.save(self)
+
+    # Non API
+    def spill(self):
+        if self.cached:
+            self.push_D_to_stack()
+            self.cached = False
+
+    def load_top_to_D(self):
+        if not self.cached:
+            self.write('@SP')
+            self.write('AM=M-1')
+            self.write('D=M')
+            self.cached = True
+
+    def load_to_D(self, segment, index):
+        if segment == 'constant':
+            if index in [0, 1]:
+                self.write('D={}'.format(index))
+            else:
+                self.write('@{}'.format(index))
+                self.write('D=A')
+        elif segment in ['local', 'argument', 'this', 'that']:
+            self.write('@{}'.format(self.ADDRESS_DICT[segment]))
+            if index == 0:
+                self.write('A=M')
+            elif index == 1:
+                self.write('A=M+1')
+            else:
+                self.write('D=M')
+                self.write('@{}'.format(index))
+                self.write('A=D+A')
+            self.write('D=M')
+        else:
+            self.resolve_address(segment, index)
+            self.write('D=M')
+
+    def store_D(self, segment, index):
+        if segment in ['local', 'argument', 'this', 'that']:
+            base = self.ADDRESS_DICT[segment]
+            if index <= self.MAX_WALK:
+                self.write('@{}'.format(base))
+                self.write('A=M' if index == 0 else 'A=M+1')
+                for i in range(1, index):
+                    self.write('A=A+1')
+            else:
+                # the address needs D, park the value in R13 meanwhile
+                self.write('@R13')
+                self.write('M=D')
+                self.write('@{}'.format(base))
+                self.write('D=M')
+                self.write('@{}'.format(index))
+                self.write('D=D+A')
+                self.write('@R14')
+                self.write('M=D')
+                self.write('@R13')
+                self.write('D=M')
+                self.write('@R14')
+                self.write('A=M')
+        elif segment == 'constant':
+            raise Exception("Cannot pop to constant")
+        else:
+            self.resolve_address(segment, index)
+        self.write('M=D')
+
+
+def compare_call_modes(path, optimize=False):
+    """
+    Translate path with inline and with shared call/return code and
+    compare the ROM size and the instructions executed per call/return.
+    The inline translation is the one left on disk.
+    """
+    stats = {}
+    for shared_calls in [True, False]:
+        writer = Translator(path, optimize=optimize,
+                            shared_calls=shared_calls).writer
+        with open(writer.target.replace('.vm', '.asm')) as f:
+            rom = sum(1 for line in f if not line.startswith('('))
+        call, ret = CodeWriter.call_costs(shared_calls)
+        stats[shared_calls] = (rom, call, ret)
+
+    print('{:<16} {:>8} {:>8}'.format('', 'inline', 'shared'))
+    for i, name in enumerate(['ROM size', 'cycles/call', 'cycles/return']):
+        print('{:<16} {:>8} {:>8}'.format(name, stats[False][i],
+                                          stats[True][i]))
+    return stats
+
+
+class Peephole:
+    """
+    Optimize the generated assembly by rewriting short windows of
+    consecutive instructions, until no rule matches any more.
+
+    A label always sits between a jump target and what precedes it, so a
+    window never spans a place where control flow joins. A rewritten
+    window leaves A, D and the stack as the original did, except that:
+        - in-place top and constant operand leave another A, they only
+          apply right before A is reloaded
+        - constant operand does not store the constant above the top of
+          the stack, where nothing reads before writing
+        - constant push leaves D unchanged instead of 0 or 1, which
+          relies on D being dead after a push to the memory stack
+
+    CodeWriter never reads D across two VM commands. StackCachingCodeWriter
+    does, but it only pushes D to the memory stack in spill(), after which
+    the top is no longer cached and D is dead as well. A writer that reads
+    D after such a push must not run these rules.
+    """
+
+    def __init__(self):
+        self.rules = [
+            ('constant operand', self.constant_operand),
+            ('constant push', self.constant_push),
+            ('push/pop pair', self.push_pop),
+            ('in-place top', self.in_place_top),
+            ('@SP reload', self.sp_reload),
+            ('address reload', self.address_reload),
+            ('store/load pair', self.store_load),
+            ('decrement/load', self.decrement_load),
+        ]
+        self.saved = dict((name, 0) for name, rule in self.rules)
+        self.before = self.after = 0
+
+    def optimize(self, lines, sources):
+        """
+        Returns the optimized lines and their sources, the (index, source)
+        rows of CodeWriter.sources moved along with the lines. A rewritten
+        window keeps the source of its first line.
+        """
+        self.before += self.count(lines)
+        changed = True
+        while changed:
+            changed = False
+            for name, rule in self.rules:
+                lines, sources, saved = self.apply(lines, sources, rule)
+                if saved:
+                    self.saved[name] += saved
+                    changed = True
+        self.after += self.count(lines)
+        return lines, sources
+
+    def report(self):
+        lines = ['{:<16} {:>7}'.format(name, saved)
+                 for name, saved in self.saved.items()]
+        lines.append('{:<16} {:>7} -> {} instructions'.format(
+            'total', self.before - self.after, self.after))
+        return '\n'.join(lines)
+
+    # Non API
+    def apply(self, lines, sources, rule):
+        result = []
+        result_sources = []
+        saved = 0
+        i = 0
+        row = 0
+        while i < len(lines):
+            length, replacement = rule(lines, i) or (1, lines[i:i + 1])
+            # a row from inside a rewritten window starts after it
+            while row < len(sources) and sources[row][0] < i + length:
+                start = len(result)
+                if sources[row][0] > i:
+                    start += len(replacement)
+                if result_sources and result_sources[-1][0] == start:
+                    # the previous row is left without any instruction
+                    result_sources.pop()
+                result_sources.append((start, sources[row][1]))
+                row += 1
+            result.extend(replacement)
+            saved += length - len(replacement)
+            i += length
+        return result, result_sources, saved
+
+    def count(self, lines):
+        return sum(1 for line in lines if not line.startswith('('))
+
+    def window(self, lines, i, pattern):
+        return lines[i:i + len(pattern)] == pattern
+
+    def reloads_A(self, lines, i):
+        " Nothing from i on depends on the current value of A. "
+        return i == len(lines) or lines[i][0] in '@('
+
+    def writes_A(self, line):
+        return line.startswith('(') or line.startswith('@') or (
+            '=' in line and 'A' in line.split('=')[0])
+
+    # push constant c, then add/sub/and/or: work on the top with D=c,
+    # the constant never goes through the stack
+    def constant_operand(self, lines, i):
+        operation = ['@SP', 'A=M', 'M=D', '@SP', 'M=M+1',
+                     '@SP', 'M=M-1', '@SP', 'A=M', 'D=M',
+                     '@SP', 'M=M-1', '@SP', 'A=M']
+        n = len(operation) + 2
+        if (lines[i].startswith('@') and lines[i][1:].isdigit()
+                and i + n + 3 <= len(lines)
+                and lines[i + 1] == 'D=A'
+                and lines[i + 2:i + n] == operation
+                and lines[i + n] in ['M=' + comp for comp in
+                                     CodeWriter.BINARY_ARITHMETIC.values()]
+                and lines[i + n + 1:i + n + 3] == ['@SP', 'M=M+1']
+                and self.reloads_A(lines, i + n + 3)):
+            return n + 3, [lines[i], 'D=A', '@SP', 'A=M-1', lines[i + n]]
+
+    # push constant 0/1: M=0 and M=1 need no trip through D
+    def constant_push(self, lines, i):
+        push = ['@SP', 'A=M', 'M=D', '@SP', 'M=M+1']
+        for load, value in [(['@0', 'D=A'], '0'), (['@1', 'D=A'], '1'),
+                            (['D=0'], '0')]:
+            if self.window(lines, i, load + push):
+                return (len(load) + len(push),
+                        ['@SP', 'A=M', 'M={}'.format(value), '@SP', 'M=M+1'])
+
+    # increment_SP right before decrement_SP
+    def push_pop(self, lines, i):
+        if self.window(lines, i, ['@SP', 'M=M+1', '@SP', 'M=M-1']):
+            return 4, ['@SP']
+        if self.window(lines, i, ['M=M+1', 'M=M-1']):
+            return 2, []
+
+    # @SP A=M, when A already holds *SP
+    def sp_reload(self, lines, i):
+        if (self.window(lines, i, ['@SP', 'A=M']) and i + 4 < len(lines)
+                and not self.writes_A(lines[i + 2])
+                and lines[i + 3:i + 5] == ['@SP', 'A=M']):
+            return 5, lines[i:i + 3]
+
+    # @X, when A already holds X or is loaded again right away
+    def address_reload(self, lines, i):
+        if (lines[i].startswith('@') and i + 2 < len(lines)
+                and not self.writes_A(lines[i + 1])
+                and lines[i + 2] == lines[i]):
+            return 3, lines[i:i + 2]
+        if (lines[i].startswith('@') and i + 1 < len(lines)
+                and lines[i + 1].startswith('@')):
+            return 1, []
+
+    # D=M right after M=D
+    def store_load(self, lines, i):
+        if self.window(lines, i, ['M=D', 'D=M']):
+            return 2, ['M=D']
+
+    # pop the top, work on it, push it back: work on it where it is
+    def in_place_top(self, lines, i):
+        for pop in [['@SP', 'M=M-1', '@SP', 'A=M'], ['@SP', 'M=M-1', 'A=M']]:
+            n = len(pop)
+            if (self.window(lines, i, pop) and i + n + 2 < len(lines)
+                    and lines[i + n].startswith('M=')
+                    and 'A' not in lines[i + n]
+                    and lines[i + n + 1:i + n + 3] == ['@SP', 'M=M+1']
+                    and self.reloads_A(lines, i + n + 3)):
+                return n + 3, ['@SP', 'A=M-1', lines[i + n]]
+
+    # decrement SP and point A to the new top in one instruction
+    def decrement_load(self, lines, i):
+        if self.window(lines, i, ['@SP', 'M=M-1', 'A=M']):
+            return 3, ['@SP', 'AM=M-1']
+
+
 class FileSet:
     def __init__(self, filename, file_ext):
         self.target_ext = "." + file_ext
@@ -476,6 +1228,39 @@ class FileSet:
 
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Translate a .vm file or a directory of them to Hack assembly.')
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--cache', action='store_true',
+                            help='skip the translation when no input changed')
+    arg_parser.add_argument('-O', '--optimize', action='store_true',
+                            help='fuse comparisons into branches and run the '
+                                 'peephole optimizer on the output')
+    arg_parser.add_argument('--shared-calls', action='store_true',
+                            help='share one call and one return routine')
+    arg_parser.add_argument('--compare-calls', action='store_true',
+                            help='compare inline and shared call code size')
+    arg_parser.add_argument('--stack-cache', action='store_true',
+                            help='keep the top of the stack in D')
+    arg_parser.add_argument('--prune', action='store_true',
+                            help='drop functions unreachable from Sys.init')
+    arg_parser.add_argument('--symbols', action='store_true',
+                            help='write a .map from ROM addresses to VM code')
+    args = arg_parser.parse_args()
+
+    if args.compare_calls:
+        compare_call_modes(args.path, optimize=args.optimize)
+        sys.exit(0)
+
     print(' Translating ... ')
-    filename = sys.argv[1]
-    Translator(filename)
+    translator = Translator(args.path, cache=args.cache,
+                            optimize=args.optimize,
+                            shared_calls=args.shared_calls,
+                            stack_cache=args.stack_cache,
+                            prune=args.prune,
+                            symbols=args.symbols)
+    if args.prune and not translator.skipped:
+        print(translator.reachability_report())
+    if args.optimize and not translator.skipped:
+        print(translator.fusion_report())
+        print(translator.writer.peephole.report())
@@ -1,6 +1,7 @@
 import os
-from CompileEngine import CompileEngine
 from JackTokenizer import JackTokenizer
+from JackParser import JackParser
+from XMLWriter import XMLWriter
 
 
 class JackAnalyzer:
@@ -11,7 +12,8 @@ class JackAnalyzer:
     For each source Xxx.jack file, the analyzer goes through the following logic:
     1. Create a JackTokenizer from the Xxx.jack input file.
     2. Create an output file called Xxx.xml and prepare it for writing.
-    3. Use the CompilationEngine to compile the input JackTokenizer into the output file.
+    3. Parse the JackTokenizer into an AST with the JackParser of the compiler.
+    4. Use the XMLWriter to write the parse tree of that AST into the output file.
 
     """
 
@@ -30,8 +32,8 @@ class JackAnalyzer:
             raise Exception("Unknown path {}".format(path))
 
     def analyze(self, path):
-        token_file_name = self.create_token(path)
-        self.compile_jack(path, token_file_name)
+        self.create_token(path)
+        self.compile_jack(path)
 
     def create_token(self, path):
         token_file_name = path.replace('.jack', '.token.xml')
@@ -48,13 +50,12 @@ class JackAnalyzer:
 
         return token_file_name
 
-    def compile_jack(self, path, token_file_name):
+    def compile_jack(self, path):
         jack_file_name = path.replace('.jack', '.jack.xml')
         jack_file = open(jack_file_name, 'w')
-        token_file = open(token_file_name, 'r')
 
-        engine = CompileEngine(token_file, jack_file)
-        engine.compileClass()
+        tree = JackParser(JackTokenizer(path)).parseClass()
+        XMLWriter(jack_file).writeClass(tree)
 
         jack_file.close()
 
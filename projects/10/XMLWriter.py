@@ -0,0 +1,301 @@
+"""
+Parse Tree XML
+
+- One element per grammar rule: class, classVarDec, subroutineDec,
+  parameterList, subroutineBody, varDec, statements, the five statements,
+  expression, term, expressionList
+- Every token of the source inside them, in order, written like the
+  tokens of Xxx.token.xml
+
+The tree is the AST of JackParser, the tokens it dropped (keywords,
+brackets, separators) follow from the grammar rule of each node.
+
+"""
+
+from JackTokenizer import TOKEN_KINDS, TokenKinds
+from JackAST import (
+    Let, If, While, Do, Return, IntegerConstant, StringConstant,
+    KeywordConstant, Variable, ArrayElement, Call, Parenthesized, Unary,
+    Binary)
+
+
+class XMLWriter:
+    " Writes the parse tree of a class AST as XML into output. "
+
+    XML_CONVSERSIONS = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
+
+    def __init__(self, output_file):
+        self.output = output_file
+
+        self.indent = 0
+        self.indent_level = 4
+
+    # class className '{' classVarDec*, subroutineDec* '}'
+    def writeClass(self, node):
+        self.write_open_tag('class')
+        self.write_token('class')
+        self.write_token(node.name)
+        self.write_token('{')
+
+        for class_var_dec in node.classVarDecs:
+            self.writeClassVarDec(class_var_dec)
+
+        for subroutine in node.subroutines:
+            self.writeSubroutine(subroutine)
+
+        self.write_token('}')
+        self.write_close_tag('class')
+
+    # ('static' | 'field') type varName(',' varName)* ';'
+    def writeClassVarDec(self, node):
+        self.write_open_tag('classVarDec')
+        self.write_token(node.kind)
+        self.write_token(node.type)
+        self.write_names(node.names)
+        self.write_close_tag('classVarDec')
+
+    # ('constructor' | 'function' | 'method') ('void' | type) subroutineName '(' parameterList ')' subroutineBody
+    def writeSubroutine(self, node):
+        self.write_open_tag('subroutineDec')
+
+        self.write_token(node.kind)
+        self.write_token(node.type)
+        self.write_token(node.name)
+        self.write_token('(')
+        self.writeParameterList(node.parameters)
+        self.write_token(')')
+
+        # subroutineBody
+        # '{' varDec* statements '}'
+        self.write_open_tag('subroutineBody')
+        self.write_token('{')
+
+        for var_dec in node.varDecs:
+            self.writeVarDec(var_dec)
+        self.writeStatements(node.statements)
+
+        self.write_token('}')
+        self.write_close_tag('subroutineBody')
+        self.write_close_tag('subroutineDec')
+
+    # ((type varName) (',' type varName)*)?
+    def writeParameterList(self, parameters):
+        self.write_open_tag('parameterList')
+
+        for i, (type, name) in enumerate(parameters):
+            if i:
+                self.write_token(',')
+            self.write_token(type)
+            self.write_token(name)
+
+        self.write_close_tag('parameterList')
+
+    # 'var' type varName (',' varName)* ';'
+    def writeVarDec(self, node):
+        self.write_open_tag('varDec')
+        self.write_token('var')
+        self.write_token(node.type)
+        self.write_names(node.names)
+        self.write_close_tag('varDec')
+
+    def writeStatements(self, statements):
+        self.write_open_tag('statements')
+
+        for statement in statements:
+            if isinstance(statement, Let):
+                self.writeLet(statement)
+            elif isinstance(statement, If):
+                self.writeIf(statement)
+            elif isinstance(statement, While):
+                self.writeWhile(statement)
+            elif isinstance(statement, Do):
+                self.writeDo(statement)
+            elif isinstance(statement, Return):
+                self.writeReturn(statement)
+            else:
+                raise Exception("Unknown Statements {}".format(statement))
+
+        self.write_close_tag('statements')
+
+    # do subroutinCall ';'
+    def writeDo(self, node):
+        self.write_open_tag('doStatement')
+        self.write_token('do')
+        self.write_subroutine_call(node.call)
+        self.write_token(';')
+        self.write_close_tag('doStatement')
+
+    # 'let' varName ('[' expression ']')? '=' expression ';'
+    def writeLet(self, node):
+        self.write_open_tag('letStatement')
+
+        self.write_token('let')
+        self.write_token(node.name)
+
+        if node.index is not None:
+            self.write_token('[')
+            self.writeExpression(node.index)
+            self.write_token(']')
+
+        self.write_token('=')
+        self.writeExpression(node.value)
+        self.write_token(';')
+
+        self.write_close_tag('letStatement')
+
+    # 'while' '(' expression ')' '{' statements '}'
+    def writeWhile(self, node):
+        self.write_open_tag('whileStatement')
+
+        self.write_token('while')
+        self.write_token('(')
+        self.writeExpression(node.condition)
+        self.write_token(')')
+        self.write_token('{')
+        self.writeStatements(node.statements)
+        self.write_token('}')
+
+        self.write_close_tag('whileStatement')
+
+    # 'return' expression? ';'
+    def writeReturn(self, node):
+        self.write_open_tag('returnStatement')
+        self.write_token('return')
+
+        if node.value is not None:
+            self.writeExpression(node.value)
+
+        self.write_token(';')
+        self.write_close_tag('returnStatement')
+
+    # 'if' '(' expression ')' '{' statements '}' ('else' '{' statements '}')?
+    def writeIf(self, node):
+        self.write_open_tag('ifStatement')
+
+        self.write_token('if')
+        self.write_token('(')
+        self.writeExpression(node.condition)
+        self.write_token(')')
+        self.write_token('{')
+        self.writeStatements(node.statements)
+        self.write_token('}')
+
+        if node.elseStatements is not None:
+            self.write_token('else')
+            self.write_token('{')
+            self.writeStatements(node.elseStatements)
+            self.write_token('}')
+
+        self.write_close_tag('ifStatement')
+
+    # term (op term)*
+    def writeExpression(self, node):
+        self.write_open_tag('expression')
+
+        # the chain nests on the left, its terms are written first to last
+        ops = []
+        while isinstance(node, Binary):
+            ops.append((node.op, node.right))
+            node = node.left
+        self.writeTerm(node)
+        for op, term in reversed(ops):
+            self.write_token(op)
+            self.writeTerm(term)
+
+        self.write_close_tag('expression')
+
+    # integerConstant | stringConstant | keywordConstant | varName | varName '[' expression ']' |
+    # subroutineCall | '(' expression ')' | unaryOp term
+    def writeTerm(self, node):
+        self.write_open_tag('term')
+
+        if isinstance(node, Unary):
+            self.write_token(node.op)
+            self.writeTerm(node.operand)
+
+        elif isinstance(node, Parenthesized):
+            self.write_token('(')
+            self.writeExpression(node.expression)
+            self.write_token(')')
+
+        elif isinstance(node, IntegerConstant):
+            self.write_element('integerConstant', str(node.value))
+
+        elif isinstance(node, StringConstant):
+            self.write_element('stringConstant', node.value)
+
+        elif isinstance(node, KeywordConstant):
+            self.write_token(node.value)
+
+        elif isinstance(node, Variable):
+            self.write_token(node.name)
+
+        elif isinstance(node, ArrayElement):
+            self.write_token(node.name)
+            self.write_token('[')
+            self.writeExpression(node.index)
+            self.write_token(']')
+
+        elif isinstance(node, Call):
+            self.write_subroutine_call(node)
+
+        else:
+            raise Exception("Unknown term {}".format(node))
+
+        self.write_close_tag('term')
+
+    # (expression (',' expression)*)?
+    def writeExpressionList(self, expressions):
+        self.write_open_tag('expressionList')
+
+        for i, expression in enumerate(expressions):
+            if i:
+                self.write_token(',')
+            self.writeExpression(expression)
+
+        self.write_close_tag('expressionList')
+
+    # Non API
+    def write(self, s):
+        self.output.write(s)
+
+    def write_open_tag(self, tag):
+        self.write("{}<{}>\n".format(' ' * self.indent, tag))
+        self.indent_increment()
+
+    def write_close_tag(self, tag):
+        self.indent_decrement()
+        self.write("{}</{}>\n".format(' ' * self.indent, tag))
+
+    def write_token(self, token):
+        " A keyword, symbol or identifier, told apart like the tokenizer. "
+        self.write_element(TokenKinds.TOKEN_TYPES[TOKEN_KINDS[token]], token)
+
+    def write_element(self, typ, val):
+        val = self.XML_CONVSERSIONS.get(val, val)
+        self.write('{}<{typ}> {val} </{typ}>\n'.format(
+            ' ' * self.indent, typ=typ, val=val))
+
+    def indent_increment(self):
+        self.indent += self.indent_level
+
+    def indent_decrement(self):
+        self.indent -= self.indent_level
+
+    # varName (',' varName)* ';'
+    def write_names(self, names):
+        for i, name in enumerate(names):
+            if i:
+                self.write_token(',')
+            self.write_token(name)
+        self.write_token(';')
+
+    # subroutineName '(' expressionList ')' | (className | varName) '.' subroutineName '(' expressionList ')'
+    def write_subroutine_call(self, node):
+        if node.target is not None:
+            self.write_token(node.target)
+            self.write_token('.')
+        self.write_token(node.name)
+        self.write_token('(')
+        self.writeExpressionList(node.arguments)
+        self.write_token(')')
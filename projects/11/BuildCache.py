@@ -0,0 +1,42 @@
+import os
+import json
+import hashlib
+
+
+class BuildCache:
+    """
+    Keep, next to the sources, a JSON record of the content hash each
+    output was last built from, so unchanged inputs can be skipped.
+    update() only records an entry, save() writes the record: a build of
+    many outputs writes it once.
+    """
+
+    FILENAME = '.buildcache'
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, self.FILENAME)
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (IOError, ValueError):
+            self.entries = {}
+
+    def key(self, sources, version):
+        " Hash the tool version together with every source file. "
+        digest = hashlib.sha256(version.encode())
+        for source in sorted(sources):
+            digest.update(os.path.basename(source).encode())
+            with open(source, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def fresh(self, target, key):
+        name = os.path.basename(target)
+        return self.entries.get(name) == key and os.path.isfile(target)
+
+    def update(self, target, key):
+        self.entries[os.path.basename(target)] = key
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
@@ -0,0 +1,108 @@
+"""
+Class Index: the signatures of every class of a program
+    - Fields and statics: name and type
+    - Subroutines: kind (constructor, function or method), return type and
+      number of parameters
+
+The index is built from the tokens alone, before any code is generated,
+so every file can then be compiled on its own and still check the calls
+it makes into the other classes.
+
+"""
+
+
+class ClassIndex:
+    " Class name -> signature, checks subroutine calls across classes "
+
+    SUBROUTINE_KINDS = ['constructor', 'function', 'method']
+
+    def __init__(self):
+        self.classes = {}
+
+    def add(self, signature):
+        name = signature['name']
+        if name in self.classes:
+            raise Exception("Class defined twice: {}".format(name))
+        self.classes[name] = signature
+
+    def checkCall(self, caller, class_name, subroutine_name, method, nArgs):
+        """
+        Raise if a call does not match the signature of its target:
+        a method called as a function or the other way round, or the wrong
+        number of arguments. nArgs does not count the object of a method.
+        Classes outside the index, like the OS, are not checked.
+        """
+        if class_name not in self.classes:
+            return
+        name = '{}.{}'.format(class_name, subroutine_name)
+        subroutines = self.classes[class_name]['subroutines']
+        if subroutine_name not in subroutines:
+            raise Exception("{}: call to undefined subroutine {}".format(
+                caller, name))
+
+        kind, _, nParams = subroutines[subroutine_name]
+        if method and kind != 'method':
+            raise Exception("{}: {} {} called as a method".format(
+                caller, kind, name))
+        if not method and kind == 'method':
+            raise Exception("{}: method {} called as a function".format(
+                caller, name))
+        if nArgs != nParams:
+            raise Exception("{}: {} takes {} arguments, {} given".format(
+                caller, name, nParams, nArgs))
+
+    @classmethod
+    def scan(cls, values):
+        """
+        Signature of the class in a list of token values:
+        class className '{' classVarDec* subroutineDec* '}'
+        Subroutine bodies are skipped by matching their braces.
+        """
+        signature = {
+            'name': values[1],
+            'fields': [],
+            'statics': [],
+            'subroutines': {},
+        }
+        position = 3
+        while values[position] != '}':
+            token = values[position]
+            if token in ['static', 'field']:
+                # ('static' | 'field') type varName (',' varName)* ';'
+                variables = signature[token + 's']
+                type = values[position + 1]
+                position += 2
+                while values[position - 1] != ';':
+                    variables.append((values[position], type))
+                    position += 2
+            elif token in cls.SUBROUTINE_KINDS:
+                # kind type name '(' parameterList ')' subroutineBody
+                type, name = values[position + 1:position + 3]
+                position += 4
+                nParams = 0
+                while values[position] != ')':
+                    if values[position] != ',':
+                        nParams += 1
+                        position += 1
+                    position += 1
+                signature['subroutines'][name] = (token, type, nParams)
+                position = cls.skip_block(values, position + 1)
+            else:
+                raise Exception("Unexpected token in class {}: {}".format(
+                    signature['name'], token))
+        return signature
+
+    # Non API
+    @staticmethod
+    def skip_block(values, position):
+        " Position right after the block that opens at position. "
+        depth = 0
+        while True:
+            token = values[position]
+            position += 1
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+                if depth == 0:
+                    return position
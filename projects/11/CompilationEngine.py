@@ -11,12 +11,18 @@ Code Generation:
 
 """
 
-import re
 from SymbolTable import SymbolTable
+from JackParser import JackParser
+from JackAST import (
+    Binary, Unary, Parenthesized, IntegerConstant, StringConstant,
+    KeywordConstant, Variable, ArrayElement, Call, ShiftAdd)
 
 
 class CompilationEngine:
-    " Gets its input from a JackTokenizer and emits its parsed structure into output.  "
+    """
+    Gets its input from a JackTokenizer, parses it into the AST of the class
+    with a JackParser, then emits the VM code of that tree into output.
+    """
 
     CONVERT_KIND = {
         'ARG': 'ARG',
@@ -39,147 +45,112 @@ class CompilationEngine:
 
     if_index = 0
     while_index = 0
+    string_index = 0
 
-    def __init__(self, input_file, output_file):
+    def __init__(self, input_file, output_file, class_index=None,
+                 optimizer=None, intern_strings=False, thread_jumps=False):
         self.tokenizer = input_file
         self.vm_writer = output_file
         self.symbol_table = SymbolTable()
-        # cause tokenizer advance is irreversible
-        # need a buffer to save token which need to use more than one time
-        self.buffer = []
+        # signatures of the other classes, every call is checked against
+        # them when given
+        self.class_index = class_index
+        # rewrites the tree before any code is generated when given
+        self.optimizer = optimizer
+        # every distinct string literal of the class is built once, the
+        # first time it is used, and kept in a static after the class ones:
+        # literal -> static index. A program that changes or disposes of a
+        # literal sees the change the next time it uses the same literal.
+        self.intern_strings = intern_strings
+        self.strings = {}
+        # if and while branch on the condition itself, see compile_branch
+        self.thread_jumps = thread_jumps
 
     # class className '{' classVarDec*, subroutineDec* '}'
-    def compileClass(self):
-        self.get_token()
-        self.class_name = self.get_token()
-        self.get_token()
+    def compileClass(self, tree=None):
+        " Parse the class unless its tree is given, then compile the tree. "
+        if tree is None:
+            tree = JackParser(self.tokenizer).parseClass()
+        if self.optimizer:
+            tree = self.optimizer.optimizeClass(tree)
+        self.class_name = tree.name
 
-        while self.is_class_var_dec():
-            self.compileClassVarDec()  # classVarDec*
+        for class_var_dec in tree.classVarDecs:
+            self.compileClassVarDec(class_var_dec)  # classVarDec*
 
-        while self.is_subroutine_dec():
-            self.compileSubroutine()  # subroutineDec*
+        for subroutine in tree.subroutines:
+            self.compileSubroutine(subroutine)  # subroutineDec*
 
         self.vm_writer.close()
 
     # ('static' | 'field') type varName(',' varName)* ';'
-    def compileClassVarDec(self):
-        kind = self.get_token()
-        type = self.get_token()
-        name = self.get_token()
-        self.symbol_table.define(name, type, kind)
-
-        while self.peek() != ';':
-            self.get_token()
-            name = self.get_token()
-            self.symbol_table.define(name, type, kind)
-
-        self.get_token()
+    def compileClassVarDec(self, node):
+        for name in node.names:
+            self.symbol_table.define(name, node.type, node.kind)
 
     # subroutineDec: ('constructor' | 'function' | 'method') ('void' | type) subroutineName '(' parameterList ')' subroutineBody
     # subroutineBody: '{' varDec* statements '}'
-    def compileSubroutine(self):
-        subroutine_kind = self.get_token()
-        subroutine_type = self.get_token()
-        subroutine_name = self.get_token()
+    def compileSubroutine(self, node):
         self.symbol_table.startSubroutine()
 
-        if subroutine_kind == 'method':
+        if node.kind == 'method':
             self.symbol_table.define('instance', self.class_name, 'ARG')
 
-        self.get_token()
-        self.compileParameterList()
-        self.get_token()
-        self.get_token()
-
-        while self.peek() == 'var':
-            self.compileVarDec()
+        self.compileParameterList(node.parameters)
+        for var_dec in node.varDecs:
+            self.compileVarDec(var_dec)
 
-        function_name = '{}.{}'.format(self.class_name, subroutine_name)
+        function_name = '{}.{}'.format(self.class_name, node.name)
+        self.function_name = function_name
         nLocals = self.symbol_table.varCount('VAR')
         self.vm_writer.writeFunction(function_name, nLocals)
 
-        if subroutine_kind == 'constructor':
+        if node.kind == 'constructor':
             # collect field number
             field_num = self.symbol_table.varCount('FIELD')
             self.vm_writer.writePush('CONST', field_num)
             self.vm_writer.writeCall('Memory.alloc', 1)
             self.vm_writer.writePop('POINTER', 0)
-        elif subroutine_kind == 'method':
+        elif node.kind == 'method':
             self.vm_writer.writePush('ARG', 0)
             self.vm_writer.writePop('POINTER', 0)
 
-        self.compileStatements()
-        self.get_token()
+        self.compileStatements(node.statements)
 
     # ( (type varName) (',' type varName)*)?
-    def compileParameterList(self):
-        if self.peek() != ')':
-            varType = self.get_token()
-            varName = self.get_token()
-            self.symbol_table.define(varName, varType, 'ARG')
-
-        while self.peek() != ')':
-            self.get_token()
-            varType = self.get_token()
-            varName = self.get_token()
+    def compileParameterList(self, parameters):
+        for varType, varName in parameters:
             self.symbol_table.define(varName, varType, 'ARG')
 
     # 'var' type varName (',' varName)* ';'
-    def compileVarDec(self):
-        self.get_token()
-        varType = self.get_token()
-        varName = self.get_token()
-
-        self.symbol_table.define(varName, varType, 'VAR')
-
-        while self.peek() != ';':
-            self.get_token()
-            varName = self.get_token()
-            self.symbol_table.define(varName, varType, 'VAR')
-
-        self.get_token()
+    def compileVarDec(self, node):
+        for varName in node.names:
+            self.symbol_table.define(varName, node.type, 'VAR')
 
     # letStatement | ifStatement | whileStatement | doStatement | returnStatement
-    def compileStatements(self):
-        while self.is_statement():
-            token = self.get_token()
-
-            if 'let' == token:
-                self.compileLet()
-            elif 'if' == token:
-                self.compileIf()
-            elif 'while' == token:
-                self.compileWhile()
-            elif 'do' == token:
-                self.compileDo()
-            elif 'return' == token:
-                self.compileReturn()
+    def compileStatements(self, statements):
+        for statement in statements:
+            # Let -> compileLet, If -> compileIf ...
+            getattr(self, 'compile' + type(statement).__name__)(statement)
 
     # 'do' subroutineCall ';'
     # subroutineCall: subroutineName '(' expressionList ')' | ( className | varName) '.' subroutineName '(' expressionList ')'
-    def compileDo(self):
-        self.compile_subroutine_call()
+    def compileDo(self, node):
+        self.compile_subroutine_call(node.call)
         self.vm_writer.writePop('TEMP', 0)
-        self.get_token()
 
     # 'let' varName ('[' expression ']')? '=' expression ';'
-    def compileLet(self):
-        varName = self.get_token()
-        varKind = self.CONVERT_KIND[self.symbol_table.kindOf(varName)]
-        varIndex = self.symbol_table.indexOf(varName)
+    def compileLet(self, node):
+        varKind = self.CONVERT_KIND[self.symbol_table.kindOf(node.name)]
+        varIndex = self.symbol_table.indexOf(node.name)
 
-        if self.peek() == '[':
-            self.get_token()
-            self.compileExpression()
-            self.get_token()
+        if node.index is not None:
+            self.compileExpression(node.index)
 
             self.vm_writer.writePush(varKind, varIndex)
             self.vm_writer.writeArithmetic('ADD')
 
-            self.get_token()
-            self.compileExpression()
-            self.get_token()
+            self.compileExpression(node.value)
 
             self.vm_writer.writePop('TEMP', 0)
             self.vm_writer.writePop('POINTER', 1)
@@ -187,148 +158,197 @@ class CompilationEngine:
             self.vm_writer.writePop('THAT', 0)
 
         else:
-            self.get_token()
-            self.compileExpression()
-            self.get_token()
-
+            self.compileExpression(node.value)
             self.vm_writer.writePop(varKind, varIndex)
 
     # 'while' '(' expression ')' '{' statements '}'
-    def compileWhile(self):
+    def compileWhile(self, node):
         while_index = self.while_index
         self.while_index += 1
 
+        if self.thread_jumps and self.is_boolean(node.condition):
+            # the test at the bottom jumps back, one jump per iteration
+            self.vm_writer.writeGoto('WHILE_EXP{}'.format(while_index))
+            self.vm_writer.writeLabel('WHILE_BODY{}'.format(while_index))
+            self.compileStatements(node.statements)
+            self.vm_writer.writeLabel('WHILE_EXP{}'.format(while_index))
+            self.compile_branch(node.condition,
+                                'WHILE_BODY{}'.format(while_index), True)
+            return
+
         self.vm_writer.writeLabel('WHILE_EXP{}'.format(while_index))
-        self.get_token()
-        self.compileExpression()
+        self.compileExpression(node.condition)
         self.vm_writer.writeArithmetic('NOT')
-        self.get_token()
-        self.get_token()
         self.vm_writer.writeIf('WHILE_END{}'.format(while_index))
-        self.compileStatements()
+        self.compileStatements(node.statements)
         self.vm_writer.writeGoto('WHILE_EXP{}'.format(while_index))
         self.vm_writer.writeLabel('WHILE_END{}'.format(while_index))
-        self.get_token()
 
     # 'return' expression? ';'
-    def compileReturn(self):
-        if self.peek() != ';':
-            self.compileExpression()
+    def compileReturn(self, node):
+        if node.value is not None:
+            self.compileExpression(node.value)
         else:
             self.vm_writer.writePush('CONST', 0)
 
         self.vm_writer.writeReturn()
-        self.get_token()
 
     # 'if' '(' expression ')' '{' statements '}' ( 'else' '{' statements '}' )?
-    def compileIf(self):
+    def compileIf(self, node):
         if_index = self.if_index
         self.if_index += 1
 
-        self.get_token()
-        self.compileExpression()
-        self.get_token()
-
-        self.get_token()
+        if self.thread_jumps:
+            self.compile_branch(node.condition, 'IF_FALSE{}'.format(if_index),
+                                False)
+            self.compileStatements(node.statements)
+            if node.elseStatements is None:
+                self.vm_writer.writeLabel('IF_FALSE{}'.format(if_index))
+                return
+
+            self.vm_writer.writeGoto('IF_END{}'.format(if_index))
+            self.vm_writer.writeLabel('IF_FALSE{}'.format(if_index))
+            self.compileStatements(node.elseStatements)
+            self.vm_writer.writeLabel('IF_END{}'.format(if_index))
+            return
+
+        self.compileExpression(node.condition)
         self.vm_writer.writeIf('IF_TRUE{}'.format(if_index))
         self.vm_writer.writeGoto('IF_FALSE{}'.format(if_index))
         self.vm_writer.writeLabel('IF_TRUE{}'.format(if_index))
-        self.compileStatements()
+        self.compileStatements(node.statements)
         self.vm_writer.writeGoto('IF_END{}'.format(if_index))
-        self.get_token()
 
         self.vm_writer.writeLabel('IF_FALSE{}'.format(if_index))
-        if self.peek() == 'else':
-            self.get_token()
-            self.get_token()
-            self.compileStatements()
-            self.get_token()
+        if node.elseStatements is not None:
+            self.compileStatements(node.elseStatements)
 
         self.vm_writer.writeLabel('IF_END{}'.format(if_index))
 
     # term (op term)*
-    def compileExpression(self):
-        self.compileTerm()
+    def compileExpression(self, node):
+        if not isinstance(node, Binary):
+            self.compileTerm(node)
+            return
 
-        while self.is_op():
-            op = self.get_token()
-            self.compileTerm()
+        self.compileExpression(node.left)
+        self.compileExpression(node.right)
 
-            if op in self.ARITHMETIC.keys():
-                self.vm_writer.writeArithmetic(self.ARITHMETIC[op])
-            elif op == '*':
-                self.vm_writer.writeCall('Math.multiply', 2)
-            elif op == '/':
-                self.vm_writer.writeCall('Math.divide', 2)
+        if node.op in self.ARITHMETIC.keys():
+            self.vm_writer.writeArithmetic(self.ARITHMETIC[node.op])
+        elif node.op == '*':
+            self.vm_writer.writeCall('Math.multiply', 2)
+        elif node.op == '/':
+            self.vm_writer.writeCall('Math.divide', 2)
 
     # integerConstant | stringConstant | keywordConstant | varName |
     # varName '[' expression ']' | subroutineCall | '(' expression ')' | unaryOp term
-    def compileTerm(self):
-        if self.is_unary_op_term():
-            unary_op = self.get_token()
-            self.compileTerm()
-            self.vm_writer.writeArithmetic(self.ARITHMETIC_UNARY[unary_op])
+    def compileTerm(self, node):
+        if isinstance(node, Unary):
+            self.compileExpression(node.operand)
+            self.vm_writer.writeArithmetic(self.ARITHMETIC_UNARY[node.op])
 
-        elif self.peek() == '(':
-            self.get_token()
-            self.compileExpression()
-            self.get_token()
+        elif isinstance(node, Parenthesized):
+            self.compileExpression(node.expression)
 
-        elif self.peek_type() == 'integer':
-            self.vm_writer.writePush('CONST', self.get_token())
+        elif isinstance(node, Binary):
+            self.compileExpression(node)
 
-        elif self.peek_type() == 'string':
-            self.compile_string()
+        elif isinstance(node, ShiftAdd):
+            self.compile_shift_add(node)
+
+        elif isinstance(node, IntegerConstant):
+            self.vm_writer.writePush('CONST', node.value)
+
+        elif isinstance(node, StringConstant):
+            if self.intern_strings:
+                self.compile_interned_string(node.value)
+            else:
+                self.compile_string(node.value)
 
         # true、false、null、this
-        elif self.peek_type() == 'keyword':
-            self.compile_keyword()
+        elif isinstance(node, KeywordConstant):
+            self.compile_keyword(node.value)
 
-        else:
-            # varName '[' expression ']'
-            if self.is_array():
-                array_var = self.get_token()
-                self.get_token()
-                self.compileExpression()
-                self.get_token()
-
-                array_kind = self.symbol_table.kindOf(array_var)
-                array_index = self.symbol_table.indexOf(array_var)
-                self.vm_writer.writePush(self.CONVERT_KIND[array_kind],
-                                         array_index)
-                self.vm_writer.writeArithmetic('ADD')
-                self.vm_writer.writePop('POINTER', 1)
-                self.vm_writer.writePush('THAT', 0)
+        # varName '[' expression ']'
+        elif isinstance(node, ArrayElement):
+            self.compileExpression(node.index)
 
-            # subroutineCall: subroutineName '(' expressionList ')' | ( className | varName) '.' subroutineName '(' expressionList ')'
-            elif self.is_subroutine_call():
-                self.compile_subroutine_call()
+            array_kind = self.symbol_table.kindOf(node.name)
+            array_index = self.symbol_table.indexOf(node.name)
+            self.vm_writer.writePush(self.CONVERT_KIND[array_kind],
+                                     array_index)
+            self.vm_writer.writeArithmetic('ADD')
+            self.vm_writer.writePop('POINTER', 1)
+            self.vm_writer.writePush('THAT', 0)
 
-            # varName
-            else:
-                varName = self.get_token()
-                varKind = self.CONVERT_KIND[self.symbol_table.kindOf(varName)]
-                varIndex = self.symbol_table.indexOf(varName)
-                self.vm_writer.writePush(varKind, varIndex)
+        # subroutineCall: subroutineName '(' expressionList ')' | ( className | varName) '.' subroutineName '(' expressionList ')'
+        elif isinstance(node, Call):
+            self.compile_subroutine_call(node)
 
-    # (expression (',' expression)* )?
-    def compileExpressionList(self):
-        number_args = 0
+        # varName
+        elif isinstance(node, Variable):
+            varKind = self.CONVERT_KIND[self.symbol_table.kindOf(node.name)]
+            varIndex = self.symbol_table.indexOf(node.name)
+            self.vm_writer.writePush(varKind, varIndex)
 
-        if self.peek() != ')':
-            number_args += 1
-            self.compileExpression()
+        else:
+            raise Exception("Unknown term {}".format(node))
 
-        while self.peek() != ')':
-            number_args += 1
-            self.get_token()
-            self.compileExpression()
+    # (expression (',' expression)* )?
+    def compileExpressionList(self, expressions):
+        for expression in expressions:
+            self.compileExpression(expression)
 
-        return number_args
+        return len(expressions)
 
     # Non API
-    def compile_keyword(self):
-        keyword = self.get_token()
+    def compile_branch(self, node, label, when):
+        """
+        Jump to label when the condition node is true (when is True) or
+        false, fall through otherwise. A condition is true when it is not 0
+        like in if-goto, a ~ in front of a boolean only swaps the two ways
+        out. The comparison or not right before the if-goto is what the
+        translator fuses into a single jump.
+        """
+        while (isinstance(node, Unary) and node.op == '~'
+               and self.is_boolean(node.operand)):
+            node = node.operand
+            when = not when
+        if isinstance(node, Parenthesized):
+            return self.compile_branch(node.expression, label, when)
+
+        if isinstance(node, KeywordConstant) and node.value in ['true',
+                                                                'false']:
+            # decided now: always jump or never
+            if (node.value == 'true') == when:
+                self.vm_writer.writeGoto(label)
+            return
+
+        self.compileExpression(node)
+        if not when:
+            if self.is_boolean(node):
+                self.vm_writer.writeArithmetic('NOT')
+            else:
+                self.vm_writer.writePush('CONST', 0)
+                self.vm_writer.writeArithmetic('EQ')
+        self.vm_writer.writeIf(label)
+
+    def is_boolean(self, node):
+        " node always evaluates to true (-1) or false (0). "
+        if isinstance(node, Parenthesized):
+            return self.is_boolean(node.expression)
+        if isinstance(node, Binary):
+            if node.op in ['<', '>', '=']:
+                return True
+            return (node.op in ['&', '|'] and self.is_boolean(node.left)
+                    and self.is_boolean(node.right))
+        if isinstance(node, Unary):
+            return node.op == '~' and self.is_boolean(node.operand)
+        return isinstance(node, KeywordConstant) and node.value in [
+            'true', 'false']
+
+    def compile_keyword(self, keyword):
         if keyword == 'this':
             self.vm_writer.writePush('POINTER', 0)
         else:
@@ -337,13 +357,12 @@ class CompilationEngine:
             if keyword == 'true':
                 self.vm_writer.writeArithmetic('NOT')
 
-    def compile_subroutine_call(self):
-        identifier = self.get_token()
+    def compile_subroutine_call(self, node):
+        identifier = node.target
+        subroutine_name = node.name
         number_args = 0
 
-        if self.peek() == '.':
-            self.get_token()
-            subroutine_name = self.get_token()
+        if identifier is not None:
             subroutine_type = self.symbol_table.typeOf(identifier)
 
             if subroutine_type is not None:
@@ -354,6 +373,7 @@ class CompilationEngine:
                 self.vm_writer.writePush(self.CONVERT_KIND[instance_kind],
                                          instance_index)
 
+                class_name = instance_type
                 function_name = '{}.{}'.format(instance_type, subroutine_name)
                 number_args += 1
 
@@ -362,89 +382,62 @@ class CompilationEngine:
                 class_name = identifier
                 function_name = '{}.{}'.format(class_name, subroutine_name)
 
-        elif self.peek() == '(':
-            subroutine_name = identifier
+        else:
+            class_name = self.class_name
             function_name = '{}.{}'.format(self.class_name, subroutine_name)
             number_args += 1
             self.vm_writer.writePush('POINTER', 0)
 
-        self.get_token()
-        number_args += self.compileExpressionList()
-        self.get_token()
-        self.vm_writer.writeCall(function_name, number_args)
+        expressions = self.compileExpressionList(node.arguments)
+        if self.class_index:
+            self.class_index.checkCall(self.function_name, class_name,
+                                       subroutine_name, number_args == 1,
+                                       expressions)
+        self.vm_writer.writeCall(function_name, number_args + expressions)
+
+    def compile_shift_add(self, node):
+        """
+        operand * factor, from the highest bit of factor down: double the
+        product, add the operand for a 1. temp 1 holds the operand, temp 2
+        the product while it is doubled, nothing is evaluated in between.
+        """
+        self.compileExpression(node.operand)
+
+        bits = bin(node.factor)[3:]
+        if '1' in bits:
+            self.vm_writer.writePop('TEMP', 1)
+            self.vm_writer.writePush('TEMP', 1)
+        for bit in bits:
+            self.vm_writer.writePop('TEMP', 2)
+            self.vm_writer.writePush('TEMP', 2)
+            self.vm_writer.writePush('TEMP', 2)
+            self.vm_writer.writeArithmetic('ADD')
+            if bit == '1':
+                self.vm_writer.writePush('TEMP', 1)
+                self.vm_writer.writeArithmetic('ADD')
 
-    def compile_string(self):
-        string = self.get_token()
+    def compile_interned_string(self, string):
+        """
+        push static k, built the first time: a String is never 0, a static
+        starts at 0.
+        """
+        if string not in self.strings:
+            self.strings[string] = (self.symbol_table.varCount('STATIC')
+                                    + len(self.strings))
+        index = self.strings[string]
+        string_index = self.string_index
+        self.string_index += 1
+
+        self.vm_writer.writePush('STATIC', index)
+        self.vm_writer.writeIf('STRING_READY{}'.format(string_index))
+        self.compile_string(string)
+        self.vm_writer.writePop('STATIC', index)
+        self.vm_writer.writeLabel('STRING_READY{}'.format(string_index))
+        self.vm_writer.writePush('STATIC', index)
+
+    def compile_string(self, string):
         self.vm_writer.writePush('CONST', len(string))
         self.vm_writer.writeCall('String.new', 1)
         for char in string:
             self.vm_writer.writePush('CONST', ord(char))
             self.vm_writer.writeCall('String.appendChar', 2)
-
-    def is_subroutine_call(self):
-        token = self.get_token()
-        subroutine_call = self.peek() in ['.', '(']
-        self.unget_token(token)
-        return subroutine_call
-
-    def is_array(self):
-        token = self.get_token()
-        array = self.peek() == '['
-        self.unget_token(token)
-        return array
-
-    def is_class_var_dec(self):
-        return self.peek() in ['static', 'field']
-
-    def is_subroutine_dec(self):
-        return self.peek() in ['constructor', 'function', 'method']
-
-    def is_statement(self):
-        return self.peek() in ['let', 'if', 'while', 'do', 'return']
-
-    def is_op(self):
-        return self.peek() in ['+', '-', '*', '/', '&', '|', '<', '>', '=']
-
-    def is_unary_op_term(self):
-        return self.peek() in ['~', '-']
-
-    def peek(self):
-        return self.peek_info()[0]
-
-    def peek_type(self):
-        return self.peek_info()[1]
-
-    def peek_info(self):
-        token_info = self.get_token_info()
-        self.unget_token_info(token_info)
-        return token_info
-
-    def get_token(self):
-        return self.get_token_info()[0]
-
-    def get_token_info(self):
-        if self.buffer:
-            return self.buffer.pop(0)
-        else:
-            return self.get_next_token()
-
-    def unget_token(self, token):
-        self.unget_token_info((token, 'UNKNOWN'))
-
-    def unget_token_info(self, token):
-        self.buffer.insert(0, token)
-
-    def get_next_token(self):
-        if self.tokenizer.hasMoreTokens():
-            self.tokenizer.advance()
-
-            if self.tokenizer.tokenType() == 'keyword':
-                return (self.tokenizer.keyWord().lower(), self.tokenizer.tokenType())
-            elif self.tokenizer.tokenType() == 'symbol':
-                return (self.tokenizer.symbol(), self.tokenizer.tokenType())
-            elif self.tokenizer.tokenType() == 'identifier':
-                return (self.tokenizer.identifier(), self.tokenizer.tokenType())
-            elif self.tokenizer.tokenType() == 'integer':
-                return (self.tokenizer.intVal(), self.tokenizer.tokenType())
-            elif self.tokenizer.tokenType() == 'string':
-                return (self.tokenizer.stringVal(), self.tokenizer.tokenType())
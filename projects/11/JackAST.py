@@ -0,0 +1,139 @@
+"""
+Jack Abstract Syntax Tree
+
+- Program structure
+    - Class: name, classVarDecs, subroutines
+    - ClassVarDec: kind ('static' | 'field'), type, names
+    - Subroutine: kind, type, name, parameters [(type, name)], varDecs,
+      statements
+    - VarDec: type, names
+
+- Statements
+    - Let: name, index (None unless name[index] = ...), value
+    - If: condition, statements, elseStatements (None without else)
+    - While: condition, statements
+    - Do: call
+    - Return: value (None for a bare return)
+
+- Expressions
+    - IntegerConstant, StringConstant (without the quotes),
+      KeywordConstant: value
+    - Variable: name
+    - ArrayElement: name, index
+    - Call: target (class or variable name, None for a call on this),
+      name, arguments
+    - Parenthesized: expression
+    - Unary: op, operand
+    - Binary: op, left, right, a chain term (op term)* nests on the left
+      as Jack has no operator precedence
+
+- Lowered by the Optimizer, never parsed
+    - ShiftAdd: operand, factor, operand * factor by doubling and adding
+
+Every node keeps its fields in __slots__, a large program is a lot of
+small nodes.
+
+"""
+
+
+class Node:
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name)
+            for name in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            repr(getattr(self, name)) for name in self.__slots__))
+
+
+# Program structure
+class Class(Node):
+    __slots__ = ('name', 'classVarDecs', 'subroutines')
+
+
+class ClassVarDec(Node):
+    __slots__ = ('kind', 'type', 'names')
+
+
+class Subroutine(Node):
+    __slots__ = ('kind', 'type', 'name', 'parameters', 'varDecs',
+                 'statements')
+
+
+class VarDec(Node):
+    __slots__ = ('type', 'names')
+
+
+# Statements
+class Let(Node):
+    __slots__ = ('name', 'index', 'value')
+
+
+class If(Node):
+    __slots__ = ('condition', 'statements', 'elseStatements')
+
+
+class While(Node):
+    __slots__ = ('condition', 'statements')
+
+
+class Do(Node):
+    __slots__ = ('call',)
+
+
+class Return(Node):
+    __slots__ = ('value',)
+
+
+# Expressions
+class IntegerConstant(Node):
+    __slots__ = ('value',)
+
+
+class StringConstant(Node):
+    __slots__ = ('value',)
+
+
+class KeywordConstant(Node):
+    __slots__ = ('value',)
+
+
+class Variable(Node):
+    __slots__ = ('name',)
+
+
+class ArrayElement(Node):
+    __slots__ = ('name', 'index')
+
+
+class Call(Node):
+    __slots__ = ('target', 'name', 'arguments')
+
+
+class Parenthesized(Node):
+    __slots__ = ('expression',)
+
+
+class Unary(Node):
+    __slots__ = ('op', 'operand')
+
+
+class Binary(Node):
+    __slots__ = ('op', 'left', 'right')
+
+
+# Lowered by the Optimizer
+class ShiftAdd(Node):
+    __slots__ = ('operand', 'factor')
@@ -1,7 +1,11 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+from BuildCache import BuildCache
+from ClassIndex import ClassIndex
 from JackTokenizer import JackTokenizer
 from VMWriter import VMWriter
+from Optimizer import Optimizer
 from CompilationEngine import CompilationEngine
 
 
@@ -15,49 +19,144 @@ class JackCompiler:
     2. Create an output file called Xxx.xml and prepare it for writing.
     3. Use the CompilationEngine to compile the input JackTokenizer into the output file.
 
+    In build mode every file is tokenized once and a ClassIndex of all of
+    them is built first, then the classes are compiled in parallel across
+    jobs processes (all cores by default, jobs=1 compiles serially in this
+    process), with every call checked against the index.
+
+    With optimize, the Optimizer rewrites every class AST before its code
+    is generated, its counts add up over all the files, and if and while
+    branch on their conditions directly (CompilationEngine.compile_branch).
+    With intern_strings, every string literal is built once, on first use,
+    and then pushed from a static of its class.
+
     """
 
     XML_CONVSERSIONS = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
 
-    def __init__(self, path):
+    # bump whenever the generated code changes, it invalidates BuildCache
+    VERSION = '1.4'
+
+    def __init__(self, path, cache=False, build=False, jobs=None,
+                 optimize=False, intern_strings=False):
         self.path = path
+        self.cache = cache
+        self.skipped = []
+        self.optimizer = Optimizer() if optimize else None
+        self.intern_strings = intern_strings
+        self.version = '{} {}'.format(self.VERSION,
+                                      [optimize, intern_strings])
 
         if os.path.isdir(path):
             fileset = self.getFileList(path)
-            for f in fileset:
-                self.compile(f)
         elif os.path.isfile(path):
-            self.compile(path)
+            fileset = [path]
         else:
             raise Exception("Unknown path {}".format(path))
 
+        if build:
+            self.build(fileset, jobs)
+        else:
+            for f in fileset:
+                self.compile(f)
+
     def compile(self, path):
+        # skip files whose source did not change since the last build
+        if self.cache:
+            build_cache = BuildCache(os.path.dirname(path))
+            key = build_cache.key([path], self.version)
+            targets = self.targets(path)
+            if all(build_cache.fresh(target, key) for target in targets):
+                self.skipped.append(path)
+                return
+
         token_file_name = self.create_token(path)
         self.compile_jack(path, token_file_name)
 
+        if self.cache:
+            for target in targets:
+                build_cache.update(target, key)
+            build_cache.save()
+
+    def build(self, fileset, jobs=None):
+        """
+        First pass: tokenize every file, write its tokens and scan its
+        signature. Second pass: compile every class against the index.
+        """
+        parallel = jobs != 1 and len(fileset) > 1
+        executor = ProcessPoolExecutor(max_workers=jobs) if parallel else None
+        try:
+            scans = self.map(executor, scan_class, [(f,) for f in fileset])
+            self.class_index = ClassIndex()
+            for _, _, _, signature in scans:
+                self.class_index.add(signature)
+
+            # a file is only fresh if no signature it may call changed
+            version = '{} {}'.format(self.version, sorted(
+                (name, sorted(signature['subroutines'].items()))
+                for name, signature in self.class_index.classes.items()))
+            pending = []
+            for path, kinds, values, _ in scans:
+                if self.cache:
+                    build_cache = BuildCache(os.path.dirname(path))
+                    key = build_cache.key([path], version)
+                    if all(build_cache.fresh(target, key)
+                           for target in self.targets(path)):
+                        self.skipped.append(path)
+                        continue
+                pending.append((path, kinds, values, self.class_index,
+                                bool(self.optimizer), self.intern_strings))
+
+            for rewritten in self.map(executor, compile_class, pending):
+                for rule, count in (rewritten or {}).items():
+                    self.optimizer.rewritten[rule] += count
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if self.cache:
+            # one read-modify-write of every .buildcache
+            caches = {}
+            for arguments in pending:
+                path = arguments[0]
+                directory = os.path.dirname(path)
+                if directory not in caches:
+                    caches[directory] = BuildCache(directory)
+                key = caches[directory].key([path], version)
+                for target in self.targets(path):
+                    caches[directory].update(target, key)
+            for build_cache in caches.values():
+                build_cache.save()
+
     def create_token(self, path):
         token_file_name = path.replace('.jack', '.token.xml')
-        token_file = open(token_file_name, 'w')
+        self.write_tokens(JackTokenizer(path), token_file_name)
+        return token_file_name
+
+    def compile_jack(self, path, token_file_name):
         tokenizer = JackTokenizer(path)
+        vm_writer = VMWriter(path)
+
+        engine = CompilationEngine(tokenizer, vm_writer,
+                                   optimizer=self.optimizer,
+                                   intern_strings=self.intern_strings,
+                                   thread_jumps=bool(self.optimizer))
+        engine.compileClass()
+
+    @classmethod
+    def write_tokens(cls, tokenizer, token_file_name):
+        token_file = open(token_file_name, 'w')
 
         token_file.write('<tokens>\n')
         while tokenizer.hasMoreTokens():
             tokenizer.advance()
-            token_file.write(self.xml_token(tokenizer.current_token))
+            token_file.write(cls.xml_token(tokenizer.current_token))
 
         token_file.write('</tokens>\n')
         token_file.close()
 
-        return token_file_name
-
-    def compile_jack(self, path, token_file_name):
-        tokenizer = JackTokenizer(path)
-        vm_writer = VMWriter(path)
-
-        engine = CompilationEngine(tokenizer, vm_writer)
-        engine.compileClass()
-
-    def xml_token(self, token):
+    @classmethod
+    def xml_token(cls, token):
         typ = token[0]
         val = token[1]
         if typ == 'string':
@@ -65,8 +164,8 @@ class JackCompiler:
             val = val[1:-1]
         if typ == 'integer':
             typ = 'integerConstant'
-        if val in self.XML_CONVSERSIONS.keys():
-            val = self.XML_CONVSERSIONS[val]
+        if val in cls.XML_CONVSERSIONS.keys():
+            val = cls.XML_CONVSERSIONS[val]
         return '<{typ}> {val} </{typ}>\n'.format(typ=typ, val=val)
 
     def getFileList(self, path):
@@ -76,3 +175,45 @@ class JackCompiler:
                 fileset.append(i)
         filelist = [os.path.join(path, i) for i in fileset]
         return filelist
+
+    # Non API
+    def targets(self, path):
+        return [
+            path.replace('.jack', '.token.xml'),
+            path.replace('.jack', '.vm1')
+        ]
+
+    def map(self, executor, function, arguments):
+        " Results in the order of arguments, in a pool when given one. "
+        if executor is None:
+            return [function(*argument) for argument in arguments]
+        futures = [executor.submit(function, *argument)
+                   for argument in arguments]
+        return [future.result() for future in futures]
+
+
+def scan_class(path):
+    """
+    First pass of a build, for one file: tokenize it once, write its
+    .token.xml and return (path, kinds, values, signature).
+    """
+    tokenizer = JackTokenizer(path)
+    JackCompiler.write_tokens(
+        JackTokenizer.fromTokens(tokenizer.kinds, tokenizer.values),
+        path.replace('.jack', '.token.xml'))
+    return (path, tokenizer.kinds.tobytes(), tokenizer.values,
+            ClassIndex.scan(tokenizer.values))
+
+
+def compile_class(path, kinds, values, class_index, optimize=False,
+                  intern_strings=False):
+    """
+    Second pass of a build: compile the tokens of one file to .vm1.
+    Returns the rewrites of its Optimizer, None without one.
+    """
+    tokenizer = JackTokenizer.fromTokens(kinds, values)
+    optimizer = Optimizer() if optimize else None
+    engine = CompilationEngine(tokenizer, VMWriter(path), class_index,
+                               optimizer, intern_strings, optimize)
+    engine.compileClass()
+    return optimizer.rewritten if optimizer else None
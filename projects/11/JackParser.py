@@ -0,0 +1,275 @@
+"""
+Jack Grammar, parsed by recursive descent with at most two tokens of
+lookahead into the nodes of JackAST
+
+- class: 'class' className '{' classVarDec* subroutineDec* '}'
+- subroutineDec: ('constructor' | 'function' | 'method') ('void' | type)
+  subroutineName '(' parameterList ')' '{' varDec* statements '}'
+- statements: (letStatement | ifStatement | whileStatement | doStatement |
+  returnStatement)*
+- expression: term (op term)*
+- term: integerConstant | stringConstant | keywordConstant | varName |
+  varName '[' expression ']' | subroutineCall | '(' expression ')' |
+  unaryOp term
+
+"""
+
+from JackTokenizer import TokenKinds
+from JackAST import (
+    Class, ClassVarDec, Subroutine, VarDec, Let, If, While, Do, Return,
+    IntegerConstant, StringConstant, KeywordConstant, Variable, ArrayElement,
+    Call, Parenthesized, Unary, Binary)
+
+
+class JackParser:
+    " Parses the tokens of a JackTokenizer into the AST of one class. "
+
+    def __init__(self, tokenizer):
+        # an indexed cursor over the tokens the tokenizer scanned, any
+        # lookahead is a constant-time read, nothing is ever put back
+        self.kinds = tokenizer.kinds
+        self.values = tokenizer.values
+        self.position = tokenizer.position + 1
+
+    # class className '{' classVarDec*, subroutineDec* '}'
+    def parseClass(self):
+        self.expect('class')
+        name = self.get_token()
+        self.expect('{')
+
+        class_var_decs = []
+        while self.peek() in ['static', 'field']:
+            class_var_decs.append(self.parseClassVarDec())
+
+        subroutines = []
+        while self.peek() in ['constructor', 'function', 'method']:
+            subroutines.append(self.parseSubroutine())
+
+        self.expect('}')
+        return Class(name, class_var_decs, subroutines)
+
+    # ('static' | 'field') type varName(',' varName)* ';'
+    def parseClassVarDec(self):
+        kind = self.get_token()
+        type = self.get_token()
+        return ClassVarDec(kind, type, self.parse_names())
+
+    # ('constructor' | 'function' | 'method') ('void' | type) subroutineName
+    # '(' parameterList ')' '{' varDec* statements '}'
+    def parseSubroutine(self):
+        kind = self.get_token()
+        type = self.get_token()
+        name = self.get_token()
+
+        self.expect('(')
+        parameters = self.parseParameterList()
+        self.expect(')')
+        self.expect('{')
+
+        var_decs = []
+        while self.peek() == 'var':
+            var_decs.append(self.parseVarDec())
+        statements = self.parseStatements()
+
+        self.expect('}')
+        return Subroutine(kind, type, name, parameters, var_decs, statements)
+
+    # ((type varName) (',' type varName)*)?
+    def parseParameterList(self):
+        parameters = []
+        if self.peek() != ')':
+            parameters.append((self.get_token(), self.get_token()))
+
+        while self.peek() != ')':
+            self.expect(',')
+            parameters.append((self.get_token(), self.get_token()))
+        return parameters
+
+    # 'var' type varName (',' varName)* ';'
+    def parseVarDec(self):
+        self.expect('var')
+        type = self.get_token()
+        return VarDec(type, self.parse_names())
+
+    # (letStatement | ifStatement | whileStatement | doStatement |
+    # returnStatement)*
+    def parseStatements(self):
+        statements = []
+        while True:
+            token = self.peek()
+            if token == 'let':
+                statements.append(self.parseLet())
+            elif token == 'if':
+                statements.append(self.parseIf())
+            elif token == 'while':
+                statements.append(self.parseWhile())
+            elif token == 'do':
+                statements.append(self.parseDo())
+            elif token == 'return':
+                statements.append(self.parseReturn())
+            else:
+                return statements
+
+    # 'let' varName ('[' expression ']')? '=' expression ';'
+    def parseLet(self):
+        self.expect('let')
+        name = self.get_token()
+
+        index = None
+        if self.peek() == '[':
+            self.get_token()
+            index = self.parseExpression()
+            self.expect(']')
+
+        self.expect('=')
+        value = self.parseExpression()
+        self.expect(';')
+        return Let(name, index, value)
+
+    # 'if' '(' expression ')' '{' statements '}' ('else' '{' statements '}')?
+    def parseIf(self):
+        self.expect('if')
+        condition = self.parse_condition()
+        statements = self.parse_block()
+
+        else_statements = None
+        if self.peek() == 'else':
+            self.get_token()
+            else_statements = self.parse_block()
+        return If(condition, statements, else_statements)
+
+    # 'while' '(' expression ')' '{' statements '}'
+    def parseWhile(self):
+        self.expect('while')
+        condition = self.parse_condition()
+        return While(condition, self.parse_block())
+
+    # 'do' subroutineCall ';'
+    def parseDo(self):
+        self.expect('do')
+        call = self.parse_subroutine_call()
+        self.expect(';')
+        return Do(call)
+
+    # 'return' expression? ';'
+    def parseReturn(self):
+        self.expect('return')
+        value = None
+        if self.peek() != ';':
+            value = self.parseExpression()
+        self.expect(';')
+        return Return(value)
+
+    # term (op term)*
+    def parseExpression(self):
+        expression = self.parseTerm()
+        while self.peek() in ['+', '-', '*', '/', '&', '|', '<', '>', '=']:
+            op = self.get_token()
+            expression = Binary(op, expression, self.parseTerm())
+        return expression
+
+    # integerConstant | stringConstant | keywordConstant | varName |
+    # varName '[' expression ']' | subroutineCall | '(' expression ')' |
+    # unaryOp term
+    def parseTerm(self):
+        kind = self.kinds[self.position]
+        token = self.peek()
+
+        if token in ['-', '~']:
+            self.get_token()
+            return Unary(token, self.parseTerm())
+
+        elif token == '(':
+            self.get_token()
+            expression = self.parseExpression()
+            self.expect(')')
+            return Parenthesized(expression)
+
+        elif kind == TokenKinds.INTEGER:
+            return IntegerConstant(int(self.get_token()))
+
+        elif kind == TokenKinds.STRING:
+            return StringConstant(self.get_token()[1:-1])
+
+        # true、false、null、this
+        elif kind == TokenKinds.KEYWORD:
+            return KeywordConstant(self.get_token())
+
+        elif self.peek(2) == '[':
+            name = self.get_token()
+            self.get_token()
+            index = self.parseExpression()
+            self.expect(']')
+            return ArrayElement(name, index)
+
+        elif self.peek(2) in ['.', '(']:
+            return self.parse_subroutine_call()
+
+        return Variable(self.get_token())
+
+    # (expression (',' expression)*)?
+    def parseExpressionList(self):
+        expressions = []
+        if self.peek() != ')':
+            expressions.append(self.parseExpression())
+
+        while self.peek() != ')':
+            self.expect(',')
+            expressions.append(self.parseExpression())
+        return expressions
+
+    # Non API
+    # subroutineName '(' expressionList ')' |
+    # (className | varName) '.' subroutineName '(' expressionList ')'
+    def parse_subroutine_call(self):
+        target = None
+        name = self.get_token()
+        if self.peek() == '.':
+            self.get_token()
+            target, name = name, self.get_token()
+
+        self.expect('(')
+        arguments = self.parseExpressionList()
+        self.expect(')')
+        return Call(target, name, arguments)
+
+    # '(' expression ')'
+    def parse_condition(self):
+        self.expect('(')
+        condition = self.parseExpression()
+        self.expect(')')
+        return condition
+
+    # '{' statements '}'
+    def parse_block(self):
+        self.expect('{')
+        statements = self.parseStatements()
+        self.expect('}')
+        return statements
+
+    # varName (',' varName)* ';'
+    def parse_names(self):
+        names = [self.get_token()]
+        while self.peek() != ';':
+            self.expect(',')
+            names.append(self.get_token())
+        self.get_token()
+        return names
+
+    def peek(self, k=1):
+        " The k-th token from the cursor on, None past the end. "
+        position = self.position + k - 1
+        if position < len(self.values):
+            return self.values[position]
+        return None
+
+    def get_token(self):
+        token = self.values[self.position]
+        self.position += 1
+        return token
+
+    def expect(self, token):
+        if self.peek() != token:
+            raise Exception("Expected {} but got {}".format(
+                token, self.peek()))
+        self.position += 1
@@ -18,46 +18,94 @@ Jack Syntactic Elements
 """
 
 import re
+import sys
+from array import array
+
+
+class TokenKinds(dict):
+    " Token text -> kind, classified the first time the text is seen. "
+
+    TOKEN_TYPES = ['keyword', 'symbol', 'integer', 'string', 'identifier']
+    KEYWORD, SYMBOL, INTEGER, STRING, IDENTIFIER = range(5)
+    KEYWORDS = frozenset([
+        'class', 'constructor', 'method', 'function', 'int', 'boolean',
+        'char', 'void', 'var', 'static', 'field', 'let', 'do', 'if', 'else',
+        'while', 'return', 'true', 'false', 'null', 'this'
+    ])
+
+    def __missing__(self, text):
+        first = text[0]
+        if first.isdigit():
+            kind = self.INTEGER
+        elif first == '"':
+            kind = self.STRING
+        elif first.isalpha() or first == '_':
+            kind = self.KEYWORD if text in self.KEYWORDS else self.IDENTIFIER
+        else:
+            kind = self.SYMBOL
+        self[text] = kind
+        return kind
+
+
+# shared by every tokenizer, Jack programs reuse the same names a lot
+TOKEN_KINDS = TokenKinds()
 
 
 class JackTokenizer:
     " Reference: https://docs.python.org/3/library/re.html#writing-a-tokenizer "
 
+    # kind, the small int stored in self.kinds -> token type
+    TOKEN_TYPES = TokenKinds.TOKEN_TYPES
+
+    # keywords are told from identifiers once the whole word is matched,
+    # so an identifier like `double` or `iffy` stays one token
     token_specification = [
         ('integer', r'\d+'),
-        ('string', r'\"([^"]*)\"'),
+        ('string', r'\"[^"]*\"'),
         ('symbol', r'[+\-*\/\&\|\~\<\>\=\(\)\{\}\[\]\.\,\;]'),
-        ('keyword',
-         r'(class|constructor|method|function|int|boolean|char|void|var|static|field|let|do|if|else|while|return|true|false|null|this)'
-         ),
         ('identifier', r'[A-Za-z_][A-Za-z_0-9]*'),
     ]
     INLINE_COMMENT_REGEX = re.compile(r'//.*\n')
     MULTILINE_COMMENT_REGEX = re.compile(r'/\*.*?\*/', flags=re.S)
     XML_CONVSERSIONS = {'<': '&lt;', '>': '&gt;', '&': '&amp;'}
 
-    tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
+    # no capturing groups: findall returns the text of every token
+    tok_regex = '|'.join(pattern for _, pattern in token_specification)
     get_token = re.compile(tok_regex)
 
     def __init__(self, input_file):
-        token_file = open(input_file, 'r')
-
-        self.input = token_file.read()
-        self.tokenizer = self.tokenize()
-
-        # IO handle
-        token_file.close()
+        with open(input_file, 'r') as token_file:
+            self.input = token_file.read()
+
+        # the whole file is scanned once into two parallel arrays, the
+        # kind of every token and its interned text
+        self.kinds = array('B')
+        self.values = []
+        self.scan()
+        self.position = -1
+
+    @classmethod
+    def fromTokens(cls, kinds, values):
+        " A tokenizer over tokens scanned earlier, e.g. in another process. "
+        tokenizer = cls.__new__(cls)
+        tokenizer.kinds = array('B', kinds)
+        tokenizer.values = list(values)
+        tokenizer.position = -1
+        return tokenizer
 
     def hasMoreTokens(self):
-        try:
-            self.next_token = next(self.tokenizer)
-            return True
-        except:
-            return False
+        return self.position + 1 < len(self.kinds)
 
     def advance(self):
-        self.current_token = (self.next_token.lastgroup,
-                              self.next_token.group())
+        self.position = position = self.position + 1
+        self.current_token = (self.TOKEN_TYPES[self.kinds[position]],
+                              self.values[position])
+
+    def peek(self, k=1):
+        " The token k positions after the current one, None past the end. "
+        if self.position + k < len(self.kinds):
+            return self.token(self.position + k)
+        return None
 
     def tokenType(self):
         return self.current_token[0]
@@ -78,10 +126,14 @@ class JackTokenizer:
         return self.current_token[1][1:-1]
 
     # Non API
-    def tokenize(self):
-        format_lines = self.format_lines()
-        tokens = self.get_token.finditer(format_lines)
-        return tokens
+    def scan(self):
+        " Both arrays are built by C loops, kinds come from TokenKinds. "
+        self.values.extend(
+            map(sys.intern, self.get_token.findall(self.format_lines())))
+        self.kinds.extend(map(TOKEN_KINDS.__getitem__, self.values))
+
+    def token(self, position):
+        return self.TOKEN_TYPES[self.kinds[position]], self.values[position]
 
     def format_lines(self):
         without_multiline = re.sub(self.MULTILINE_COMMENT_REGEX, ' ',
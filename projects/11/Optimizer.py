@@ -0,0 +1,197 @@
+"""
+Optimizer: rewrite the expressions of a class AST before code generation
+
+Rules:
+    - constant folding: an operator on constants becomes the constant it
+      computes, with the 16-bit arithmetic of the Hack machine, the
+      comparisons of the VM and the divisions Math.divide gets right
+    - strength reduction: x * c with a constant c that is a power of two
+      or below SMALL_FACTOR becomes a ShiftAdd, doubling and adding on
+      the stack instead of a call to Math.multiply
+    - double negation: -(-x) and ~(~x) become x
+
+Parentheses are dropped on the way, they only ever grouped the terms.
+Nothing that can have a side effect is removed or evaluated in another
+order: only constants, which have none, are moved.
+
+"""
+
+from JackAST import (
+    Let, If, While, Do, Return, IntegerConstant, KeywordConstant,
+    ArrayElement, Call, Parenthesized, Unary, Binary, ShiftAdd)
+
+
+def less(x, y):
+    " x < y the way the VM computes lt, from the sign of the word x - y "
+    return (x - y) & 0x8000 != 0
+
+
+def greater(x, y):
+    " x > y the way the VM computes gt, from the sign of the word x - y "
+    difference = (x - y) & 0xFFFF
+    return difference != 0 and not difference & 0x8000
+
+
+class Optimizer:
+    " Rewrites class ASTs in place and counts the rewrites of every rule. "
+
+    RULES = ['constant folding', 'strength reduction', 'double negation']
+
+    # x * c is a ShiftAdd below this, or for any power of two
+    SMALL_FACTOR = 256
+
+    # Math.divide of projects/12 doubles y until it passes x, from this
+    # dividend on y + y can overflow first and the quotient is wrong, e.g.
+    # 32767 / 3 is 54613 at run time
+    EXACT_DIVIDEND = 21846
+
+    TRUE = 0xFFFF
+    FALSE = 0
+
+    # op -> function of two words, None when it cannot be folded
+    FOLD = {
+        '+': lambda x, y: (x + y) & 0xFFFF,
+        '-': lambda x, y: (x - y) & 0xFFFF,
+        '*': lambda x, y: (x * y) & 0xFFFF,
+        # only where truncating and flooring agree, y is not 0 and the
+        # Math.divide the program runs with computes x // y as well
+        '/': lambda x, y: (x // y if x < Optimizer.EXACT_DIVIDEND
+                           and 0 < y < 0x8000 else None),
+        '&': lambda x, y: x & y,
+        '|': lambda x, y: x | y,
+        # not the signed comparison: where x - y overflows, the code the
+        # comparison compiles to gives the opposite result
+        '<': lambda x, y: Optimizer.boolean(less(x, y)),
+        '>': lambda x, y: Optimizer.boolean(greater(x, y)),
+        '=': lambda x, y: Optimizer.boolean(x == y),
+    }
+
+    FOLD_UNARY = {
+        '-': lambda x: -x & 0xFFFF,
+        '~': lambda x: ~x & 0xFFFF,
+    }
+
+    KEYWORD_CONSTANTS = {'true': TRUE, 'false': FALSE, 'null': FALSE}
+
+    def __init__(self):
+        self.rewritten = dict((name, 0) for name in self.RULES)
+
+    def optimizeClass(self, tree):
+        for subroutine in tree.subroutines:
+            self.optimizeStatements(subroutine.statements)
+        return tree
+
+    def optimizeStatements(self, statements):
+        for statement in statements:
+            if isinstance(statement, Let):
+                if statement.index is not None:
+                    statement.index = self.optimizeExpression(statement.index)
+                statement.value = self.optimizeExpression(statement.value)
+            elif isinstance(statement, If):
+                statement.condition = self.optimizeExpression(
+                    statement.condition)
+                self.optimizeStatements(statement.statements)
+                if statement.elseStatements is not None:
+                    self.optimizeStatements(statement.elseStatements)
+            elif isinstance(statement, While):
+                statement.condition = self.optimizeExpression(
+                    statement.condition)
+                self.optimizeStatements(statement.statements)
+            elif isinstance(statement, Do):
+                self.optimizeExpression(statement.call)
+            elif isinstance(statement, Return):
+                if statement.value is not None:
+                    statement.value = self.optimizeExpression(statement.value)
+
+    def optimizeExpression(self, node):
+        " The optimized node, node itself when nothing applies. "
+        if isinstance(node, Parenthesized):
+            return self.optimizeExpression(node.expression)
+
+        if isinstance(node, Call):
+            node.arguments = [self.optimizeExpression(argument)
+                              for argument in node.arguments]
+        elif isinstance(node, ArrayElement):
+            node.index = self.optimizeExpression(node.index)
+        elif isinstance(node, Unary):
+            return self.optimize_unary(node)
+        elif isinstance(node, Binary):
+            return self.optimize_binary(node)
+        return node
+
+    def report(self):
+        return '\n'.join('{:<20} {:>7}'.format(name, count)
+                         for name, count in self.rewritten.items())
+
+    # Non API
+    @staticmethod
+    def boolean(condition):
+        return Optimizer.TRUE if condition else Optimizer.FALSE
+
+    def optimize_unary(self, node):
+        operand = self.optimizeExpression(node.operand)
+        if isinstance(operand, Unary) and operand.op == node.op:
+            self.rewritten['double negation'] += 1
+            return operand.operand
+
+        node.operand = operand
+        value = self.value(operand)
+        if value is not None:
+            return self.fold(node, self.FOLD_UNARY[node.op](value))
+        return node
+
+    def optimize_binary(self, node):
+        node.left = left = self.optimizeExpression(node.left)
+        node.right = right = self.optimizeExpression(node.right)
+        left_value = self.value(left)
+        right_value = self.value(right)
+
+        if left_value is not None and right_value is not None:
+            return self.fold(node, self.FOLD[node.op](left_value,
+                                                      right_value))
+        if node.op == '*' and right_value is not None:
+            return self.multiply(node, left, right_value)
+        if node.op == '*' and left_value is not None:
+            return self.multiply(node, right, left_value)
+        return node
+
+    def multiply(self, node, operand, factor):
+        """
+        operand * factor: a ShiftAdd, negated for a negative factor, or
+        node as it is when the factor is too large.
+        """
+        negative = factor >= 0x8000 and factor != 0x8000
+        magnitude = -factor & 0xFFFF if negative else factor
+        power_of_two = magnitude & (magnitude - 1) == 0
+        if magnitude == 0 or not (power_of_two
+                                  or magnitude < self.SMALL_FACTOR):
+            return node
+
+        self.rewritten['strength reduction'] += 1
+        product = operand if magnitude == 1 else ShiftAdd(operand, magnitude)
+        return Unary('-', product) if negative else product
+
+    def fold(self, node, word):
+        " The constant for word, node when word has none. "
+        if word is None or word == 0x8000:
+            # -32768 cannot be written as a Jack constant
+            return node
+        if word < 0x8000:
+            constant = IntegerConstant(word)
+        else:
+            constant = Unary('-', IntegerConstant(-word & 0xFFFF))
+        if constant != node:
+            self.rewritten['constant folding'] += 1
+        return constant
+
+    def value(self, node):
+        " The word a constant expression evaluates to, None otherwise. "
+        if isinstance(node, IntegerConstant):
+            return node.value & 0xFFFF
+        if isinstance(node, KeywordConstant):
+            return self.KEYWORD_CONSTANTS.get(node.value)
+        if isinstance(node, Unary) and node.op in self.FOLD_UNARY:
+            value = self.value(node.operand)
+            if value is not None:
+                return self.FOLD_UNARY[node.op](value)
+        return None
@@ -1,7 +1,30 @@
-import sys
+import argparse
 from JackCompiler import JackCompiler
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Compile a .jack file or a directory of them to VM code.')
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--cache', action='store_true',
+                            help='skip files that did not change')
+    arg_parser.add_argument('--build', action='store_true',
+                            help='tokenize once, index every class, then '
+                                 'compile in parallel checking every call')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None,
+                            help='worker processes of --build '
+                                 '(default: all cores)')
+    arg_parser.add_argument('-O', '--optimize', action='store_true',
+                            help='fold constants, reduce multiplications '
+                                 'by constants and double negations, '
+                                 'branch on conditions directly')
+    arg_parser.add_argument('--intern-strings', action='store_true',
+                            help='build every string literal once and '
+                                 'keep it in a static')
+    args = arg_parser.parse_args()
+
     print(' Analyzing ... ')
-    filename = sys.argv[1]
-    JackCompiler(filename)
+    compiler = JackCompiler(args.path, cache=args.cache, build=args.build,
+                            jobs=args.jobs, optimize=args.optimize,
+                            intern_strings=args.intern_strings)
+    if args.optimize:
+        print(compiler.optimizer.report())
@@ -0,0 +1,122 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, '08'))
+
+from interpreter import VMInterpreter
+from JackCompiler import JackCompiler
+
+SYS = 'class Sys { function void init() { do Main.main(); return; } }\n'
+
+# Main.log(x) appends x to the words from LOG on
+LOG = 8000
+MAIN = """
+class Main {
+    static int logged;
+
+    function void log(int x) {
+        do Memory.poke(%d + logged, x);
+        let logged = logged + 1;
+        return;
+    }
+
+    %s
+}
+""" % (LOG, '%s')
+
+
+def run(body, optimize=False):
+    """
+    Compile the subroutines body of class Main, with a Sys.init that calls
+    Main.main, and run them in the VM interpreter over the native OS.
+    Returns (the words Main.log appended, VM commands executed).
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, 'Main.jack'), 'w') as f:
+            f.write(MAIN % body)
+        with open(os.path.join(directory, 'Sys.jack'), 'w') as f:
+            f.write(SYS)
+        JackCompiler(directory, optimize=optimize)
+        for name in os.listdir(directory):
+            if name.endswith('.vm1'):
+                os.rename(os.path.join(directory, name),
+                          os.path.join(directory, name[:-1]))
+        interpreter = VMInterpreter(directory, native=True)
+        interpreter.run(1000000)
+        if not interpreter.halted:
+            raise Exception("Main.main did not return")
+        logged = interpreter.ram[interpreter.STATIC_BASE]
+        return list(interpreter.ram[LOG:LOG + logged]), interpreter.time
+    finally:
+        shutil.rmtree(directory)
+
+
+class BranchTest(unittest.TestCase):
+    " With -O if and while jump on the condition, see compile_branch. "
+
+    BRANCHES = """
+    function boolean odd(int x) {
+        return (x & 1) = 1;
+    }
+
+    function void main() {
+        var int i, n;
+        var boolean done;
+        while (i < 8) {
+            if (Main.odd(i)) { do Main.log(1); }
+            if (~(i > 5)) { do Main.log(2); } else { do Main.log(3); }
+            if (~Main.odd(i) & (i < 4)) { do Main.log(4); }
+            if ((i = 2) | ~(i < 7)) { do Main.log(5); }
+            let i = i + 1;
+        }
+        while (~done) {
+            do Main.log(6);
+            let done = true;
+        }
+        while (false) { do Main.log(7); }
+        if (true) { do Main.log(8); }
+        if (~false) { do Main.log(9); } else { do Main.log(10); }
+        // conditions that are neither true nor false: while stops when
+        // ~n is not 0, if runs when the condition is not 0
+        let n = -1;
+        while (n) {
+            do Main.log(16);
+            let n = n - 1;
+        }
+        if (i) { do Main.log(11); }
+        if (~i) { do Main.log(12); }
+        if (~(i - 8)) { do Main.log(13); }
+        if (~(i - 9) & 1) { do Main.log(14); } else { do Main.log(15); }
+        return;
+    }
+    """
+
+    def test_same_branches(self):
+        plain, plain_time = run(self.BRANCHES)
+        threaded, threaded_time = run(self.BRANCHES, optimize=True)
+        self.assertEqual(threaded, plain)
+        self.assertLess(threaded_time, plain_time)
+
+    def test_branches(self):
+        log, _ = run(self.BRANCHES, optimize=True)
+        expected = []
+        for i in range(8):
+            if i & 1:
+                expected.append(1)
+            expected.append(2 if not i > 5 else 3)
+            if not i & 1 and i < 4:
+                expected.append(4)
+            if i == 2 or not i < 7:
+                expected.append(5)
+        # i is 8: ~(i - 8) is -1, ~(i - 9) is 0
+        expected += [6, 8, 9, 16, 11, 12, 13, 15]
+        self.assertEqual(log, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, '08'))
+
+from JackAST import (
+    IntegerConstant, KeywordConstant, Variable, Parenthesized, Unary, Binary,
+    ShiftAdd)
+from Optimizer import Optimizer
+from native import math_divide
+from test_compiler import run
+
+
+def constant(value):
+    if value < 0:
+        return Unary('-', IntegerConstant(-value))
+    return IntegerConstant(value)
+
+
+TRUE = Unary('-', IntegerConstant(1))
+FALSE = IntegerConstant(0)
+X = Variable('x')
+
+
+class ComparisonFoldingTest(unittest.TestCase):
+    " < and > fold to what the VM computes, the sign of the word x - y. "
+
+    def fold(self, x, op, y):
+        return Optimizer().optimizeExpression(
+            Binary(op, constant(x), constant(y)))
+
+    def test_less_where_the_difference_overflows(self):
+        # -32767 - 2 wraps to 32767, lt is false
+        self.assertEqual(self.fold(-32767, '<', 2), FALSE)
+        # 20000 - -20000 wraps to -25536, lt is true
+        self.assertEqual(self.fold(20000, '<', -20000), TRUE)
+
+    def test_greater_where_the_difference_overflows(self):
+        self.assertEqual(self.fold(2, '>', -32767), FALSE)
+        self.assertEqual(self.fold(-20000, '>', 20000), TRUE)
+        # 32767 - -1 wraps to -32768, gt is false
+        self.assertEqual(self.fold(32767, '>', -1), FALSE)
+
+    def test_without_overflow(self):
+        self.assertEqual(self.fold(-3, '<', 2), TRUE)
+        self.assertEqual(self.fold(2, '<', -3), FALSE)
+        self.assertEqual(self.fold(5, '>', 5), FALSE)
+        self.assertEqual(self.fold(5, '<', 5), FALSE)
+
+    def test_keyword_constants(self):
+        node = Binary('<', KeywordConstant('true'), IntegerConstant(0))
+        self.assertEqual(Optimizer().optimizeExpression(node), TRUE)
+
+
+class DivisionFoldingTest(unittest.TestCase):
+    " x / y folds only where Math.divide of projects/12 computes x // y. "
+
+    def fold(self, x, y):
+        return Optimizer().optimizeExpression(
+            Binary('/', constant(x), constant(y)))
+
+    def test_folded(self):
+        self.assertEqual(self.fold(1000, 7), IntegerConstant(142))
+        self.assertEqual(self.fold(21845, 3), IntegerConstant(7281))
+        self.assertEqual(self.fold(5, 9), IntegerConstant(0))
+
+    def test_not_folded(self):
+        # Math.divide returns 54613, 42130 and 4
+        for x, y in [(32767, 3), (32767, 7), (21846, 21845)]:
+            self.assertTrue(isinstance(self.fold(x, y), Binary))
+        # by 0, and negative operands
+        for x, y in [(7, 0), (-7, 2), (7, -2)]:
+            self.assertTrue(isinstance(self.fold(x, y), Binary))
+
+    def test_bound(self):
+        # the largest dividend folded, every smaller one is exact as well
+        # but checking them all takes minutes
+        x = Optimizer.EXACT_DIVIDEND - 1
+        for y in range(1, x + 1):
+            self.assertEqual(math_divide(None, x, y), x // y)
+        x = Optimizer.EXACT_DIVIDEND
+        self.assertNotEqual(math_divide(None, x, x - 1), x // (x - 1))
+
+
+class ConstantFoldingTest(unittest.TestCase):
+
+    def test_folded(self):
+        optimizer = Optimizer()
+        node = Binary('*', Parenthesized(Binary('+', constant(2),
+                                                constant(3))),
+                      constant(-4))
+        self.assertEqual(optimizer.optimizeExpression(node), constant(-20))
+        self.assertEqual(optimizer.rewritten['constant folding'], 2)
+
+    def test_wraps_around(self):
+        node = Binary('+', constant(32767), constant(32767))
+        self.assertEqual(Optimizer().optimizeExpression(node), constant(-2))
+
+    def test_minus_32768_is_not_folded(self):
+        # -32768 cannot be written as a Jack constant
+        for node in [Binary('-', constant(-16384), constant(16384)),
+                     Binary('+', constant(16384), constant(16384)),
+                     Binary('-', constant(-32767), constant(1))]:
+            optimizer = Optimizer()
+            self.assertTrue(optimizer.optimizeExpression(node) is node)
+            self.assertEqual(optimizer.rewritten['constant folding'], 0)
+
+
+class StrengthReductionTest(unittest.TestCase):
+
+    def multiply(self, left, right):
+        optimizer = Optimizer()
+        node = Binary('*', left, right)
+        result = optimizer.optimizeExpression(node)
+        return result, optimizer.rewritten['strength reduction']
+
+    def test_small_factor(self):
+        self.assertEqual(self.multiply(X, constant(10)),
+                         (ShiftAdd(X, 10), 1))
+        self.assertEqual(self.multiply(constant(10), X),
+                         (ShiftAdd(X, 10), 1))
+
+    def test_power_of_two(self):
+        self.assertEqual(self.multiply(X, constant(4096)),
+                         (ShiftAdd(X, 4096), 1))
+
+    def test_large_factor(self):
+        node, count = self.multiply(X, constant(1000))
+        self.assertEqual(node, Binary('*', X, constant(1000)))
+        self.assertEqual(count, 0)
+
+    def test_negative_factor(self):
+        self.assertEqual(self.multiply(X, constant(-10)),
+                         (Unary('-', ShiftAdd(X, 10)), 1))
+        self.assertEqual(self.multiply(constant(-4096), X),
+                         (Unary('-', ShiftAdd(X, 4096)), 1))
+
+    def test_magnitude_one(self):
+        self.assertEqual(self.multiply(X, constant(1)), (X, 1))
+        self.assertEqual(self.multiply(constant(-1), X),
+                         (Unary('-', X), 1))
+
+    def test_factor_zero(self):
+        # x may be a call, it is still evaluated
+        node, count = self.multiply(X, constant(0))
+        self.assertEqual(node, Binary('*', X, constant(0)))
+        self.assertEqual(count, 0)
+
+
+class DoubleNegationTest(unittest.TestCase):
+
+    def test_removed(self):
+        for op in ['-', '~']:
+            optimizer = Optimizer()
+            node = Unary(op, Parenthesized(Unary(op, X)))
+            self.assertEqual(optimizer.optimizeExpression(node), X)
+            self.assertEqual(optimizer.rewritten['double negation'], 1)
+
+    def test_mixed_kept(self):
+        node = Unary('-', Unary('~', X))
+        self.assertEqual(Optimizer().optimizeExpression(node),
+                         Unary('-', Unary('~', X)))
+
+
+class EquivalenceTest(unittest.TestCase):
+    """
+    Random expressions over variables, constants and calls with a side
+    effect log the same values, in the same order, with and without -O.
+    """
+
+    CONSTANTS = [0, 1, 2, 3, 5, 7, 8, 10, 16, 255, 256, 1000, 16384,
+                 21845, 21846, 32767]
+    EXPRESSIONS = 150
+
+    def setUp(self):
+        self.random = random.Random(1)
+
+    def term(self, depth):
+        choice = self.random.random()
+        if depth > 3 or choice < 0.3:
+            return self.random.choice(
+                ['a', 'b', 'c', 'true', 'false', 'null']
+                + [str(c) for c in self.CONSTANTS])
+        if choice < 0.45:
+            return self.random.choice(['-', '~']) + self.term(depth + 1)
+        if choice < 0.55:
+            return 'Main.f({})'.format(self.expression(depth + 1))
+        return '({})'.format(self.expression(depth + 1))
+
+    def expression(self, depth=0):
+        expression = self.term(depth)
+        for _ in range(self.random.randrange(3)):
+            op = self.random.choice('+-*/&|<>=***')
+            if op == '/':
+                # Math.divide never returns for -32768 or by 0
+                expression = '(({}) & 32767) / ({} | 1)'.format(
+                    expression, self.term(depth))
+            else:
+                expression += ' {} {}'.format(op, self.term(depth))
+        return expression
+
+    def test_same_values(self):
+        body = """
+    function int f(int x) {
+        do Main.log(x);
+        return x + 1;
+    }
+
+    function void main() {
+        var int a, b, c;
+        let a = -12345;
+        let b = 217;
+        let c = 30000;
+"""
+        for _ in range(self.EXPRESSIONS):
+            body += '        do Main.log({});\n'.format(self.expression())
+        body += """        do Main.log(32767 / 3);
+        do Main.log(21845 / 3);
+        do Main.log(a * -10);
+        do Main.log(-(-a));
+        do Main.log(~(~b));
+        return;
+    }
+"""
+        plain, _ = run(body)
+        optimized, _ = run(body, optimize=True)
+        self.assertEqual(optimized, plain)
+        self.assertEqual(plain[-5:], [54613, 7281, 57914, 53191, 217])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECTS = os.path.join(HERE, os.pardir)
+
+# modules several projects keep a copy of, every project runs on its own,
+# so a fix to one copy has to be made to the others as well
+SHARED = {
+    'JackAST.py': ['10', '11'],
+    'JackParser.py': ['10', '11'],
+    'BuildCache.py': ['06', '08', '11'],
+}
+
+
+class SharedCopiesTest(unittest.TestCase):
+
+    def read(self, project, name):
+        with open(os.path.join(PROJECTS, project, name), 'rb') as f:
+            return f.read()
+
+    def test_copies_are_identical(self):
+        for name, projects in sorted(SHARED.items()):
+            first = self.read(projects[0], name)
+            for project in projects[1:]:
+                self.assertTrue(
+                    self.read(project, name) == first,
+                    "projects/{0}/{2} and projects/{1}/{2} differ".format(
+                        projects[0], project, name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,291 @@
+"""
+Benchmark: measure the toolchain and the code it generates on fixed programs
+
+Programs:
+    - 11/Pong, 11/Square, 11/ComplexArrays, 11/Seven and 11/ConvertToBin,
+      linked with the projects/12 OS VM code (or the VM code of another
+      OS directory), and the projects/12 OS sources themselves
+    - 08/FunctionCalls programs, translated and run from their VM code
+
+Stages, each in a fresh copy of the program outside the tree:
+    - tokenize: JackTokenizer over every .jack file
+    - compile: JackCompiler on the directory, with its Optimizer when
+      asked to, to compare the code and cycles of both
+    - translate: Translator on the directory, with the OS VM code added
+    - assemble: Assembler on the translated program
+    - emulate: run it for at most a fixed number of cycles, no key pressed
+
+Measurements:
+    - seconds: the fastest of repeat runs of the stage
+    - peak_bytes: peak Python memory of one more run, under tracemalloc
+    - tokens, words, cycles: the size of what the stage produced, the
+      cycles of the emulated program (until it halts or the budget ends)
+
+Results are written as JSON, and compared with an earlier run: any
+measurement more than threshold percent above its baseline is a regression.
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import tracemalloc
+
+PROJECTS = os.path.dirname(os.path.abspath(__file__))
+for project in ['06', '08', '11']:
+    sys.path.insert(0, os.path.join(PROJECTS, project))
+
+from assembler import Assembler
+from emulator import JITEmulator
+from vm import Translator
+from JackTokenizer import JackTokenizer
+from JackCompiler import JackCompiler
+
+STAGES = ['tokenize', 'compile', 'translate', 'assemble', 'emulate']
+VM_STAGES = ['translate', 'assemble', 'emulate']
+# name -> (directory under projects, stages), Jack programs start with
+# tokenize, the OS alone has no Main to run
+PROGRAMS = {
+    'Pong': ('11/Pong', STAGES),
+    'Square': ('11/Square', STAGES),
+    'ComplexArrays': ('11/ComplexArrays', STAGES),
+    'Seven': ('11/Seven', STAGES),
+    'ConvertToBin': ('11/ConvertToBin', STAGES),
+    'OS': ('12', ['tokenize', 'compile']),
+    'FibonacciElement': ('08/FunctionCalls/FibonacciElement', VM_STAGES),
+    'NestedCall': ('08/FunctionCalls/NestedCall', VM_STAGES),
+    'StaticsTest': ('08/FunctionCalls/StaticsTest', VM_STAGES),
+}
+OS_DIRECTORY = os.path.join(PROJECTS, '12')
+# compared with the baseline, lower is better for every one of them
+MEASUREMENTS = ['seconds', 'peak_bytes', 'words', 'cycles']
+
+
+def benchmark(names=None, repeat=3, cycles=1000000, optimize=False,
+              os_directory=OS_DIRECTORY):
+    " Run every stage of every program, returns the JSON-ready results. "
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'cycles': cycles,
+        'optimize': optimize,
+        'os': os_directory,
+        'programs': {},
+    }
+    workspace = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        for name in names or PROGRAMS:
+            results['programs'][name] = benchmark_program(
+                name, workspace, repeat, cycles, optimize, os_directory)
+    finally:
+        shutil.rmtree(workspace)
+    return results
+
+
+def benchmark_program(name, workspace, repeat, cycles, optimize=False,
+                      os_directory=OS_DIRECTORY):
+    """
+    Copy the sources of a program to workspace/name and run its stages in
+    order, a stage that fails stops the ones after it.
+    """
+    if name not in PROGRAMS:
+        raise Exception("Unknown program: {}".format(name))
+    path, stages = PROGRAMS[name]
+    directory = os.path.join(workspace, name)
+    os.mkdir(directory)
+    extension = '.jack' if 'compile' in stages else '.vm'
+    copy_sources(os.path.join(PROJECTS, path), directory, extension)
+
+    functions = {
+        'tokenize': lambda: tokenize(directory),
+        'compile': lambda: compile_jack(directory, optimize),
+        'translate': lambda: translate(directory),
+        'assemble': lambda: assemble(directory),
+        'emulate': lambda: run(directory, cycles),
+    }
+    results = {}
+    for stage in stages:
+        try:
+            results[stage] = measure(functions[stage], repeat)
+        except Exception as e:
+            results[stage] = {'error': '{}: {}'.format(type(e).__name__, e)}
+            break
+        if stage == 'compile' and 'translate' in stages:
+            link_os(directory, os_directory)
+    print_program(name, results)
+    return results
+
+
+def measure(function, repeat):
+    """
+    Time function repeat times, then once more under tracemalloc. The
+    function returns a dict of what it produced, merged into the result.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    result = dict(result)
+    result['seconds'] = min(seconds)
+    result['peak_bytes'] = peak
+    return result
+
+
+def compare(baseline, results, threshold=10.0):
+    """
+    Measurements of results more than threshold percent above baseline,
+    as (program, stage, measurement, old, new). A stage that fails now
+    but did not before is a regression too.
+    """
+    regressions = []
+    for name, stages in results['programs'].items():
+        old_stages = baseline['programs'].get(name, {})
+        for stage, result in stages.items():
+            old = old_stages.get(stage)
+            if old is None:
+                continue
+            if 'error' in result and 'error' not in old:
+                regressions.append((name, stage, 'error', None,
+                                    result['error']))
+                continue
+            for measurement in MEASUREMENTS:
+                if measurement not in result or measurement not in old:
+                    continue
+                limit = old[measurement] * (1 + threshold / 100.0)
+                if result[measurement] > limit:
+                    regressions.append((name, stage, measurement,
+                                        old[measurement],
+                                        result[measurement]))
+    return regressions
+
+
+# Non API
+def copy_sources(source, directory, extension):
+    for filename in sorted(os.listdir(source)):
+        if filename.endswith(extension):
+            shutil.copy(os.path.join(source, filename), directory)
+
+
+def link_os(directory, os_directory=OS_DIRECTORY):
+    """
+    Compiled classes are written as .vm1, rename them to .vm and add the
+    OS classes the program does not define.
+    """
+    for filename in os.listdir(directory):
+        if filename.endswith('.vm1'):
+            path = os.path.join(directory, filename)
+            os.replace(path, path[:-1])
+    for filename in os.listdir(os_directory):
+        if (filename.endswith('.vm')
+                and not os.path.exists(os.path.join(directory, filename))):
+            shutil.copy(os.path.join(os_directory, filename), directory)
+
+
+def jack_files(directory):
+    return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                  if f.endswith('.jack'))
+
+
+def tokenize(directory):
+    tokens = 0
+    for filename in jack_files(directory):
+        tokenizer = JackTokenizer(filename)
+        while tokenizer.hasMoreTokens():
+            tokenizer.advance()
+            tokens += 1
+    return {'tokens': tokens}
+
+
+def compile_jack(directory, optimize=False):
+    JackCompiler(directory, optimize=optimize)
+    return {}
+
+
+def translate(directory):
+    Translator(directory)
+    return {}
+
+
+def assemble(directory):
+    asm = os.path.join(directory, os.path.basename(directory) + '.asm')
+    return {'words': len(Assembler(asm).words)}
+
+
+def run(directory, cycles):
+    hack = os.path.join(directory, os.path.basename(directory) + '.hack')
+    emulator = JITEmulator(hack)
+    emulator.run(cycles)
+    return {'cycles': emulator.time, 'halted': emulator.halted}
+
+
+def print_program(name, results):
+    for stage in STAGES:
+        if stage not in results:
+            continue
+        result = results[stage]
+        if 'error' in result:
+            print('{:<18} {:<10} FAILED {}'.format(name, stage,
+                                                   result['error']))
+            continue
+        counts = ' '.join('{}={}'.format(key, result[key])
+                          for key in ['tokens', 'words', 'cycles', 'halted']
+                          if key in result)
+        print('{:<18} {:<10} {:>9.2f} ms {:>9.1f} KiB  {}'.format(
+            name, stage, result['seconds'] * 1000,
+            result['peak_bytes'] / 1024.0, counts))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(
+        description='Benchmark the toolchain on the projects/11 programs, '
+        'the OS and the VM function call programs.')
+    arg_parser.add_argument('programs', nargs='*',
+                            help='programs to run, all of them by default: '
+                                 '{}'.format(', '.join(PROGRAMS)))
+    arg_parser.add_argument('-o', '--output', metavar='FILE',
+                            help='write the results as JSON')
+    arg_parser.add_argument('--compare', metavar='FILE',
+                            help='JSON results of an earlier run')
+    arg_parser.add_argument('--threshold', type=float, default=10.0,
+                            help='percent above the baseline that fails')
+    arg_parser.add_argument('--repeat', type=int, default=3,
+                            help='timed runs of every stage')
+    arg_parser.add_argument('-n', '--cycles', type=int, default=1000000,
+                            help='instructions to emulate at most')
+    arg_parser.add_argument('-O', '--optimize', action='store_true',
+                            help='compile with the Jack optimizer')
+    arg_parser.add_argument('--os', default=OS_DIRECTORY, metavar='DIRECTORY',
+                            help='OS VM code to link the Jack programs with')
+    args = arg_parser.parse_args()
+
+    results = benchmark(args.programs, args.repeat, args.cycles,
+                        args.optimize, args.os)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for name, stage, measurement, old, new in regressions:
+            print('REGRESSION {} {} {}: {} -> {}'.format(
+                name, stage, measurement, old, new))
+        print('{} regressions over {}%'.format(len(regressions),
+                                              args.threshold))
+        sys.exit(1 if regressions else 0)